@@ -20,7 +20,6 @@ logger = logging.getLogger(__name__)
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
-logger.info(f"Python path: {sys.path}")
 logger.info(f"Working directory: {os.getcwd()}")
 
 try:
@@ -48,6 +47,11 @@ except NameError:
 embedding_service = EmbeddingService()
 retrieval_service = RetrievalService(embedding_service)
 
+# Close pooled HTTP connections on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    await embedding_service.close()
+
 class EnhancePromptRequest(BaseModel):
     prompt: str
     model: Optional[str] = "codellama"
@@ -220,12 +224,22 @@ async def get_index_stats(db: AsyncSession = Depends(get_db)):
         )
         chunks_with_embeddings = embedding_result.scalar()
         
+        # Count distinct chunk contents to measure duplicated code
+        unique_result = await db.execute(
+            text("SELECT COUNT(DISTINCT md5(content)) FROM lua_chunks")
+        )
+        unique_chunks = unique_result.scalar()
+        
         return {
             "total_chunks": total_chunks,
             "unique_files": unique_files,
             "chunks_with_embeddings": chunks_with_embeddings,
+            "unique_chunks": unique_chunks,
+            "dedup_ratio": total_chunks / unique_chunks if unique_chunks else 1.0,
             "chunks_by_type": chunks_by_type,
-            "embedding_provider": embedding_service.get_provider_info()
+            "embedding_provider": embedding_service.get_provider_info(),
+            "embedding_http": embedding_service.get_http_stats(),
+            "query_cache": retrieval_service.query_cache.get_stats()
         }
         
     except Exception as e:
@@ -1,6 +1,9 @@
 -- Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- Runs only on an empty data directory, and CREATE TABLE IF NOT EXISTS leaves existing
+-- tables alone: changes to tables also go into the startup migrations in app/db.py
+
 -- Create schema
 CREATE SCHEMA IF NOT EXISTS victor;
 
@@ -13,12 +16,14 @@ CREATE TABLE IF NOT EXISTS victor.files (
     last_modified TIMESTAMP NOT NULL,
     size_bytes INTEGER NOT NULL,
     content_hash TEXT NOT NULL,
+    load_order INTEGER, -- position in the dependency load order; files in a cycle share one
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create index on file_path
 CREATE INDEX IF NOT EXISTS idx_files_path ON victor.files(file_path);
+CREATE INDEX IF NOT EXISTS idx_files_name ON victor.files(file_name);
 
 -- Chunks table to store code chunks
 CREATE TABLE IF NOT EXISTS victor.chunks (
@@ -29,6 +34,8 @@ CREATE TABLE IF NOT EXISTS victor.chunks (
     content TEXT NOT NULL,
     start_line INTEGER NOT NULL,
     end_line INTEGER NOT NULL,
+    content_hash TEXT NOT NULL, -- SHA-256 of content, shared by identical chunks
+    parent_id INTEGER REFERENCES victor.chunks(id) ON DELETE SET NULL, -- enclosing chunk, if any
     metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -38,35 +45,66 @@ CREATE TABLE IF NOT EXISTS victor.chunks (
 -- Create indexes for chunks
 CREATE INDEX IF NOT EXISTS idx_chunks_file_id ON victor.chunks(file_id);
 CREATE INDEX IF NOT EXISTS idx_chunks_type ON victor.chunks(chunk_type);
+CREATE INDEX IF NOT EXISTS idx_chunks_parent_id ON victor.chunks(parent_id);
+CREATE INDEX IF NOT EXISTS idx_chunks_content_hash ON victor.chunks(content_hash);
 
--- Embeddings table to store vector embeddings
+-- Embeddings table to store vector embeddings, one per distinct chunk content
+-- (chunks point to their embedding through content_hash)
 CREATE TABLE IF NOT EXISTS victor.embeddings (
     id SERIAL PRIMARY KEY,
-    chunk_id INTEGER NOT NULL REFERENCES victor.chunks(id) ON DELETE CASCADE,
+    content_hash TEXT NOT NULL,
     model_name TEXT NOT NULL,
     dimensions INTEGER NOT NULL,
-    embedding vector(1536) NOT NULL, -- Adjust dimensions based on model
+    embedding vector NOT NULL, -- any dimension; several models can be stored side by side
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(content_hash, model_name)
+);
+
+-- Vector indexes are per (model, dimensions): partial indexes over the embedding cast to the
+-- model's dimension. The re-embedding job creates one for each new model before switching to it.
+CREATE INDEX IF NOT EXISTS idx_embeddings_nomic_embed_text_768 ON victor.embeddings
+    USING ivfflat ((embedding::vector(768)) vector_cosine_ops) WHERE model_name = 'nomic-embed-text';
+
+-- Embedding models with vectors in victor.embeddings; exactly one is active (used for indexing and search)
+CREATE TABLE IF NOT EXISTS victor.embedding_models (
+    model_name TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    dimensions INTEGER NOT NULL,
+    status TEXT NOT NULL, -- 'building', 'active', 'retired'
+    embedded INTEGER NOT NULL DEFAULT 0, -- progress of a re-embedding job
+    total INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(chunk_id, model_name)
+    activated_at TIMESTAMP
 );
 
--- Create index for vector search
-CREATE INDEX IF NOT EXISTS idx_embeddings_vector ON victor.embeddings USING ivfflat (embedding vector_cosine_ops);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_embedding_models_active ON victor.embedding_models(status) WHERE status = 'active';
 
 -- Dependencies table to track relationships between files
 CREATE TABLE IF NOT EXISTS victor.dependencies (
     id SERIAL PRIMARY KEY,
     source_file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
-    target_file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
-    dependency_type TEXT NOT NULL, -- 'import', 'require', 'reference', etc.
+    target_file_id INTEGER REFERENCES victor.files(id) ON DELETE SET NULL, -- NULL until the target is indexed
+    target_path TEXT NOT NULL, -- path or module name as written in the source
+    dependency_type TEXT NOT NULL, -- 'dofile', 'loadfile', 'require'
+    line_number INTEGER,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(source_file_id, target_file_id, dependency_type)
+    UNIQUE(source_file_id, target_path, dependency_type)
 );
 
 -- Create indexes for dependencies
 CREATE INDEX IF NOT EXISTS idx_dependencies_source ON victor.dependencies(source_file_id);
 CREATE INDEX IF NOT EXISTS idx_dependencies_target ON victor.dependencies(target_file_id);
 
+-- Transitive closure of the dependency graph, refreshed when dependencies change
+CREATE TABLE IF NOT EXISTS victor.dependency_closure (
+    source_file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
+    target_file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
+    depth INTEGER NOT NULL, -- length of the shortest load chain
+    PRIMARY KEY (source_file_id, target_file_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_dependency_closure_target ON victor.dependency_closure(target_file_id);
+
 -- Functions table to track function definitions
 CREATE TABLE IF NOT EXISTS victor.functions (
     id SERIAL PRIMARY KEY,
@@ -90,8 +128,9 @@ CREATE INDEX IF NOT EXISTS idx_functions_name ON victor.functions(name);
 CREATE TABLE IF NOT EXISTS victor.function_calls (
     id SERIAL PRIMARY KEY,
     source_function_id INTEGER REFERENCES victor.functions(id) ON DELETE CASCADE,
-    target_function_id INTEGER REFERENCES victor.functions(id) ON DELETE CASCADE,
+    target_function_id INTEGER REFERENCES victor.functions(id) ON DELETE SET NULL,
     file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL, -- callee as written, e.g. 'a.b:c'
     line_number INTEGER NOT NULL,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
@@ -99,6 +138,8 @@ CREATE TABLE IF NOT EXISTS victor.function_calls (
 -- Create indexes for function calls
 CREATE INDEX IF NOT EXISTS idx_function_calls_source ON victor.function_calls(source_function_id);
 CREATE INDEX IF NOT EXISTS idx_function_calls_target ON victor.function_calls(target_function_id);
+CREATE INDEX IF NOT EXISTS idx_function_calls_file_id ON victor.function_calls(file_id);
+CREATE INDEX IF NOT EXISTS idx_function_calls_name ON victor.function_calls(name);
 
 -- Variables table to track global variables
 CREATE TABLE IF NOT EXISTS victor.variables (
@@ -4,6 +4,9 @@ CREATE TABLE IF NOT EXISTS lua_chunks (
     file_path VARCHAR NOT NULL,
     chunk_type VARCHAR NOT NULL,  -- 'function', 'table', 'comment', etc.
     content TEXT NOT NULL,
+    -- SHA-256 of the content, like victor.chunks.content_hash; joins the chunks to the
+    -- vectors of other embedding models in victor.embeddings
+    content_hash TEXT GENERATED ALWAYS AS (encode(sha256(convert_to(content, 'UTF8')), 'hex')) STORED,
     meta_data JSONB,
     embedding vector(768),  -- 768 dimensions for nomic-embed-text
     line_start INTEGER NOT NULL,
@@ -17,8 +20,22 @@ CREATE TABLE IF NOT EXISTS lua_chunks (
 CREATE INDEX IF NOT EXISTS idx_lua_chunks_file_path ON lua_chunks(file_path);
 CREATE INDEX IF NOT EXISTS idx_lua_chunks_chunk_type ON lua_chunks(chunk_type);
 CREATE INDEX IF NOT EXISTS idx_lua_chunks_parent_id ON lua_chunks(parent_id);
+CREATE INDEX IF NOT EXISTS idx_lua_chunks_content_hash ON lua_chunks(content_hash);
 CREATE INDEX IF NOT EXISTS idx_lua_chunks_embedding ON lua_chunks USING ivfflat (embedding vector_cosine_ops);
 
+-- Projections of the compact vector column embedding_compact halfvec(dims), which is added
+-- with its HNSW index by CompactIndex.build (POST /index/compact), or of the binary-quantized
+-- expression index; the newest row is current
+CREATE TABLE IF NOT EXISTS vector_projections (
+    id SERIAL PRIMARY KEY,
+    method VARCHAR NOT NULL,  -- 'halfvec', 'pca', 'matryoshka' or 'binary'
+    source_dims INTEGER NOT NULL,
+    dims INTEGER NOT NULL,
+    mean BYTEA,  -- float32 corpus mean (pca, binary) and PCA components (dims x source_dims)
+    components BYTEA,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create GIN index for JSONB meta_data
 CREATE INDEX IF NOT EXISTS idx_lua_chunks_meta_data ON lua_chunks USING gin (meta_data);
 
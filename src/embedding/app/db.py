@@ -2,6 +2,7 @@ import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
+from typing import Set
 import logging
 from dotenv import load_dotenv
 
@@ -27,6 +28,125 @@ async_session = sessionmaker(
 # Logger
 logger = logging.getLogger("victor-db")
 
+# Tables added to 01-schema.sql after its first release; the init scripts only run on an
+# empty data directory, so databases created before them get them on startup
+NEW_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS victor.embedding_models (
+        model_name TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        dimensions INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        embedded INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        activated_at TIMESTAMP
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_embedding_models_active ON victor.embedding_models(status) WHERE status = 'active'",
+    """
+    CREATE TABLE IF NOT EXISTS victor.dependency_closure (
+        source_file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
+        target_file_id INTEGER NOT NULL REFERENCES victor.files(id) ON DELETE CASCADE,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (source_file_id, target_file_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_dependency_closure_target ON victor.dependency_closure(target_file_id)",
+]
+
+# Changed tables, each as (table, column the change adds, statements). The statements run
+# once, when the column is missing, and leave the table as 01-schema.sql creates it.
+COLUMN_MIGRATIONS = [
+    ("files", "load_order", [
+        "ALTER TABLE victor.files ADD COLUMN load_order INTEGER",
+    ]),
+    ("chunks", "content_hash", [
+        "ALTER TABLE victor.chunks ADD COLUMN content_hash TEXT",
+        # The parser's hash: SHA-256 of the UTF-8 content
+        "UPDATE victor.chunks SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')",
+        "ALTER TABLE victor.chunks ALTER COLUMN content_hash SET NOT NULL",
+    ]),
+    ("chunks", "parent_id", [
+        "ALTER TABLE victor.chunks ADD COLUMN parent_id INTEGER REFERENCES victor.chunks(id) ON DELETE SET NULL",
+    ]),
+    # Embeddings were stored per chunk; they are shared by content now
+    ("embeddings", "content_hash", [
+        "ALTER TABLE victor.embeddings ADD COLUMN content_hash TEXT",
+        """
+        UPDATE victor.embeddings AS e SET content_hash = c.content_hash
+        FROM victor.chunks AS c WHERE c.id = e.chunk_id
+        """,
+        # Chunks with the same content had one embedding each; keep the oldest
+        """
+        DELETE FROM victor.embeddings AS e USING victor.embeddings AS kept
+        WHERE e.content_hash = kept.content_hash AND e.model_name = kept.model_name AND e.id > kept.id
+        """,
+        # The vector index over all models is replaced by per-model partial indexes
+        "DROP INDEX IF EXISTS victor.idx_embeddings_vector",
+        # Dropping chunk_id also drops UNIQUE(chunk_id, model_name) and the foreign key
+        """
+        ALTER TABLE victor.embeddings
+            DROP COLUMN chunk_id,
+            ALTER COLUMN content_hash SET NOT NULL,
+            ALTER COLUMN embedding TYPE vector,
+            ADD CONSTRAINT embeddings_content_hash_model_name_key UNIQUE (content_hash, model_name)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_embeddings_nomic_embed_text_768 ON victor.embeddings
+            USING ivfflat ((embedding::vector(768)) vector_cosine_ops) WHERE model_name = 'nomic-embed-text'
+        """,
+    ]),
+    # Dependencies are keyed by the path as written, so unresolved targets can be stored
+    ("dependencies", "target_path", [
+        "ALTER TABLE victor.dependencies ADD COLUMN target_path TEXT",
+        """
+        UPDATE victor.dependencies AS d SET target_path = f.file_path
+        FROM victor.files AS f WHERE f.id = d.target_file_id
+        """,
+        """
+        ALTER TABLE victor.dependencies
+            ALTER COLUMN target_path SET NOT NULL,
+            ALTER COLUMN target_file_id DROP NOT NULL,
+            DROP CONSTRAINT IF EXISTS dependencies_target_file_id_fkey,
+            ADD CONSTRAINT dependencies_target_file_id_fkey
+                FOREIGN KEY (target_file_id) REFERENCES victor.files(id) ON DELETE SET NULL,
+            DROP CONSTRAINT IF EXISTS dependencies_source_file_id_target_file_id_dependency_type_key,
+            ADD CONSTRAINT dependencies_source_file_id_target_path_dependency_type_key
+                UNIQUE (source_file_id, target_path, dependency_type)
+        """,
+    ]),
+    ("dependencies", "line_number", [
+        "ALTER TABLE victor.dependencies ADD COLUMN line_number INTEGER",
+    ]),
+    # Calls keep the callee's name, so calls into other files survive their re-indexing
+    ("function_calls", "name", [
+        "ALTER TABLE victor.function_calls ADD COLUMN name TEXT",
+        """
+        UPDATE victor.function_calls AS fc SET name = f.name
+        FROM victor.functions AS f WHERE f.id = fc.target_function_id
+        """,
+        # Calls without a known callee cannot be named; their file records them again when it changes
+        "DELETE FROM victor.function_calls WHERE name IS NULL",
+        """
+        ALTER TABLE victor.function_calls
+            ALTER COLUMN name SET NOT NULL,
+            DROP CONSTRAINT IF EXISTS function_calls_target_function_id_fkey,
+            ADD CONSTRAINT function_calls_target_function_id_fkey
+                FOREIGN KEY (target_function_id) REFERENCES victor.functions(id) ON DELETE SET NULL
+        """,
+    ]),
+]
+
+# Indexes on the migrated columns
+NEW_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_files_name ON victor.files(file_name)",
+    "CREATE INDEX IF NOT EXISTS idx_chunks_parent_id ON victor.chunks(parent_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chunks_content_hash ON victor.chunks(content_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_function_calls_file_id ON victor.function_calls(file_id)",
+    "CREATE INDEX IF NOT EXISTS idx_function_calls_name ON victor.function_calls(name)",
+]
+
 async def init_db():
     """
     Initialize the database connection and verify the schema exists.
@@ -43,6 +163,7 @@ async def init_db():
                 logger.warning("Victor schema does not exist. Please run the initialization scripts.")
             else:
                 logger.info("Victor schema exists.")
+                await migrate_schema(conn)
                 
             # Check if pgvector extension is installed
             result = await conn.execute(text(
@@ -59,6 +180,37 @@ async def init_db():
         logger.error(f"Database initialization error: {e}")
         raise
 
+async def _columns(conn, table: str) -> Set[str]:
+    result = await conn.execute(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = 'victor' AND table_name = :table"
+    ), {"table": table})
+    return set(result.scalars())
+
+async def migrate_schema(conn) -> None:
+    """
+    Bring a victor schema created by an older 01-schema.sql up to date.
+    
+    CREATE TABLE IF NOT EXISTS leaves existing tables as they are, so missing tables
+    are created and changed tables are altered here. Every step checks the current
+    layout first, so running it on an up-to-date database changes nothing.
+    """
+    for statement in NEW_TABLES:
+        await conn.execute(text(statement))
+    
+    columns = {}
+    for table, column, statements in COLUMN_MIGRATIONS:
+        if table not in columns:
+            columns[table] = await _columns(conn, table)
+        if column in columns[table]:
+            continue
+        logger.info(f"Migrating victor.{table}: adding {column}")
+        for statement in statements:
+            await conn.execute(text(statement))
+        columns[table].add(column)
+    
+    for statement in NEW_INDEXES:
+        await conn.execute(text(statement))
+
 async def get_db():
     """
     Dependency to get DB session for FastAPI endpoints
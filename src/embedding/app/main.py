@@ -5,12 +5,14 @@ from typing import List, Dict, Any, Optional
 import os
 import logging
 from dotenv import load_dotenv
+from sqlalchemy import text
 
-from app.db import get_db, init_db
+from app.db import get_db, init_db, async_session
 from app.models import CodeChunk, Embedding, File
 from app.services.embedding_service import EmbeddingService
 from app.services.indexing_service import IndexingService
 from app.services.retrieval_service import RetrievalService
+from app.services.reembedding_service import ReembeddingService
 
 # Load environment variables
 load_dotenv()
@@ -41,13 +43,35 @@ app.add_middleware(
 # Initialize services
 embedding_service = EmbeddingService()
 indexing_service = IndexingService(embedding_service)
-retrieval_service = RetrievalService()
+retrieval_service = RetrievalService(embedding_service)
+
+async def use_embedding_service(service: EmbeddingService):
+    """Index and search with another embedding model (after a re-embedding switch-over)."""
+    global embedding_service
+    previous, embedding_service = embedding_service, service
+    indexing_service.set_embedding_service(service)
+    retrieval_service.embedding_service = service
+    if previous is not service:
+        await previous.close()
+
+reembedding_service = ReembeddingService(async_session, use_embedding_service)
 
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     await init_db()
     logger.info("Database initialized")
+    # Serve the active embedding model, which a re-embedding job may have changed
+    async with async_session() as db:
+        service = await reembedding_service.restore(db, embedding_service)
+    retrieval_service.column_model = reembedding_service.column_model
+    if service is not embedding_service:
+        await use_embedding_service(service)
+
+# Close pooled HTTP connections on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    await embedding_service.close()
 
 # Model definitions
 class IndexFileRequest(BaseModel):
@@ -63,6 +87,11 @@ class CodeSearchResponse(BaseModel):
     chunks: List[Dict[str, Any]]
     total: int
 
+class ReembedRequest(BaseModel):
+    model: str
+    provider: Optional[str] = None
+    rate: Optional[float] = None  # Chunk contents per second (0 is unlimited)
+
 # Endpoints
 @app.post("/index/file", status_code=202)
 async def index_file(
@@ -85,20 +114,25 @@ async def index_file(
 @app.post("/index/directory", status_code=202)
 async def index_directory(
     directory_path: str,
+    background_tasks: BackgroundTasks,
     recursive: bool = True,
     file_pattern: str = "*.lua",
-    background_tasks: BackgroundTasks,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
     db = Depends(get_db)
 ):
     """
     Index all matching files in a directory for retrieval.
+    Parsing is spread across `workers` processes, `chunk_size` files at a time.
     """
     background_tasks.add_task(
         indexing_service.index_directory,
         db,
         directory_path,
         recursive,
-        file_pattern
+        file_pattern,
+        workers,
+        chunk_size
     )
     return {"message": f"Indexing of directory {directory_path} scheduled"}
 
@@ -121,26 +155,114 @@ async def query(
         "total": len(results)
     }
 
+@app.get("/symbols")
+async def find_symbol(
+    name: str,
+    limit: int = 20,
+    db = Depends(get_db)
+):
+    """
+    Find where a function or variable (e.g. "a.b:c") is defined, called and assigned.
+    """
+    return await retrieval_service.find_symbol(db, name, limit)
+
+@app.get("/dependencies")
+async def get_dependencies(
+    file_path: str,
+    db = Depends(get_db)
+):
+    """
+    Get the files a file loads and the files that load it (dofile/loadfile/require),
+    directly and transitively, with its position in the load order.
+    """
+    dependencies = await indexing_service.dependency_service.get_dependencies(db, file_path)
+    if dependencies is None:
+        raise HTTPException(status_code=404, detail=f"File not indexed: {file_path}")
+    return dependencies
+
 @app.get("/stats")
 async def get_stats(db = Depends(get_db)):
     """
     Get statistics about the indexed code.
     """
-    file_count = await db.execute("SELECT COUNT(*) FROM victor.files")
-    file_count = await file_count.scalar()
+    file_count = await db.execute(text("SELECT COUNT(*) FROM victor.files"))
+    file_count = file_count.scalar()
+    
+    chunk_count = await db.execute(text("SELECT COUNT(*) FROM victor.chunks"))
+    chunk_count = chunk_count.scalar()
     
-    chunk_count = await db.execute("SELECT COUNT(*) FROM victor.chunks")
-    chunk_count = await chunk_count.scalar()
+    unique_chunk_count = await db.execute(text("SELECT COUNT(DISTINCT content_hash) FROM victor.chunks"))
+    unique_chunk_count = unique_chunk_count.scalar()
     
-    embedding_count = await db.execute("SELECT COUNT(*) FROM victor.embeddings")
-    embedding_count = await embedding_count.scalar()
+    embedding_count = await db.execute(text("SELECT COUNT(*) FROM victor.embeddings"))
+    embedding_count = embedding_count.scalar()
     
     return {
         "files": file_count,
         "chunks": chunk_count,
-        "embeddings": embedding_count
+        "unique_chunks": unique_chunk_count,
+        # Chunk occurrences per stored distinct content (1.0 means no duplicates)
+        "dedup_ratio": chunk_count / unique_chunk_count if unique_chunk_count else 1.0,
+        "embeddings": embedding_count,
+        "embedding_model": reembedding_service.active_model,
+        "embedding_http": embedding_service.get_http_stats(),
+        "query_cache": retrieval_service.query_cache.get_stats()
     }
 
+@app.post("/index/compact")
+async def build_compact_index(
+    method: Optional[str] = None,
+    dims: Optional[int] = None,
+    refresh: bool = False,
+    db = Depends(get_db)
+):
+    """
+    Rebuild the compact (halfvec, optionally PCA- or Matryoshka-reduced) vector index
+    of lua_chunks, or with refresh=true only add chunks embedded since the last build.
+    """
+    if not retrieval_service.uses_column():
+        # The index is built from lua_chunks.embedding, which holds another model's vectors
+        raise HTTPException(
+            status_code=409,
+            detail=f"lua_chunks.embedding holds {retrieval_service.column_model} vectors, not the active model's"
+        )
+    compact_index = retrieval_service.compact_index
+    try:
+        if refresh:
+            return {"refreshed": await compact_index.refresh(db)}
+        return await compact_index.build(db, method, dims)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/reembed", status_code=202)
+async def start_reembedding(request: ReembedRequest):
+    """
+    Re-embed the index with another model in the background.
+    Search keeps using the active model until every chunk has a vector of the new
+    one, then both indexing and search switch over.
+    """
+    try:
+        target = EmbeddingService(provider=request.provider or embedding_service.provider, model_name=request.model)
+        return reembedding_service.start(target, request.rate)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/reembed")
+async def get_reembedding_status():
+    """
+    Get the progress of the current or last re-embedding job.
+    """
+    return reembedding_service.get_status()
+
+@app.delete("/reembed")
+async def cancel_reembedding():
+    """
+    Cancel the running re-embedding job; a later job resumes where it stopped.
+    """
+    if not reembedding_service.cancel():
+        raise HTTPException(status_code=404, detail="No re-embedding job is running")
+    return {"message": "Re-embedding cancelled"}
+
 @app.delete("/index/file")
 async def delete_file(
     file_path: str,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, TIMESTAMP, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, TIMESTAMP, JSON, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
@@ -17,6 +17,7 @@ class File(Base):
     last_modified = Column(TIMESTAMP, nullable=False)
     size_bytes = Column(Integer, nullable=False)
     content_hash = Column(Text, nullable=False)
+    load_order = Column(Integer)  # Position in the dependency load order; files in a cycle share one
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
     updated_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -31,31 +32,77 @@ class CodeChunk(Base):
     content = Column(Text, nullable=False)
     start_line = Column(Integer, nullable=False)
     end_line = Column(Integer, nullable=False)
-    metadata = Column(JSON, nullable=False, default={})
+    content_hash = Column(Text, nullable=False)
+    parent_id = Column(Integer, ForeignKey("victor.chunks.id", ondelete="SET NULL"))
+    # "metadata" is reserved on declarative classes, so the column is mapped as meta_data
+    meta_data = Column("metadata", JSON, nullable=False, default={})
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
     updated_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 class Embedding(Base):
+    """Embeddings are content-addressed: every chunk with the same content_hash shares one row."""
     __tablename__ = "embeddings"
-    __table_args__ = {"schema": "victor"}
+    # The conflict target of EmbeddingService.store_embeddings
+    __table_args__ = (UniqueConstraint("content_hash", "model_name"), {"schema": "victor"})
     
     id = Column(Integer, primary_key=True)
-    chunk_id = Column(Integer, ForeignKey("victor.chunks.id", ondelete="CASCADE"), nullable=False)
+    content_hash = Column(Text, nullable=False)
     model_name = Column(Text, nullable=False)
     dimensions = Column(Integer, nullable=False)
-    embedding = Column(Vector(1536))  # Adjust dimensions based on model
+    embedding = Column(Vector())  # Any dimension; vector indexes are per model (see EmbeddingModel)
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
 
+class SearchChunk(Base):
+    """
+    Chunks searched by the retrieval service (lua_chunks, filled by the loader).
+    Their embedding column holds vectors of the first registered model; content_hash
+    joins them to the vectors of other models in the embeddings table.
+    """
+    __tablename__ = "lua_chunks"
+    
+    id = Column(Integer, primary_key=True)
+    file_path = Column(String, nullable=False)
+    chunk_type = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    content_hash = Column(Text)  # Generated from content (see 02-lua-chunks.sql)
+    embedding = Column(Vector(768))
+
+class EmbeddingModel(Base):
+    """Models with vectors in the embeddings table; exactly one is active (used for indexing and search)."""
+    __tablename__ = "embedding_models"
+    __table_args__ = {"schema": "victor"}
+    
+    model_name = Column(Text, primary_key=True)
+    provider = Column(Text, nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    status = Column(Text, nullable=False)  # 'building', 'active' or 'retired'
+    embedded = Column(Integer, nullable=False, default=0)  # Progress of a re-embedding job
+    total = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
+    activated_at = Column(TIMESTAMP)
+
 class Dependency(Base):
     __tablename__ = "dependencies"
     __table_args__ = {"schema": "victor"}
     
     id = Column(Integer, primary_key=True)
     source_file_id = Column(Integer, ForeignKey("victor.files.id", ondelete="CASCADE"), nullable=False)
-    target_file_id = Column(Integer, ForeignKey("victor.files.id", ondelete="CASCADE"), nullable=False)
+    # NULL until a file matching target_path is indexed
+    target_file_id = Column(Integer, ForeignKey("victor.files.id", ondelete="SET NULL"))
+    target_path = Column(Text, nullable=False)  # Path or module name as written in the source
     dependency_type = Column(Text, nullable=False)
+    line_number = Column(Integer)
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
 
+class DependencyClosure(Base):
+    """Precomputed transitive closure of the dependency graph: source loads target, directly or not."""
+    __tablename__ = "dependency_closure"
+    __table_args__ = {"schema": "victor"}
+    
+    source_file_id = Column(Integer, ForeignKey("victor.files.id", ondelete="CASCADE"), primary_key=True)
+    target_file_id = Column(Integer, ForeignKey("victor.files.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)  # Length of the shortest load chain
+
 class Function(Base):
     __tablename__ = "functions"
     __table_args__ = {"schema": "victor"}
@@ -68,7 +115,7 @@ class Function(Base):
     start_line = Column(Integer, nullable=False)
     end_line = Column(Integer, nullable=False)
     description = Column(Text)
-    metadata = Column(JSON, nullable=False, default={})
+    meta_data = Column("metadata", JSON, nullable=False, default={})
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
     updated_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -78,8 +125,9 @@ class FunctionCall(Base):
     
     id = Column(Integer, primary_key=True)
     source_function_id = Column(Integer, ForeignKey("victor.functions.id", ondelete="CASCADE"))
-    target_function_id = Column(Integer, ForeignKey("victor.functions.id", ondelete="CASCADE"))
+    target_function_id = Column(Integer, ForeignKey("victor.functions.id", ondelete="SET NULL"))
     file_id = Column(Integer, ForeignKey("victor.files.id", ondelete="CASCADE"), nullable=False)
+    name = Column(Text, nullable=False)  # Callee as written, e.g. "a.b:c"
     line_number = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.datetime.utcnow)
 
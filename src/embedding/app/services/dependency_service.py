@@ -0,0 +1,417 @@
+"""
+Dependency Service - Tracks which Lua files load which through dofile/loadfile/require
+Stores the transitive closure and the load order so dependency lookups are single index reads
+"""
+
+import logging
+import re
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional, Set
+from sqlalchemy import select, insert, update, delete, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import File, Dependency, DependencyClosure
+
+# Configure logging
+logger = logging.getLogger("victor-dependency-service")
+
+# File ids per IN (...) lookup while refreshing
+REFRESH_BATCH_SIZE = 1000
+
+def normalize_target(kind: str, target: str) -> str:
+    """
+    Normalize a loaded path to a forward-slash file path.
+    `require "a.b"` loads "a/b.lua"; dofile/loadfile paths are kept as written,
+    except that runs of (escaped) backslashes become one slash.
+    """
+    path = re.sub(r'[\\/]+', '/', target.strip())
+    if kind == 'require' and not path.endswith('.lua'):
+        path = path.replace('.', '/') + '.lua'
+    while path.startswith('./'):
+        path = path[2:]
+    return path
+
+def _base_name(path: str) -> str:
+    return path.replace('\\', '/').rsplit('/', 1)[-1]
+
+def match_score(file_path: str, target_path: str) -> int:
+    """Number of trailing path components the file shares with the target (0 if the names differ)."""
+    file_parts = file_path.replace('\\', '/').split('/')
+    target_parts = target_path.split('/')
+    score = 0
+    for file_part, target_part in zip(reversed(file_parts), reversed(target_parts)):
+        if file_part != target_part:
+            break
+        score += 1
+    return score
+
+def resolve_target(target_path: str, candidates: Dict[int, str]) -> Optional[int]:
+    """
+    Pick the indexed file a loaded path refers to.
+    Loaded paths are usually relative to the DCS install or the mission (e.g.
+    "Scripts/XSAF/init.lua"), so the file sharing the longest path suffix wins.
+
+    Args:
+        target_path: Normalized loaded path
+        candidates: File id to file path, for files with the target's name
+
+    Returns:
+        The best matching file id, or None
+    """
+    best = None
+    best_score = 0
+    for file_id, file_path in sorted(candidates.items()):
+        score = match_score(file_path, target_path)
+        if score > best_score:
+            best, best_score = file_id, score
+    return best
+
+def transitive_closure(graph: Dict[int, Set[int]], source: int) -> Dict[int, int]:
+    """
+    Every file the source loads directly or indirectly, with the length of the
+    shortest load chain. The source itself is left out even if it is in a cycle.
+    """
+    depths: Dict[int, int] = {}
+    seen = {source}
+    queue = deque([(source, 0)])
+    while queue:
+        node, depth = queue.popleft()
+        for target in graph.get(node, ()):
+            if target not in seen:
+                seen.add(target)
+                depths[target] = depth + 1
+                queue.append((target, depth + 1))
+    return depths
+
+def load_order(
+    graph: Dict[int, Set[int]],
+    nodes: Iterable[int],
+    known: Optional[Dict[int, int]] = None
+) -> Dict[int, int]:
+    """
+    Topological load level of each file: 0 for files that load nothing, otherwise
+    one more than the highest level they load. Files in a load cycle share a level.
+
+    Uses an iterative Tarjan SCC pass; components come out dependencies first, so
+    every level a component needs is already known when it is emitted. Files in
+    `known` already have a level and are not traversed; only the levels of the
+    other files are returned.
+    """
+    index: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    stack: List[int] = []
+    on_stack: Set[int] = set()
+    order: Dict[int, int] = dict(known or {})
+
+    def push(node: int) -> None:
+        index[node] = low[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+
+    for root in nodes:
+        if root in index or root in order:
+            continue
+        push(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            node, targets = work[-1]
+            for target in targets:
+                if target in order and target not in index:
+                    continue
+                if target not in index:
+                    push(target)
+                    work.append((target, iter(graph.get(target, ()))))
+                    break
+                if target in on_stack:
+                    low[node] = min(low[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] != index[node]:
+                    continue
+
+                component = set()
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.add(member)
+                    if member == node:
+                        break
+                level = max(
+                    (order[target] + 1 for member in component for target in graph.get(member, ()) if target not in component),
+                    default=0
+                )
+                for member in component:
+                    order[member] = level
+    return {node: level for node, level in order.items() if node in index}
+
+class DependencyService:
+    """
+    Service for maintaining the file dependency graph.
+
+    Direct edges live in victor.dependencies; a load whose target is not indexed
+    yet keeps a NULL target_file_id and is resolved once a matching file arrives.
+    `update_file`/`remove_file` record which files changed and `refresh` rewrites
+    the closure rows and load order of those files and the files that load them.
+    No other file can reach an edge that changed, so their stored rows stay valid
+    and the refresh only reads the part of the graph the affected files reach.
+    """
+
+    def __init__(self):
+        # Files whose direct edges changed since the last refresh
+        self.changed: Set[int] = set()
+
+    async def update_file(
+        self,
+        db: AsyncSession,
+        file_id: int,
+        file_path: str,
+        dependencies: List[Dict[str, Any]],
+        new_file: bool = False
+    ) -> None:
+        """
+        Replace the direct dependencies of a file.
+
+        Args:
+            db: Database session
+            file_id: Database id of the file
+            file_path: Path of the file
+            dependencies: Dependency records from the symbol collector (kind, target, line)
+            new_file: Whether the file was just added, so pending loads of it can be resolved
+        """
+        await db.execute(delete(Dependency).where(Dependency.source_file_id == file_id))
+
+        edges: Dict[tuple, int] = {}
+        for dependency in dependencies:
+            key = (normalize_target(dependency["kind"], dependency["target"]), dependency["kind"])
+            edges.setdefault(key, dependency["line"])
+
+        if edges:
+            names = {_base_name(target_path) for target_path, _ in edges}
+            result = await db.execute(
+                select(File.id, File.file_name, File.file_path).where(File.file_name.in_(list(names)))
+            )
+            candidates: Dict[str, Dict[int, str]] = {}
+            for row in result:
+                candidates.setdefault(row.file_name, {})[row.id] = row.file_path
+
+            now = datetime.now()
+            await db.execute(insert(Dependency), [
+                {
+                    "source_file_id": file_id,
+                    "target_file_id": resolve_target(target_path, candidates.get(_base_name(target_path), {})),
+                    "target_path": target_path,
+                    "dependency_type": kind,
+                    "line_number": line,
+                    "created_at": now
+                }
+                for (target_path, kind), line in edges.items()
+            ])
+
+        self.changed.add(file_id)
+        if new_file:
+            await self._resolve_pending(db, file_id, file_path)
+
+    async def _resolve_pending(self, db: AsyncSession, file_id: int, file_path: str) -> None:
+        """Point unresolved loads that match a newly indexed file at it."""
+        file_name = _base_name(file_path)
+        result = await db.execute(
+            select(Dependency.id, Dependency.source_file_id, Dependency.target_path).where(
+                Dependency.target_file_id.is_(None),
+                or_(Dependency.target_path == file_name, Dependency.target_path.like('%/' + file_name))
+            )
+        )
+        updates = []
+        for row in result:
+            if _base_name(row.target_path) == file_name:
+                updates.append({"id": row.id, "target_file_id": file_id})
+                self.changed.add(row.source_file_id)
+        if updates:
+            await db.execute(update(Dependency), updates)
+
+    async def remove_file(self, db: AsyncSession, file_id: int) -> None:
+        """
+        Turn the loads of a file that is about to be deleted back into pending ones.
+        Its own edges and closure rows go with the file's cascade.
+        """
+        result = await db.execute(
+            select(Dependency.source_file_id).where(Dependency.target_file_id == file_id)
+        )
+        self.changed.update(source for source in result.scalars() if source != file_id)
+        await db.execute(
+            update(Dependency).where(Dependency.target_file_id == file_id).values(target_file_id=None)
+        )
+        self.changed.discard(file_id)
+
+    async def _loaders(self, db: AsyncSession, file_ids: Set[int]) -> Set[int]:
+        """
+        Files that load one of the given files, directly or not, by the stored closure.
+        Any such load chain in the current graph runs through unchanged files up to the
+        first changed one, so the stored closure already has the chain's source.
+        """
+        ids = list(file_ids)
+        loaders: Set[int] = set()
+        for i in range(0, len(ids), REFRESH_BATCH_SIZE):
+            result = await db.execute(
+                select(DependencyClosure.source_file_id)
+                .where(DependencyClosure.target_file_id.in_(ids[i:i + REFRESH_BATCH_SIZE]))
+            )
+            loaders.update(result.scalars())
+        return loaders
+
+    async def _reachable_graph(self, db: AsyncSession, sources: Set[int]) -> Dict[int, Set[int]]:
+        """The resolved edges of every file the sources reach, read level by level."""
+        graph: Dict[int, Set[int]] = {}
+        seen = set(sources)
+        frontier = list(sources)
+        while frontier:
+            batch, frontier = frontier[:REFRESH_BATCH_SIZE], frontier[REFRESH_BATCH_SIZE:]
+            result = await db.execute(
+                select(Dependency.source_file_id, Dependency.target_file_id)
+                .where(Dependency.source_file_id.in_(batch), Dependency.target_file_id.isnot(None))
+            )
+            for source, target in result:
+                graph.setdefault(source, set()).add(target)
+                if target not in seen:
+                    seen.add(target)
+                    frontier.append(target)
+        return graph
+
+    async def refresh(self, db: AsyncSession, full: bool = False) -> Dict[str, int]:
+        """
+        Bring the stored closure and load order up to date with the changed files.
+
+        Args:
+            db: Database session
+            full: Rebuild both for every file (e.g. for a database without closure rows)
+
+        Returns:
+            Number of files whose closure was rewritten and whose load order moved
+        """
+        if full:
+            result = await db.execute(select(File.id))
+            self.changed.update(result.scalars())
+        if not self.changed:
+            return {"closures": 0, "reordered": 0}
+        changed, self.changed = self.changed, set()
+
+        try:
+            # Only the changed files and the files that load them can reach something new
+            affected = changed | await self._loaders(db, changed)
+            graph = await self._reachable_graph(db, affected)
+            reached = list(affected.union(*graph.values()))
+            stored: Dict[int, Optional[int]] = {}
+            for i in range(0, len(reached), REFRESH_BATCH_SIZE):
+                result = await db.execute(
+                    select(File.id, File.load_order).where(File.id.in_(reached[i:i + REFRESH_BATCH_SIZE]))
+                )
+                stored.update((row.id, row.load_order) for row in result)
+            # Rows of deleted files went with their cascade
+            affected = {file_id for file_id in affected if file_id in stored}
+
+            ids = list(affected)
+            for i in range(0, len(ids), REFRESH_BATCH_SIZE):
+                await db.execute(
+                    delete(DependencyClosure).where(DependencyClosure.source_file_id.in_(ids[i:i + REFRESH_BATCH_SIZE]))
+                )
+            closure_rows = [
+                {"source_file_id": source, "target_file_id": target, "depth": depth}
+                for source in affected
+                for target, depth in transitive_closure(graph, source).items()
+            ]
+            if closure_rows:
+                await db.execute(insert(DependencyClosure), closure_rows)
+
+            # Levels of the reached files outside the affected set are still valid;
+            # files never ordered are computed along with the affected ones
+            known = {
+                file_id: level for file_id, level in stored.items()
+                if file_id not in affected and level is not None
+            }
+            order = load_order(graph, [file_id for file_id in stored if file_id not in known], known)
+            reordered = [
+                {"id": file_id, "load_order": level}
+                for file_id, level in order.items()
+                if stored.get(file_id) != level
+            ]
+            if reordered:
+                await db.execute(update(File), reordered)
+        except Exception:
+            # Left for the next refresh, which runs in a fresh transaction
+            self.changed |= changed
+            raise
+
+        logger.info(f"Refreshed dependency closure of {len(affected)} files, load order of {len(reordered)}")
+        return {"closures": len(affected), "reordered": len(reordered)}
+
+    async def get_dependencies(
+        self,
+        db: AsyncSession,
+        file_path: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        What a file loads and what loads it, directly and transitively.
+        Every list is one lookup on an indexed column of the stored graph.
+
+        Args:
+            db: Database session
+            file_path: Path of an indexed file
+
+        Returns:
+            Dict with "loads", "loads_transitive", "loaded_by", "loaded_by_transitive"
+            and "load_order", or None if the file is not indexed
+        """
+        result = await db.execute(
+            select(File.id, File.load_order).where(File.file_path == file_path)
+        )
+        file = result.one_or_none()
+        if file is None:
+            return None
+
+        loads = await db.execute(
+            select(Dependency.target_path, Dependency.dependency_type, Dependency.line_number, File.file_path)
+            .outerjoin(File, File.id == Dependency.target_file_id)
+            .where(Dependency.source_file_id == file.id)
+            .order_by(Dependency.line_number)
+        )
+        loaded_by = await db.execute(
+            select(File.file_path, Dependency.dependency_type, Dependency.line_number)
+            .join(File, File.id == Dependency.source_file_id)
+            .where(Dependency.target_file_id == file.id)
+            .order_by(File.file_path)
+        )
+        loads_transitive = await db.execute(
+            select(File.file_path, DependencyClosure.depth)
+            .join(File, File.id == DependencyClosure.target_file_id)
+            .where(DependencyClosure.source_file_id == file.id)
+            .order_by(DependencyClosure.depth, File.file_path)
+        )
+        loaded_by_transitive = await db.execute(
+            select(File.file_path, DependencyClosure.depth)
+            .join(File, File.id == DependencyClosure.source_file_id)
+            .where(DependencyClosure.target_file_id == file.id)
+            .order_by(DependencyClosure.depth, File.file_path)
+        )
+
+        return {
+            "file_path": file_path,
+            "load_order": file.load_order,
+            "loads": [
+                {
+                    "target_path": row.target_path,
+                    "file_path": row.file_path,
+                    "type": row.dependency_type,
+                    "line": row.line_number
+                }
+                for row in loads
+            ],
+            "loads_transitive": [dict(row._mapping) for row in loads_transitive],
+            "loaded_by": [
+                {"file_path": row.file_path, "type": row.dependency_type, "line": row.line_number}
+                for row in loaded_by
+            ],
+            "loaded_by_transitive": [dict(row._mapping) for row in loaded_by_transitive]
+        }
@@ -0,0 +1,172 @@
+"""
+Embedding Executor - Runs embedding requests concurrently while the indexer keeps working
+Batches are launched as tasks behind a shared semaphore and delivered in submission order
+"""
+
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_service import EmbeddingService, EMBED_BATCH_SIZE
+
+# Configure logging
+logger = logging.getLogger("victor-embedding-executor")
+
+# Embedding requests in flight to the provider across all runs
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Launched batches a run keeps before it waits for the oldest one
+EMBED_PENDING_BATCHES = int(os.getenv("EMBED_PENDING_BATCHES", "8"))
+# Attempts after the first for a failed request, with exponential backoff from EMBED_RETRY_DELAY seconds
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_DELAY = float(os.getenv("EMBED_RETRY_DELAY", "0.5"))
+
+# (key, vector); the vector is None if the item failed after all retries
+EmbeddingResult = Tuple[Any, Optional[np.ndarray]]
+
+class EmbeddingExecutor:
+    """
+    Limits the embedding requests in flight to the provider and retries failed ones.
+
+    Work is submitted through runs (see `start`). All runs share one semaphore, so
+    EMBED_CONCURRENCY bounds the requests to the provider however many runs are active.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_delay: Optional[float] = None
+    ):
+        self.embedding_service = embedding_service
+        self.concurrency = concurrency or EMBED_CONCURRENCY
+        self.max_retries = EMBED_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_delay = EMBED_RETRY_DELAY if retry_delay is None else retry_delay
+        self.stats = {"batches": 0, "items": 0, "retries": 0, "failed": 0}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+    def start(self, batch_size: Optional[int] = None, max_pending: Optional[int] = None) -> "EmbeddingRun":
+        """Start a run that delivers its results in the order items were submitted."""
+        return EmbeddingRun(self, batch_size or EMBED_BATCH_SIZE, max_pending or EMBED_PENDING_BATCHES)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # A semaphore belongs to the event loop it is first used in
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _embed_with_retry(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts with one provider call, retrying with exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                return await self.embedding_service.batch_generate_embeddings(texts)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_delay * (2 ** attempt)
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(f"Embedding request failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def run_batch(self, items: List[Tuple[Any, str]]) -> List[EmbeddingResult]:
+        """
+        Embed one batch while holding a semaphore slot.
+        If the batch still fails after its retries, each item is retried on its own,
+        so one bad input only costs its own embedding.
+        """
+        texts = [text for _, text in items]
+        async with self._get_semaphore():
+            self.stats["batches"] += 1
+            self.stats["items"] += len(items)
+            try:
+                vectors = await self._embed_with_retry(texts)
+                return [(key, vector) for (key, _), vector in zip(items, vectors)]
+            except Exception as e:
+                if len(items) == 1:
+                    self.stats["failed"] += 1
+                    logger.error(f"Giving up on embedding {items[0][0]}: {e}")
+                    return [(items[0][0], None)]
+                logger.warning(f"Embedding batch of {len(items)} failed ({e}), retrying items one by one")
+
+            results = []
+            for key, text in items:
+                try:
+                    results.append((key, (await self._embed_with_retry([text]))[0]))
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"Giving up on embedding {key}: {e}")
+                    results.append((key, None))
+            return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batch, retry and failure counters."""
+        return {**self.stats, "concurrency": self.concurrency}
+
+class EmbeddingRun:
+    """
+    One stream of embedding work, e.g. an indexing job.
+
+    `submit` collects items into batches and launches each full batch as a task.
+    Launched tasks wait in a bounded FIFO in submission order; when it is
+    full, `submit` waits for the oldest batch before launching another, so a
+    producer can never get more than `max_pending` batches ahead of the provider.
+    Results are handed back in submission order by `ready` (completed results
+    only, without waiting) and `finish` (everything).
+    """
+
+    def __init__(self, executor: EmbeddingExecutor, batch_size: int, max_pending: int):
+        self.executor = executor
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._items: List[Tuple[Any, str]] = []
+        self._tasks: "deque[asyncio.Future]" = deque()
+        self._results: List[EmbeddingResult] = []
+        # Keys submitted so far, so content shared by several files is embedded once
+        self.submitted = set()
+
+    async def submit(self, key: Any, text: str) -> None:
+        """Queue one item; launches its batch once the batch is full."""
+        self.submitted.add(key)
+        self._items.append((key, text))
+        if len(self._items) >= self.batch_size:
+            await self._launch()
+
+    async def _launch(self) -> None:
+        if not self._items:
+            return
+        items, self._items = self._items, []
+        if len(self._tasks) >= self.max_pending:
+            # Backpressure: wait for the oldest batch before launching another
+            self._results.extend(await self._tasks.popleft())
+        self._tasks.append(asyncio.ensure_future(self.executor.run_batch(items)))
+
+    def ready(self) -> List[EmbeddingResult]:
+        """Take the results of leading batches that are already done, without waiting."""
+        while self._tasks and self._tasks[0].done():
+            self._results.extend(self._tasks.popleft().result())
+        results, self._results = self._results, []
+        return results
+
+    async def finish(self) -> List[EmbeddingResult]:
+        """Launch the last partial batch and wait for every remaining result."""
+        await self._launch()
+        while self._tasks:
+            self._results.extend(await self._tasks.popleft())
+        results, self._results = self._results, []
+        return results
+
+    def cancel(self) -> None:
+        """Cancel batches that have not been delivered, e.g. after an error."""
+        while self._tasks:
+            self._tasks.popleft().cancel()
+        self._items = []
+        self._results = []
@@ -5,19 +5,15 @@ Ported from dcs-lua-analyzer project
 """
 
 import os
+import re
+import asyncio
 import numpy as np
 import logging
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Iterable, Tuple
 
-# Conditional torch import - only needed for sentence_transformers
-try:
-    import torch
-    TORCH_AVAILABLE = True
-except ImportError:
-    torch = None
-    TORCH_AVAILABLE = False
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -34,17 +30,72 @@ except ImportError:
     Embedding = None
     logger.warning("Could not import Embedding model - database operations will be disabled")
 
+from .local_encoder import LocalEncoder
+from .hashed_embedder import HashedNgramEmbedder, HASHED_EMBED_DIM
+
+# Batching: texts per embedding request are limited by an estimated token budget
+# (about 4 characters per token) and a maximum count
+CHARS_PER_TOKEN = 4
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8192"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Rows per upsert statement when storing embeddings (5 bind parameters per row,
+# Postgres allows 32767 per statement)
+EMBED_STORE_BATCH_SIZE = min(int(os.getenv("EMBED_STORE_BATCH_SIZE", "2000")), 6000)
+
+# Consecutive 404s from Ollama's /api/embed before batching is turned off
+OLLAMA_BATCH_404_LIMIT = 3
+# Ollama's 404 for a model that is not pulled, as opposed to a missing endpoint
+OLLAMA_MODEL_NOT_FOUND = re.compile(r'model .* not found', re.IGNORECASE)
+
+def plan_batches(
+    texts: List[str],
+    max_tokens: Optional[int] = None,
+    max_size: Optional[int] = None
+) -> List[List[int]]:
+    """
+    Group texts into request batches that stay within the token budget.
+    
+    Texts are ordered by length first, so each batch holds texts of similar size
+    and short texts are packed densely. A text over the budget gets a batch of its own.
+    
+    Returns:
+        Batches of indexes into `texts`
+    """
+    max_tokens = max_tokens or EMBED_BATCH_TOKENS
+    max_size = max_size or EMBED_BATCH_SIZE
+    batches = []
+    batch: List[int] = []
+    batch_tokens = 0
+    for index in sorted(range(len(texts)), key=lambda i: len(texts[i])):
+        tokens = len(texts[index]) // CHARS_PER_TOKEN + 1
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_size):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
 class EmbeddingService:
     """
     Service for generating and managing embeddings for code chunks.
     Supports multiple embedding providers.
     """
     
-    def __init__(self, provider: Optional[str] = None):
-        # Determine the embedding provider
+    def __init__(self, provider: Optional[str] = None, model_name: Optional[str] = None):
+        # Determine the embedding provider; model_name overrides the provider's configured model
         self.provider = provider or os.getenv("EMBEDDING_PROVIDER", "ollama")
+        self._model_name = model_name
         logger.info(f"Initializing embedding service with provider: {self.provider}")
         
+        # Shared HTTP session, created on first use in the running event loop
+        self._session = None
+        self._session_loop = None
+        self.http_stats = {"requests": 0, "inputs": 0, "connections_created": 0, "connections_reused": 0}
+        
         # Initialize based on provider
         if self.provider == "sentence_transformers":
             self._init_sentence_transformers()
@@ -52,43 +103,57 @@ class EmbeddingService:
             self._init_ollama()
         elif self.provider == "openai":
             self._init_openai()
+        elif self.provider == "hashed":
+            self._init_hashed()
         else:
             raise ValueError(f"Unknown embedding provider: {self.provider}")
     
     def _init_sentence_transformers(self):
-        """Initialize Sentence Transformers model."""
-        if not TORCH_AVAILABLE:
-            raise ValueError("PyTorch is required for sentence_transformers but is not installed")
-        
-        try:
-            from sentence_transformers import SentenceTransformer
-            self.model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-            self.model = SentenceTransformer(self.model_name)
-            self.embedding_dim = self.model.get_sentence_embedding_dimension()
-            logger.info(f"Sentence Transformers model loaded. Dimension: {self.embedding_dim}")
-        except ImportError:
-            logger.error("sentence_transformers is not installed")
-            raise
-        except Exception as e:
-            logger.error(f"Failed to load Sentence Transformers model: {e}")
-            raise
+        """
+        Initialize Sentence Transformers configuration.
+        The model (and torch) is loaded by the local encoder's thread on the first embedding request.
+        """
+        self.model_name = self._model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.encoder = LocalEncoder(self.model_name)
+        # all-MiniLM-L6-v2 dimension; replaced by the model's own once it is loaded
+        self.embedding_dim = int(os.getenv("EMBEDDING_DIM", "384"))
+        logger.info(f"Sentence Transformers embedding service initialized. Model: {self.model_name} ({self.encoder.backend})")
     
     def _init_ollama(self):
         """Initialize Ollama configuration."""
-        self.model_name = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+        self.model_name = self._model_name or os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://skyeye-server:11434")
         self.embedding_dim = 768  # nomic-embed-text dimension
+        # Connection pool and timeouts of the shared session
+        self.http_max_connections = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+        self.http_keepalive = float(os.getenv("OLLAMA_KEEPALIVE_TIMEOUT", "60"))
+        self.http_timeout = float(os.getenv("OLLAMA_TIMEOUT", "60"))
+        self.http_connect_timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        # 404s in a row from the batch endpoint /api/embed, which older servers lack
+        self.ollama_batch_misses = 0
         logger.info(f"Ollama embedding service initialized. Model: {self.model_name}")
     
     def _init_openai(self):
         """Initialize OpenAI configuration."""
-        self.model_name = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-ada-002")
+        self.model_name = self._model_name or os.getenv("OPENAI_EMBED_MODEL", "text-embedding-ada-002")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY not set")
         self.embedding_dim = 1536  # ada-002 dimension
         logger.info(f"OpenAI embedding service initialized. Model: {self.model_name}")
     
+    def _init_hashed(self):
+        """
+        Initialize the offline hashed n-gram provider (deterministic, no model or network).
+        The dimension is part of the model name, e.g. "hashed-ngram-768", so a model
+        name passed in (e.g. by a re-embedding job) selects the dimension.
+        """
+        match = re.fullmatch(r"hashed-ngram-(\d+)", self._model_name or "")
+        self.embedding_dim = int(match.group(1)) if match else HASHED_EMBED_DIM
+        self.model_name = f"hashed-ngram-{self.embedding_dim}"
+        self.hashed_embedder = HashedNgramEmbedder(self.embedding_dim)
+        logger.info(f"Hashed n-gram embedding service initialized. Dimension: {self.embedding_dim}")
+    
     async def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate an embedding for a text string.
@@ -100,100 +165,255 @@ class EmbeddingService:
                 return await self._generate_ollama_embedding(text)
             elif self.provider == "openai":
                 return await self._generate_openai_embedding(text)
+            elif self.provider == "hashed":
+                return self.hashed_embedder.embed(text)
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise
     
     async def _generate_st_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding using Sentence Transformers."""
-        if TORCH_AVAILABLE and torch.cuda.is_available():
-            self.model = self.model.to("cuda")
-        return self.model.encode(text)
+        """Generate embedding using Sentence Transformers, batched with concurrent requests."""
+        embedding = await self.encoder.encode(text)
+        self.embedding_dim = self.encoder.dimensions
+        return embedding
+    
+    async def _get_session(self):
+        """
+        Return the shared aiohttp session, creating it on first use.
+        Connections are kept alive and reused across requests; a session left over
+        from an event loop that has since been closed is replaced.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._session_loop is loop:
+            return self._session
+        
+        import aiohttp
+        
+        trace_config = aiohttp.TraceConfig()
+        
+        async def on_connection_create_end(session, context, params):
+            self.http_stats["connections_created"] += 1
+        
+        async def on_connection_reuseconn(session, context, params):
+            self.http_stats["connections_reused"] += 1
+        
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.http_max_connections,
+                keepalive_timeout=self.http_keepalive,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=self.http_timeout, connect=self.http_connect_timeout),
+            trace_configs=[trace_config]
+        )
+        self._session_loop = loop
+        return self._session
+    
+    async def close(self) -> None:
+        """Close the shared HTTP session and its pooled connections, and the local encoder thread (called on application shutdown)."""
+        if self.provider == "sentence_transformers":
+            self.encoder.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+    
+    def get_http_stats(self) -> Dict[str, Any]:
+        """Get request and connection reuse counters of the shared HTTP session."""
+        opened = self.http_stats["connections_created"] + self.http_stats["connections_reused"]
+        return {
+            **self.http_stats,
+            "reuse_ratio": self.http_stats["connections_reused"] / opened if opened else 0.0,
+            "max_connections": getattr(self, 'http_max_connections', None)
+        }
     
     async def _generate_ollama_embedding(self, text: str) -> np.ndarray:
         """Generate embedding using Ollama."""
-        import aiohttp
+        # Same endpoint as batches, so query and chunk vectors are produced alike
+        return (await self._generate_ollama_batch([text]))[0]
+    
+    async def _generate_ollama_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed several texts with one request to Ollama's /api/embed.
+        Falls back to one /api/embeddings request per text on servers without /api/embed;
+        after OLLAMA_BATCH_404_LIMIT such 404s in a row, the batch endpoint is no longer tried.
+        """
+        session = await self._get_session()
+        if self.ollama_batch_misses < OLLAMA_BATCH_404_LIMIT:
+            self.http_stats["requests"] += 1
+            self.http_stats["inputs"] += len(texts)
+            async with session.post(
+                f"{self.ollama_base_url}/api/embed",
+                json={"model": self.model_name, "input": texts}
+            ) as response:
+                if response.status == 200:
+                    self.ollama_batch_misses = 0
+                    data = await response.json()
+                    return [np.array(embedding, dtype=np.float32) for embedding in data["embeddings"]]
+                error_text = await response.text()
+                # A model that is not pulled is a 404 too; the older endpoint would fail the same way
+                if response.status != 404 or OLLAMA_MODEL_NOT_FOUND.search(error_text):
+                    raise Exception(f"Ollama embedding failed: {response.status} - {error_text}")
+            self.ollama_batch_misses += 1
+            if self.ollama_batch_misses == OLLAMA_BATCH_404_LIMIT:
+                logger.warning("Ollama server has no /api/embed, embedding one text per request")
         
-        async with aiohttp.ClientSession() as session:
+        embeddings = []
+        for text in texts:
+            self.http_stats["requests"] += 1
+            self.http_stats["inputs"] += 1
             async with session.post(
                 f"{self.ollama_base_url}/api/embeddings",
                 json={"model": self.model_name, "prompt": text}
             ) as response:
                 if response.status == 200:
                     data = await response.json()
-                    return np.array(data["embedding"], dtype=np.float32)
+                    embeddings.append(np.array(data["embedding"], dtype=np.float32))
                 else:
                     error_text = await response.text()
                     raise Exception(f"Ollama embedding failed: {response.status} - {error_text}")
+        return embeddings
     
     async def _generate_openai_embedding(self, text: str) -> np.ndarray:
         """Generate embedding using OpenAI."""
+        return (await self._generate_openai_batch([text]))[0]
+    
+    async def _generate_openai_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed several texts with one OpenAI request (list input)."""
         import openai
         
         openai.api_key = self.openai_api_key
         response = await openai.embeddings.create(
             model=self.model_name,
-            input=text
+            input=texts
         )
-        return np.array(response.data[0].embedding, dtype=np.float32)
+        # Results carry the index of their input
+        embeddings = [None] * len(texts)
+        for item in response.data:
+            embeddings[item.index] = np.array(item.embedding, dtype=np.float32)
+        return embeddings
     
     async def store_embedding(
         self, 
         db: AsyncSession,
-        chunk_id: int, 
+        content_hash: str, 
         embedding: np.ndarray
     ) -> int:
         """
         Store an embedding in the database.
+        Embeddings are keyed by chunk content hash, so identical chunks share one row.
         """
         try:
-            # Check if an embedding already exists for this chunk
             result = await db.execute(
-                select(Embedding).where(
-                    Embedding.chunk_id == chunk_id,
-                    Embedding.model_name == self.model_name
-                )
+                self._upsert([self._embedding_row(content_hash, embedding)]).returning(Embedding.id)
             )
-            existing = result.scalar_one_or_none()
-            
-            if existing:
-                # Update the existing embedding
-                existing.embedding = embedding.tolist()
-                await db.commit()
-                return existing.id
-            else:
-                # Insert a new embedding
-                stmt = insert(Embedding).values(
-                    chunk_id=chunk_id,
-                    model_name=self.model_name,
-                    dimensions=self.embedding_dim,
-                    embedding=embedding.tolist()
-                )
-                result = await db.execute(stmt)
-                await db.commit()
-                return result.inserted_primary_key[0]
+            embedding_id = result.scalar_one()
+            await db.commit()
+            return embedding_id
         except Exception as e:
             await db.rollback()
             logger.error(f"Error storing embedding: {e}")
             raise
     
+    async def store_embeddings(
+        self,
+        db: AsyncSession,
+        embeddings: Iterable[Tuple[str, np.ndarray]],
+        batch_size: Optional[int] = None
+    ) -> int:
+        """
+        Store many embeddings with multi-row upserts (INSERT ... ON CONFLICT DO UPDATE)
+        instead of a lookup, a write and a commit per embedding.
+        
+        The rows are flushed in the caller's transaction, which the caller commits
+        (e.g. together with the file the embeddings belong to).
+        
+        Args:
+            db: Database session
+            embeddings: (content_hash, embedding) pairs; a repeated hash keeps its last vector
+            batch_size: Rows per statement
+            
+        Returns:
+            Number of embeddings stored
+        """
+        rows = {}
+        for content_hash, embedding in embeddings:
+            if embedding is not None:
+                rows[content_hash] = self._embedding_row(content_hash, embedding)
+        if not rows:
+            return 0
+        
+        batch_size = batch_size or EMBED_STORE_BATCH_SIZE
+        rows = list(rows.values())
+        try:
+            for start in range(0, len(rows), batch_size):
+                await db.execute(self._upsert(rows[start:start + batch_size]))
+        except Exception as e:
+            logger.error(f"Error storing {len(rows)} embeddings: {e}")
+            raise
+        return len(rows)
+    
+    def _embedding_row(self, content_hash: str, embedding: np.ndarray) -> Dict[str, Any]:
+        return {
+            "content_hash": content_hash,
+            "model_name": self.model_name,
+            "dimensions": len(embedding),
+            "embedding": embedding.tolist()
+        }
+    
+    def _upsert(self, rows: List[Dict[str, Any]]):
+        """INSERT of the rows that replaces the vectors of existing (content_hash, model_name) rows."""
+        stmt = insert(Embedding).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[Embedding.content_hash, Embedding.model_name],
+            set_={"embedding": stmt.excluded.embedding, "dimensions": stmt.excluded.dimensions}
+        )
+    
+    async def get_embedded_hashes(self, db: AsyncSession, content_hashes: List[str]) -> set:
+        """
+        Find which of the given content hashes already have an embedding for the current model.
+        """
+        if not content_hashes:
+            return set()
+        result = await db.execute(
+            select(Embedding.content_hash).where(
+                Embedding.content_hash.in_(content_hashes),
+                Embedding.model_name == self.model_name
+            )
+        )
+        return set(result.scalars().all())
+    
     async def batch_generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
         """
         Generate embeddings for a batch of texts.
+        
+        Ollama and OpenAI get one request per batch planned by plan_batches
+        (EMBED_BATCH_TOKENS / EMBED_BATCH_SIZE). The result is in the order of `texts`.
         """
         try:
+            if not texts:
+                return []
             if self.provider == "sentence_transformers":
-                # Ensure the model is on the correct device
-                if TORCH_AVAILABLE and torch.cuda.is_available():
-                    self.model = self.model.to("cuda")
-                return self.model.encode(texts)
-            else:
-                # For Ollama and OpenAI, process sequentially
-                embeddings = []
-                for text in texts:
-                    embedding = await self.generate_embedding(text)
-                    embeddings.append(embedding)
+                embeddings = await self.encoder.encode_many(texts)
+                self.embedding_dim = self.encoder.dimensions
                 return embeddings
+            if self.provider == "hashed":
+                return self.hashed_embedder.embed_many(texts)
+            
+            generate = self._generate_ollama_batch if self.provider == "ollama" else self._generate_openai_batch
+            embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+            for batch in plan_batches(texts):
+                vectors = await generate([texts[index] for index in batch])
+                if len(vectors) != len(batch):
+                    raise Exception(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+                for index, vector in zip(batch, vectors):
+                    embeddings[index] = vector
+            # The configured dimension is a default; the model's vectors are authoritative
+            self.embedding_dim = len(embeddings[0])
+            return embeddings
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}")
             raise
@@ -204,5 +424,6 @@ class EmbeddingService:
             "provider": self.provider,
             "model": self.model_name,
             "dimension": self.embedding_dim,
-            "base_url": getattr(self, 'ollama_base_url', None) if self.provider == "ollama" else None
+            "base_url": getattr(self, 'ollama_base_url', None) if self.provider == "ollama" else None,
+            "local_encoder": self.encoder.get_stats() if self.provider == "sentence_transformers" else None
         }
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Embedding Store - Durable local cache of chunk embeddings in memory-mapped files
+Keyed by model and chunk content hash, so vectors survive pruning and database rebuilds
+"""
+
+import os
+import re
+import logging
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger("victor-embedding-store")
+
+# Directory of the store (off unless set)
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "")
+
+# Content hashes are SHA-256 hex digests, stored as raw bytes
+DIGEST_BYTES = 32
+
+class EmbeddingStore:
+    """
+    Append-only store of the embeddings of one model.
+
+    Two files per (model, dimensions): `vectors.f32` holds one float32 row per
+    embedding and is read through np.memmap; `index.bin` holds the row's raw
+    content digest in the same order and is loaded into a dict on open. Vectors
+    are appended before their index entry, so an interrupted write leaves at most
+    a tail that is cut off on the next open. One process writes at a time (the
+    indexer); readers only see rows that were complete when they opened or remapped.
+    """
+
+    def __init__(self, model_name: str, dimensions: int, directory: Optional[str] = None):
+        directory = EMBED_CACHE_DIR if directory is None else directory
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * 4
+        self.path = os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)}-{dimensions}")
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.index_path = os.path.join(self.path, "index.bin")
+        self.hits = 0
+        self.misses = 0
+        self._index: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self._load()
+
+    def _load(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        for path in (self.vectors_path, self.index_path):
+            if not os.path.exists(path):
+                open(path, 'ab').close()
+
+        rows = min(
+            os.path.getsize(self.index_path) // DIGEST_BYTES,
+            os.path.getsize(self.vectors_path) // self.row_bytes
+        )
+        # Cut off a partially written tail so both files line up again
+        for path, size in ((self.index_path, rows * DIGEST_BYTES), (self.vectors_path, rows * self.row_bytes)):
+            if os.path.getsize(path) != size:
+                logger.warning(f"Truncating incomplete embedding store file {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        self._index = {data[offset:offset + DIGEST_BYTES]: row for row, offset in enumerate(range(0, len(data), DIGEST_BYTES))}
+        logger.info(f"Embedding store {self.path}: {len(self._index)} vectors")
+
+    def _map(self) -> None:
+        """Map the vector file again after rows were appended."""
+        rows = len(self._index)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dimensions)) if rows else None
+        self._mapped_rows = rows
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, content_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up stored embeddings.
+
+        Returns:
+            Dict of content hash to vector (a copy) for the hashes that are stored
+        """
+        found = {}
+        for content_hash in content_hashes:
+            row = self._index.get(bytes.fromhex(content_hash))
+            if row is None:
+                self.misses += 1
+                continue
+            if row >= self._mapped_rows:
+                self._map()
+            found[content_hash] = np.array(self._vectors[row])
+            self.hits += 1
+        return found
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]) -> int:
+        """
+        Append embeddings that are not stored yet.
+
+        Returns:
+            Number of embeddings added
+        """
+        digests = []
+        rows = []
+        for content_hash, vector in items:
+            digest = bytes.fromhex(content_hash)
+            vector = np.asarray(vector, dtype=np.float32)
+            if digest in self._index or vector.shape != (self.dimensions,):
+                continue
+            self._index[digest] = len(self._index)
+            digests.append(digest)
+            rows.append(vector.tobytes())
+        if not rows:
+            return 0
+
+        with open(self.vectors_path, 'ab') as f:
+            f.write(b''.join(rows))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path, 'ab') as f:
+            f.write(b''.join(digests))
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the size and hit/miss counters of the store."""
+        return {"vectors": len(self._index), "hits": self.hits, "misses": self.misses}
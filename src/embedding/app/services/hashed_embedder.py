@@ -0,0 +1,87 @@
+"""
+Hashed Embedder - Deterministic offline embeddings from hashed n-gram features
+Similar code gets similar vectors without a model or network, for load tests and reproducible benchmarks
+"""
+
+import os
+import re
+import math
+import hashlib
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+# Vector dimension of the "hashed" provider
+HASHED_EMBED_DIM = int(os.getenv("HASHED_EMBED_DIM", "768"))
+
+# Identifiers, numbers and operators; identifiers are also split into their words
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?|[^\sA-Za-z0-9_]{1,3}")
+WORD_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Weights of the feature kinds: whole tokens, identifier words, token bigrams, character trigrams
+KIND_WEIGHTS = {"t": 1.0, "w": 0.5, "b": 0.5, "c": 0.25}
+
+def features(text: str) -> Counter:
+    """
+    Counts of the n-gram features of a text, prefixed with their kind.
+    Case is folded, so "getUnit" and "GetUnit" overlap.
+    """
+    counts: Counter = Counter()
+    previous = None
+    for token in TOKEN_PATTERN.findall(text):
+        lowered = token.lower()
+        counts["t:" + lowered] += 1
+        if len(token) > 3:
+            for word in WORD_PATTERN.findall(token):
+                counts["w:" + word.lower()] += 1
+            for start in range(len(lowered) - 2):
+                counts["c:" + lowered[start:start + 3]] += 1
+        if previous is not None:
+            counts["b:" + previous + " " + lowered] += 1
+        previous = lowered
+    return counts
+
+def bucket(feature: str, dims: int) -> Tuple[int, float]:
+    """Stable bucket and sign of a feature (unlike hash(), the same in every process)."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return (digest >> 1) % dims, 1.0 if digest & 1 else -1.0
+
+class HashedNgramEmbedder:
+    """
+    Feature hashing of code n-grams into a fixed number of dimensions.
+
+    Each feature adds its kind's weight times 1 + log(count) with a hashed sign to
+    a hashed dimension; signs keep collisions from biasing similarities. Vectors
+    are L2-normalized, so cosine similarity reflects shared identifiers, words and
+    character trigrams. Buckets of features seen before are memoized.
+    """
+
+    def __init__(self, dims: int = HASHED_EMBED_DIM):
+        if dims <= 0:
+            raise ValueError(f"Embedding dimension must be positive, got {dims}")
+        self.dims = dims
+        self._buckets = {}
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        cached = self._buckets.get(feature)
+        if cached is None:
+            cached = bucket(feature, self.dims)
+            if len(self._buckets) < 1_000_000:
+                self._buckets[feature] = cached
+        return cached
+
+    def embed(self, text: str) -> np.ndarray:
+        counts = features(text)
+        indexes = np.empty(len(counts), dtype=np.int64)
+        weights = np.empty(len(counts), dtype=np.float64)
+        for position, (feature, count) in enumerate(counts.items()):
+            index, sign = self._bucket(feature)
+            indexes[position] = index
+            weights[position] = sign * KIND_WEIGHTS[feature[0]] * (1.0 + math.log(count))
+        vector = np.bincount(indexes, weights=weights, minlength=self.dims).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        return [self.embed(text) for text in texts]
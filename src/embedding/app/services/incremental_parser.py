@@ -0,0 +1,255 @@
+"""
+Incremental Parser - Re-parses changed Lua files using tree-sitter edits
+Keeps recent trees in an LRU cache so small edits only produce the chunks they touched
+"""
+
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from bisect import bisect_left
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from tree_sitter import Tree
+
+from app.services import lua_parser
+from app.services.lua_parser import KeywordIndex, LuaChunk, SourceBuffer
+from app.services.lua_symbols import SymbolCollector
+
+# Configure logging
+logger = logging.getLogger("victor-incremental-parser")
+
+def common_prefix_length(a: bytes, b: bytes) -> int:
+    """Length of the longest common prefix, found by binary search over slice comparisons."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def common_suffix_length(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the longest common suffix, at most `limit` bytes."""
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def byte_point(data: bytes, offset: int) -> Tuple[int, int]:
+    """Convert a byte offset into the (row, column) point tree-sitter expects."""
+    row = data.count(b'\n', 0, offset)
+    column = offset - (data.rfind(b'\n', 0, offset) + 1)
+    return (row, column)
+
+def compute_edit(old_data: bytes, new_data: bytes) -> Dict[str, Any]:
+    """
+    Describe the change between two versions of a file as a single tree-sitter edit.
+    Everything between the common prefix and common suffix is treated as replaced.
+    """
+    start = common_prefix_length(old_data, new_data)
+    suffix = common_suffix_length(old_data, new_data, min(len(old_data), len(new_data)) - start)
+    old_end = len(old_data) - suffix
+    new_end = len(new_data) - suffix
+    return {
+        "start_byte": start,
+        "old_end_byte": old_end,
+        "new_end_byte": new_end,
+        "start_point": byte_point(old_data, start),
+        "old_end_point": byte_point(old_data, old_end),
+        "new_end_point": byte_point(new_data, new_end),
+    }
+
+def _overlaps(start: int, end: int, ranges: List[Tuple[int, int]]) -> bool:
+    """Check whether the byte range [start, end) touches any changed range."""
+    for range_start, range_end in ranges:
+        if range_start == range_end:
+            # Pure deletion: only chunks that enclosed the deleted bytes changed
+            if start < range_start < end:
+                return True
+        elif start < range_end and range_start < end:
+            return True
+    return False
+
+class IncrementalParser:
+    """
+    Parses Lua files, reusing the previous tree of recently parsed files.
+
+    For a cached file, the difference to the new content is applied to the old
+    tree with `tree.edit` and the file is re-parsed incrementally. Subtrees
+    outside the changed byte ranges are not walked again: their chunks are
+    copied from the previous parse with shifted offsets, and so are their
+    symbols (functions, calls and variables). The result maps each
+    copied chunk to its index in the previous parse, so the indexer only has
+    to embed and store the chunks that changed.
+
+    Parsing is lazy: the tree is parsed and walked as the chunks are consumed, and
+    the chunk list kept for the next incremental parse grows as they are yielded.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = cache_size or int(os.getenv("PARSE_TREE_CACHE_SIZE", "64"))
+        # file_path -> (content hash, source bytes, tree, chunks, keyword index, symbols)
+        self._trees: "OrderedDict[str, Tuple[str, bytes, Tree, List[LuaChunk], KeywordIndex, Dict[str, Any]]]" = OrderedDict()
+
+    def invalidate(self, file_path: str) -> None:
+        """Forget the cached tree for a file, e.g. when indexing it failed."""
+        self._trees.pop(file_path, None)
+
+    def parse(
+        self,
+        file_path: str,
+        content: str,
+        base_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Parse a file, incrementally if the cached tree matches `base_hash`.
+        Nothing is parsed until the chunks are iterated.
+
+        Args:
+            file_path: Path to the Lua file
+            content: New file content
+            base_hash: Content hash of the version the caller's stored chunks came from
+
+        Returns:
+            Dict with an iterator over the formatted "chunks", a "reused" map of new chunk index to
+            previous chunk index for unchanged chunks (each entry is added before its chunk is
+            yielded), whether the parse is "incremental", and the file's "symbols" (see
+            SymbolCollector), set once the chunks are exhausted
+        """
+        cached = self._trees.pop(file_path, None)
+        incremental = (
+            # Sized chunks span several statements, so they are always rebuilt
+            lua_parser.CHUNKING_MODE != 'sized'
+            and cached is not None and base_hash is not None and cached[0] == base_hash
+        )
+        parsed = {"chunks": None, "reused": {}, "symbols": None, "incremental": incremental}
+        parsed["chunks"] = self._iter_chunks(file_path, content, cached if incremental else None, parsed)
+        return parsed
+
+    def _iter_chunks(
+        self,
+        file_path: str,
+        content: str,
+        cached: Optional[Tuple[str, bytes, Tree, List[LuaChunk], KeywordIndex, Dict[str, Any]]],
+        parsed: Dict[str, Any]
+    ) -> Iterator[Dict[str, Any]]:
+        """Parse and walk the file, yielding formatted chunks; caches the tree once the walk is done."""
+        data = content.encode('utf-8')
+        source = SourceBuffer(data)
+        symbols = SymbolCollector(data)
+        chunks: List[LuaChunk] = []
+
+        try:
+            if lua_parser.CHUNKING_MODE == 'sized':
+                tree = lua_parser.get_parser().parse(data)
+                keyword_index = KeywordIndex(data)
+                symbols.collect(tree)
+                walk = iter(lua_parser.size_chunks(tree, source, file_path))
+            elif cached is not None:
+                tree, keyword_index, walk = self._reparse(file_path, source, cached, symbols, parsed["reused"])
+            else:
+                tree = lua_parser.get_parser().parse(data)
+                keyword_index = KeywordIndex(data)
+                walk = lua_parser.iter_chunks(tree, source, file_path, keyword_index, symbols=symbols)
+            for chunk in walk:
+                chunks.append(chunk)
+                # Formatted lazily, so decoded content only exists while the indexer handles it
+                yield lua_parser.format_chunk(chunk)
+        except Exception as e:
+            if chunks:
+                raise
+            logger.error(f"Error parsing file content: {e}")
+            yield from lua_parser.parse_content(content, file_path)
+            parsed["symbols"] = SymbolCollector(data).to_dict()
+            return
+
+        if not chunks:
+            chunks.append(lua_parser.file_chunk(source, file_path, content))
+            yield lua_parser.format_chunk(chunks[0])
+
+        parsed["symbols"] = symbols.to_dict()
+        self._trees[file_path] = (hashlib.md5(data).hexdigest(), data, tree, chunks, keyword_index, parsed["symbols"])
+        while len(self._trees) > self.cache_size:
+            self._trees.popitem(last=False)
+
+        if parsed["incremental"]:
+            reused = len(parsed["reused"])
+            logger.info(f"Incremental parse of {file_path}: {len(chunks) - reused} of {len(chunks)} chunks changed")
+
+    def _reparse(
+        self,
+        file_path: str,
+        source: SourceBuffer,
+        cached: Tuple[str, bytes, Tree, List[LuaChunk], KeywordIndex, Dict[str, Any]],
+        symbols: SymbolCollector,
+        reused: Dict[int, int]
+    ) -> Tuple[Tree, KeywordIndex, Iterator[LuaChunk]]:
+        """
+        Apply the edit to the cached tree and re-parse; the returned walk copies chunks
+        and symbols of unchanged subtrees and records the copies in `reused`.
+        """
+        _, old_data, old_tree, old_chunks, old_keyword_index, old_symbols = cached
+        edit = compute_edit(old_data, source.data)
+        old_tree.edit(**edit)
+        tree = lua_parser.get_parser().parse(source.data, old_tree)
+
+        # Bytes that changed in the new file: the edited text plus anything
+        # tree-sitter had to restructure around it
+        changed_ranges = [(edit["start_byte"], edit["new_end_byte"])]
+        changed_ranges.extend(
+            (changed.start_byte, changed.end_byte) for changed in old_tree.changed_ranges(tree)
+        )
+
+        keyword_index = old_keyword_index.apply_edit(
+            source.data, edit["start_byte"], edit["old_end_byte"], edit["new_end_byte"]
+        )
+
+        # Nodes after the edit moved by the size difference and the number of added lines
+        byte_shift = edit["new_end_byte"] - edit["old_end_byte"]
+        line_shift = edit["new_end_point"][0] - edit["old_end_point"][0]
+        old_starts = [chunk.start_byte for chunk in old_chunks]
+
+        def reuse_subtree(node, parent_id: Optional[int], first_index: int) -> Optional[List[LuaChunk]]:
+            if _overlaps(node.start_byte, node.end_byte, changed_ranges) or not symbols.reusable(node):
+                return None
+
+            if node.start_byte >= edit["new_end_byte"]:
+                shift, lines = byte_shift, line_shift
+            else:
+                shift, lines = 0, 0
+            old_start, old_end = node.start_byte - shift, node.end_byte - shift
+
+            # Chunks are nested or disjoint and stored in pre-order, so the subtree's
+            # chunks follow any enclosing chunk that starts at the same byte
+            copied: Dict[int, int] = {}
+            subtree_chunks: List[LuaChunk] = []
+            index = bisect_left(old_starts, old_start)
+            while index < len(old_chunks) and old_chunks[index].start_byte < old_end:
+                old = old_chunks[index]
+                if old.end_byte <= old_end:
+                    new_index = first_index + len(subtree_chunks)
+                    copied[index] = new_index
+                    reused[new_index] = index
+                    subtree_chunks.append(LuaChunk(
+                        source,
+                        file_path,
+                        old.chunk_type,
+                        old.start_byte + shift,
+                        old.end_byte + shift,
+                        old.line_start + lines,
+                        old.line_end + lines,
+                        parent_id=copied.get(old.parent_id, parent_id),
+                        name=old.name,
+                        dcs_keywords=old.dcs_keywords
+                    ))
+                index += 1
+            symbols.splice(old_symbols, old_start, old_end, shift, lines, copied)
+            return subtree_chunks
+
+        return tree, keyword_index, lua_parser.iter_chunks(tree, source, file_path, keyword_index, reuse_subtree, symbols)
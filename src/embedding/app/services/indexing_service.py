@@ -1,21 +1,41 @@
 import os
 import glob
+import asyncio
 import hashlib
 import logging
-import re
-import time
+import numpy as np
+from contextlib import aclosing
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete, text
+from sqlalchemy import select, insert, update, delete
 
-from app.models import File, CodeChunk
+from app.models import File, CodeChunk, SearchChunk, Embedding, Function, FunctionCall, Variable
+from app.services import lua_parser
 from app.services.embedding_service import EmbeddingService
+from app.services.embedding_executor import EmbeddingExecutor, EmbeddingRun
+from app.services.embedding_store import EmbeddingStore, EMBED_CACHE_DIR
+from app.services.dependency_service import DependencyService
 from app.services.lua_parser import LuaParser
+from app.services.incremental_parser import IncrementalParser
+from app.services.parsing_stage import ParsingStage
 
 # Configure logging
 logger = logging.getLogger("victor-indexing-service")
 
+# Chunks whose content is queued before it is embedded in one go
+EMBED_QUEUE_SIZE = int(os.getenv("EMBED_QUEUE_SIZE", "32"))
+# Files whose stored content hash is looked up per query when a directory is indexed
+UNCHANGED_CHECK_BATCH_SIZE = 1000
+
+def file_content_hash(file_path: str) -> Optional[str]:
+    """The content hash index_file computes for a file, or None if it cannot be read."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return hashlib.md5(f.read().encode()).hexdigest()
+    except Exception:
+        return None
+
 class IndexingService:
     """
     Service for indexing Lua code files into the database.
@@ -24,16 +44,45 @@ class IndexingService:
     def __init__(self, embedding_service: EmbeddingService):
         self.embedding_service = embedding_service
         self.lua_parser = LuaParser()
+        self.incremental_parser = IncrementalParser()
+        self.dependency_service = DependencyService()
+        self.embedding_executor = EmbeddingExecutor(embedding_service)
+        self._embedding_store: Optional[EmbeddingStore] = None
+    
+    def set_embedding_service(self, embedding_service: EmbeddingService) -> None:
+        """Embed from now on with another model (after a re-embedding switch-over)."""
+        self.embedding_service = embedding_service
+        self.embedding_executor.embedding_service = embedding_service
     
     async def index_file(
         self, 
         db: AsyncSession,
         file_path: str,
-        content: Optional[str] = None
+        content: Optional[str] = None,
+        chunks: Optional[List[Dict[str, Any]]] = None,
+        symbols: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        refresh_dependencies: bool = True,
+        embedding_run: Optional[EmbeddingRun] = None
     ) -> bool:
         """
         Index a single file into the database.
+        If chunks (and symbols) are provided (e.g. from the parsing stage), the file is not parsed again.
+        Otherwise a recently indexed file is re-parsed incrementally and only its
+        changed chunks are re-created and re-embedded.
+        With refresh_dependencies=False the dependency closure is left for a later
+        `dependency_service.refresh` (e.g. once per directory).
+        
+        Embeddings are requested through the embedding executor while chunks are
+        still being parsed and written. With a shared embedding_run (e.g. one per
+        directory) results that are not back yet are stored by later files or by the
+        caller's `finish`; embeddings are keyed by content, so they may land after
+        the file's commit.
         """
+        own_run = embedding_run is None
+        run = embedding_run or self.embedding_executor.start()
+        # Embeddings the run delivered while this file was indexed; with a shared run
+        # they include other files' content, so they are kept if this file fails
+        delivered: List[Tuple[str, np.ndarray]] = []
         try:
             # Check if file exists
             if not os.path.exists(file_path) and not content:
@@ -73,6 +122,7 @@ class IndexingService:
             existing_file = result.scalar_one_or_none()
             
             file_id = None
+            previous_hash = None
             if existing_file:
                 # Check if the file has changed
                 if existing_file.content_hash == content_hash:
@@ -80,16 +130,12 @@ class IndexingService:
                     return True
                 
                 # Update the existing file
+                previous_hash = existing_file.content_hash
                 existing_file.last_modified = last_modified
                 existing_file.size_bytes = size_bytes
                 existing_file.content_hash = content_hash
                 existing_file.updated_at = datetime.now()
                 file_id = existing_file.id
-                
-                # Delete existing chunks
-                await db.execute(
-                    delete(CodeChunk).where(CodeChunk.file_id == file_id)
-                )
             else:
                 # Insert new file
                 stmt = insert(File).values(
@@ -105,39 +151,426 @@ class IndexingService:
                 result = await db.execute(stmt)
                 file_id = result.inserted_primary_key[0]
             
-            # Parse the file into chunks
-            chunks = await self.lua_parser.parse_file_content(content, file_path)
-            
-            # Insert chunks and generate embeddings
-            for idx, chunk in enumerate(chunks):
-                # Insert chunk
-                stmt = insert(CodeChunk).values(
-                    file_id=file_id,
-                    chunk_index=idx,
-                    chunk_type=chunk["type"],
-                    content=chunk["content"],
-                    start_line=chunk["start_line"],
-                    end_line=chunk["end_line"],
-                    metadata=chunk["metadata"],
-                    created_at=datetime.now(),
-                    updated_at=datetime.now()
+            # Parse the file into chunks; the parser runs as they are streamed
+            parsed = None
+            if chunks is None:
+                parsed = self.incremental_parser.parse(file_path, content, base_hash=previous_hash)
+                chunks = parsed["chunks"]
+            
+            # Stored rows by previous chunk index; the reused ones are claimed as chunks are streamed
+            old_rows: Dict[int, int] = {}
+            if existing_file:
+                if parsed is not None and parsed["incremental"]:
+                    old_rows = await self._park_chunks(db, file_id)
+                else:
+                    # Delete existing chunks
+                    await db.execute(
+                        delete(CodeChunk).where(CodeChunk.file_id == file_id)
+                    )
+            
+            # Chunks are stored as the parser yields them. In hierarchical mode a chunk
+            # is held back until the next one shows whether it has children, since
+            # parents are summarized instead of embedded.
+            state = {
+                "file_id": file_id,
+                "chunk_ids": {},
+                "reused": parsed["reused"] if parsed is not None else {},
+                "old_rows": old_rows,
+                "reused_updates": [],
+                "pending": [],
+                "embedded": set(),
+                "deduplicated": 0,
+                "stored_locally": 0,
+                "hierarchical": lua_parser.CHUNKING_MODE == "hierarchical",
+                "children": {},
+                "content_hashes": {},
+                "summarized": [],
+                "embedding_run": run,
+                "delivered": delivered
+            }
+            held = None
+            idx = 0
+            async with aclosing(lua_parser.stream_chunks(chunks)) as stream:
+                async for chunk in stream:
+                    parent_index = chunk.get("parent_index")
+                    state["content_hashes"][idx] = chunk["content_hash"]
+                    if parent_index is not None:
+                        state["children"].setdefault(parent_index, []).append(idx)
+                    
+                    if held is not None:
+                        await self._store_chunk(db, state, held[0], held[1], has_children=parent_index == held[0])
+                    held = (idx, chunk)
+                    idx += 1
+            if held is not None:
+                await self._store_chunk(db, state, held[0], held[1], has_children=False)
+            if parsed is not None:
+                symbols = parsed["symbols"]
+            await self._flush_embeddings(db, state)
+            if own_run or state["hierarchical"]:
+                # Summaries are built from the stored vectors of the children
+                await self._store_embedding_results(db, await run.finish(), delivered)
+            
+            if state["summarized"]:
+                await self._store_summary_embeddings(db, state)
+            
+            if old_rows:
+                # Rows of chunks that changed or disappeared
+                kept = {row["id"] for row in state["reused_updates"]}
+                stale_ids = [row_id for row_id in old_rows.values() if row_id not in kept]
+                if stale_ids:
+                    await db.execute(
+                        delete(CodeChunk).where(CodeChunk.id.in_(stale_ids))
+                    )
+            if state["reused_updates"]:
+                await db.execute(update(CodeChunk), state["reused_updates"])
+            
+            if symbols is not None:
+                await self._store_symbols(db, file_id, symbols, state["chunk_ids"])
+                await self.dependency_service.update_file(
+                    db, file_id, file_path, symbols["dependencies"], new_file=existing_file is None
                 )
-                result = await db.execute(stmt)
-                chunk_id = result.inserted_primary_key[0]
-                
-                # Generate and store embedding
-                embedding = await self.embedding_service.generate_embedding(chunk["content"])
-                await self.embedding_service.store_embedding(db, chunk_id, embedding)
+                if refresh_dependencies:
+                    await self.dependency_service.refresh(db)
             
+            deduplicated = state["deduplicated"]
+            stored_locally = state["stored_locally"]
             await db.commit()
+            if deduplicated:
+                logger.info(f"Reused existing embeddings for {deduplicated} duplicate chunks in {file_path}")
+            if stored_locally:
+                logger.info(f"Restored {stored_locally} embeddings from the local embedding store for {file_path}")
             logger.info(f"Successfully indexed file: {file_path}")
             return True
             
         except Exception as e:
+            if own_run:
+                run.cancel()
             await db.rollback()
+            self.incremental_parser.invalidate(file_path)
             logger.error(f"Error indexing file {file_path}: {e}")
+            if not own_run and delivered:
+                await self._restore_delivered(db, delivered)
             return False
     
+    async def _store_chunk(
+        self,
+        db: AsyncSession,
+        state: Dict[str, Any],
+        idx: int,
+        chunk: Dict[str, Any],
+        has_children: bool
+    ) -> None:
+        """
+        Write one streamed chunk and queue its content for embedding.
+        
+        Rows kept from the previous parse only get their position updated. New
+        chunks are inserted; their parent's row always exists already because
+        chunks are streamed in pre-order.
+        """
+        parent_id = state["chunk_ids"].get(chunk.get("parent_index"))
+        row_id = state["old_rows"].get(state["reused"].get(idx))
+        
+        # In hierarchical mode parents are not embedded themselves
+        summarized = state["hierarchical"] and has_children
+        metadata = chunk["metadata"]
+        if summarized:
+            metadata = {**metadata, "embedding": "summary"}
+        
+        if row_id is not None:
+            state["chunk_ids"][idx] = row_id
+            state["reused_updates"].append({
+                "id": row_id,
+                "chunk_index": idx,
+                "start_line": chunk["start_line"],
+                "end_line": chunk["end_line"],
+                "parent_id": parent_id,
+                "meta_data": metadata,
+                "updated_at": datetime.now()
+            })
+            return
+        
+        if summarized:
+            state["summarized"].append(idx)
+        
+        # Insert chunk
+        stmt = insert(CodeChunk).values(
+            file_id=state["file_id"],
+            chunk_index=idx,
+            chunk_type=chunk["type"],
+            content=chunk["content"],
+            start_line=chunk["start_line"],
+            end_line=chunk["end_line"],
+            content_hash=chunk["content_hash"],
+            parent_id=parent_id,
+            meta_data=metadata,
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        )
+        result = await db.execute(stmt)
+        state["chunk_ids"][idx] = result.inserted_primary_key[0]
+        
+        if summarized:
+            return
+        
+        if chunk["content_hash"] in state["embedded"]:
+            state["deduplicated"] += 1
+            return
+        state["embedded"].add(chunk["content_hash"])
+        state["pending"].append((chunk["content_hash"], chunk["content"]))
+        if len(state["pending"]) >= EMBED_QUEUE_SIZE:
+            await self._flush_embeddings(db, state)
+    
+    async def _flush_embeddings(self, db: AsyncSession, state: Dict[str, Any]) -> None:
+        """
+        Submit the queued chunk contents to the embedding run and store the
+        embeddings that have come back so far.
+        Embeddings are shared by content, so code already embedded (or submitted)
+        for any other file or branch checkout is not embedded again. Content the
+        database has no embedding for is looked up in the local embedding store
+        before it goes to the provider.
+        """
+        pending = state["pending"]
+        run = state["embedding_run"]
+        if pending:
+            state["pending"] = []
+            existing = await self.embedding_service.get_embedded_hashes(
+                db, [content_hash for content_hash, _ in pending if content_hash not in run.submitted]
+            )
+            missing = []
+            for content_hash, chunk_content in pending:
+                if content_hash in existing or content_hash in run.submitted:
+                    state["deduplicated"] += 1
+                    continue
+                missing.append((content_hash, chunk_content))
+            
+            store = self._get_embedding_store()
+            stored = store.get_many([content_hash for content_hash, _ in missing]) if store is not None else {}
+            if stored:
+                state["stored_locally"] += await self.embedding_service.store_embeddings(db, stored.items())
+            for content_hash, chunk_content in missing:
+                if content_hash not in stored:
+                    await run.submit(content_hash, chunk_content)
+        
+        await self._store_embedding_results(db, run.ready(), state["delivered"])
+    
+    async def _store_embedding_results(
+        self,
+        db: AsyncSession,
+        results: List[Tuple[str, Optional[np.ndarray]]],
+        delivered: Optional[List[Tuple[str, np.ndarray]]] = None
+    ) -> None:
+        """
+        Store embeddings delivered by an embedding run in the database (in the current
+        transaction) and the local embedding store; items that failed all retries are
+        skipped. Stored items are appended to `delivered` if given.
+        """
+        results = [(content_hash, embedding) for content_hash, embedding in results if embedding is not None]
+        await self.embedding_service.store_embeddings(db, results)
+        if delivered is not None:
+            delivered.extend(results)
+        
+        store = self._get_embedding_store()
+        if store is not None and results:
+            store.put_many(results)
+    
+    async def _restore_delivered(self, db: AsyncSession, delivered: List[Tuple[str, np.ndarray]]) -> None:
+        """
+        Store again, in a transaction of their own, the embeddings a shared run delivered
+        while a file that failed was indexed. Most of them belong to files that were
+        already committed and would otherwise be left without vectors.
+        """
+        try:
+            await self.embedding_service.store_embeddings(db, delivered)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error storing {len(delivered)} embeddings delivered during a failed file: {e}")
+    
+    def _get_embedding_store(self) -> Optional[EmbeddingStore]:
+        """The local embedding store of the current model, or None if EMBED_CACHE_DIR is empty or unusable."""
+        if not EMBED_CACHE_DIR:
+            return None
+        model_name = self.embedding_service.model_name
+        dimensions = self.embedding_service.embedding_dim
+        store = self._embedding_store
+        if store is None or store.model_name != model_name or store.dimensions != dimensions:
+            try:
+                store = EmbeddingStore(model_name, dimensions)
+            except OSError as e:
+                logger.warning(f"Local embedding store unavailable: {e}")
+                return None
+            self._embedding_store = store
+        return store
+    
+    async def _park_chunks(self, db: AsyncSession, file_id: int) -> Dict[int, int]:
+        """
+        Move the stored chunks of a file out of the way of new chunk indexes before
+        an incremental parse is streamed.
+        
+        Rows of unchanged chunks get their new chunk_index, line numbers and parent
+        as the chunks are streamed; the others are deleted afterwards.
+        
+        Returns:
+            Row id of each stored chunk, by its previous chunk index
+        """
+        result = await db.execute(
+            select(CodeChunk.id, CodeChunk.chunk_index).where(CodeChunk.file_id == file_id)
+        )
+        rows = result.all()
+        if not rows:
+            return {}
+        
+        # Negative indexes cannot collide with new ones on the (file_id, chunk_index) unique constraint
+        await db.execute(
+            update(CodeChunk)
+            .where(CodeChunk.file_id == file_id)
+            .values(chunk_index=-CodeChunk.chunk_index - 1)
+        )
+        return {row.chunk_index: row.id for row in rows}
+    
+    async def _store_summary_embeddings(self, db: AsyncSession, state: Dict[str, Any]) -> None:
+        """
+        Give each new parent chunk the normalized mean of its children's vectors.
+        
+        Parents are summarized bottom-up, so a nested parent's summary feeds into its
+        own parent's. Child vectors are loaded from the database, where they were
+        stored when embedded by this or an earlier run.
+        """
+        children = state["children"]
+        content_hashes = state["content_hashes"]
+        parents = sorted(state["summarized"], reverse=True)
+        
+        existing = await self.embedding_service.get_embedded_hashes(
+            db, list({content_hashes[idx] for idx in parents})
+        )
+        parents = [idx for idx in parents if content_hashes[idx] not in existing]
+        if not parents:
+            return
+        
+        vectors: Dict[str, np.ndarray] = {}
+        child_hashes = {content_hashes[child] for idx in parents for child in children[idx]}
+        result = await db.execute(
+            select(Embedding.content_hash, Embedding.embedding).where(
+                Embedding.content_hash.in_(list(child_hashes)),
+                Embedding.model_name == self.embedding_service.model_name
+            )
+        )
+        for row in result:
+            vectors[row.content_hash] = np.asarray(row.embedding, dtype=np.float32)
+        
+        summaries = []
+        for idx in parents:
+            content_hash = content_hashes[idx]
+            if content_hash in vectors:
+                # Same content as a parent summarized earlier in this file
+                continue
+            child_vectors = [
+                vectors[content_hashes[child]] for child in children[idx]
+                if content_hashes[child] in vectors
+            ]
+            if not child_vectors:
+                continue
+            summary = np.mean(child_vectors, axis=0)
+            norm = np.linalg.norm(summary)
+            if norm > 0:
+                summary = summary / norm
+            vectors[content_hash] = summary
+            summaries.append((content_hash, summary))
+        await self.embedding_service.store_embeddings(db, summaries)
+    
+    async def _store_symbols(
+        self,
+        db: AsyncSession,
+        file_id: int,
+        symbols: Dict[str, List[Dict[str, Any]]],
+        chunk_ids: Dict[int, int]
+    ) -> None:
+        """
+        Replace the file's rows in the functions, function_calls and variables tables.
+        
+        Each table is written with one bulk insert. A call resolves to a function of
+        the same file first, then to any indexed function with the same name.
+        """
+        await db.execute(delete(FunctionCall).where(FunctionCall.file_id == file_id))
+        await db.execute(delete(Variable).where(Variable.file_id == file_id))
+        await db.execute(delete(Function).where(Function.file_id == file_id))
+        
+        now = datetime.now()
+        function_ids = []
+        if symbols["functions"]:
+            result = await db.execute(
+                insert(Function).returning(Function.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "file_id": file_id,
+                        "chunk_id": chunk_ids.get(function["chunk_index"]),
+                        "name": function["name"],
+                        "signature": function["signature"],
+                        "start_line": function["start_line"],
+                        "end_line": function["end_line"],
+                        "meta_data": {"scope": function["scope"]},
+                        "created_at": now,
+                        "updated_at": now
+                    }
+                    for function in symbols["functions"]
+                ]
+            )
+            function_ids = list(result.scalars().all())
+        
+        if symbols["calls"]:
+            targets: Dict[str, int] = {}
+            for function, function_id in zip(symbols["functions"], function_ids):
+                targets.setdefault(function["name"], function_id)
+            
+            unresolved = {call["name"] for call in symbols["calls"]} - set(targets)
+            if unresolved:
+                result = await db.execute(
+                    select(Function.name, Function.id)
+                    .where(Function.name.in_(list(unresolved)))
+                    .order_by(Function.id)
+                )
+                for row in result:
+                    targets.setdefault(row.name, row.id)
+            
+            await db.execute(insert(FunctionCall), [
+                {
+                    "source_function_id": function_ids[call["caller"]] if call["caller"] is not None else None,
+                    "target_function_id": targets.get(call["name"]),
+                    "file_id": file_id,
+                    "name": call["name"],
+                    "line_number": call["line"],
+                    "created_at": now
+                }
+                for call in symbols["calls"]
+            ])
+        
+        if symbols["variables"]:
+            await db.execute(insert(Variable), [
+                {
+                    "file_id": file_id,
+                    "name": variable["name"],
+                    "var_type": variable["var_type"],
+                    "scope": variable["scope"],
+                    "line_number": variable["line"],
+                    "created_at": now
+                }
+                for variable in symbols["variables"]
+            ])
+    
+    async def prune_embeddings(self, db: AsyncSession) -> int:
+        """
+        Delete embeddings whose content no longer appears in any chunk.
+        Embeddings are shared by content hash, so they are not removed by the chunk cascade.
+        Contents of lua_chunks are kept: search reads their vectors after a switch-over.
+        """
+        result = await db.execute(
+            delete(Embedding).where(
+                ~select(CodeChunk.id).where(CodeChunk.content_hash == Embedding.content_hash).exists(),
+                ~select(SearchChunk.id).where(SearchChunk.content_hash == Embedding.content_hash).exists()
+            )
+        )
+        return result.rowcount
+    
     def _should_exclude_file(self, file_path: str) -> bool:
         """
         Check if a file should be excluded from indexing.
@@ -171,16 +604,43 @@ class IndexingService:
             
         return False
 
+    async def _changed_files(self, db: AsyncSession, files: List[str]) -> List[str]:
+        """
+        Files whose content differs from the indexed version, or that are not indexed.
+        Files that cannot be read are kept, so the parsing stage reports them.
+        """
+        loop = asyncio.get_running_loop()
+        changed = []
+        for i in range(0, len(files), UNCHANGED_CHECK_BATCH_SIZE):
+            batch = files[i:i + UNCHANGED_CHECK_BATCH_SIZE]
+            result = await db.execute(
+                select(File.file_path, File.content_hash).where(File.file_path.in_(batch))
+            )
+            stored = {row.file_path: row.content_hash for row in result}
+            # Reading the files would block the event loop
+            hashes = await loop.run_in_executor(None, lambda: [file_content_hash(f) for f in batch])
+            changed.extend(
+                file_path for file_path, content_hash in zip(batch, hashes)
+                if content_hash is None or stored.get(file_path) != content_hash
+            )
+        return changed
+
     async def index_directory(
         self,
         db: AsyncSession,
         directory_path: str,
         recursive: bool = True,
-        file_pattern: str = "*.lua"
+        file_pattern: str = "*.lua",
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Index all matching files in a directory.
+        Files whose content hash matches the indexed version are skipped before parsing;
+        the others are parsed in parallel by the parsing stage and indexed as their
+        chunks arrive.
         """
+        embedding_run = None
         try:
             # Check if directory exists
             if not os.path.isdir(directory_path):
@@ -199,25 +659,58 @@ class IndexingService:
             logger.info(f"Excluded {excluded_count} files based on exclusion patterns")
             logger.info(f"Will index {len(files)} files")
             
-            # Index each file
-            indexed = 0
+            # Only changed and new files are parsed; unchanged ones count as indexed
+            changed = await self._changed_files(db, files)
+            unchanged = len(files) - len(changed)
+            logger.info(f"Skipping {unchanged} unchanged files")
+            
+            # Index each file as soon as the parsing stage hands it back
+            indexed = unchanged
             failed = 0
+            parsing_stage = ParsingStage(workers=workers, chunk_size=chunk_size)
+            embedding_run = self.embedding_executor.start()
             
-            for file_path in files:
-                if await self.index_file(db, file_path):
+            async for parsed in parsing_stage.parse_files(changed):
+                if parsed["error"]:
+                    logger.error(f"Error reading file {parsed['file_path']}: {parsed['error']}")
+                    failed += 1
+                    continue
+                
+                if await self.index_file(
+                    db, parsed["file_path"], parsed["content"], chunks=parsed["chunks"], symbols=parsed["symbols"],
+                    refresh_dependencies=False, embedding_run=embedding_run
+                ):
                     indexed += 1
                 else:
                     failed += 1
             
-            logger.info(f"Indexed {indexed} files, {failed} failed")
+            # Store the embeddings still in flight
+            await self._store_embedding_results(db, await embedding_run.finish())
+            
+            # Update the dependency closure and load order once for the whole directory
+            await self.dependency_service.refresh(db)
+            
+            # Drop embeddings of content that changed or disappeared in every file
+            pruned = await self.prune_embeddings(db)
+            await db.commit()
+            
+            parse_stats = parsing_stage.get_stats()
+            logger.info(f"Indexed {indexed} files, {failed} failed, pruned {pruned} unused embeddings")
             return {
                 "success": True,
                 "indexed": indexed,
                 "failed": failed,
-                "excluded": excluded_count
+                "excluded": excluded_count,
+                "unchanged": unchanged,
+                "parse_files_per_sec": parse_stats["files_per_sec"],
+                "parse_workers": parse_stats["workers"],
+                "parse_cache_hits": parse_stats["cache_hits"]
             }
             
         except Exception as e:
+            if embedding_run is not None:
+                embedding_run.cancel()
+            await db.rollback()
             logger.error(f"Error indexing directory {directory_path}: {e}")
             return {"success": False, "indexed": 0, "failed": 0, "error": str(e)}
     
@@ -240,8 +733,12 @@ class IndexingService:
                 logger.warning(f"File not found in database: {file_path}")
                 return False
             
-            # Delete the file (will cascade to chunks and embeddings)
+            # Delete the file (will cascade to chunks), then any embeddings no other chunk shares
+            await self.dependency_service.remove_file(db, file.id)
             await db.delete(file)
+            await db.flush()
+            await self.dependency_service.refresh(db)
+            await self.prune_embeddings(db)
             await db.commit()
             
             logger.info(f"Successfully deleted file: {file_path}")
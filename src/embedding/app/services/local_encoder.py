@@ -0,0 +1,192 @@
+"""
+Local Encoder - Runs a Sentence Transformers model off the event loop
+The device and backend are resolved once; encoding happens in a dedicated thread and concurrent requests are batched
+"""
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger("victor-local-encoder")
+
+# Device: "auto" picks cuda, then mps, then cpu
+ST_DEVICE = os.getenv("ST_DEVICE", "auto")
+# Backend: "torch", "onnx" (ONNX Runtime, needs sentence-transformers>=3.2 with onnxruntime)
+# or "int8" (torch with dynamically quantized linear layers, CPU only)
+ST_BACKEND = os.getenv("ST_BACKEND", "torch")
+# Intra-op threads of the encoder thread (0 keeps the torch default)
+ST_THREADS = int(os.getenv("ST_THREADS", "0"))
+# Texts per forward pass, and how long a single request waits for others to share its batch
+ST_BATCH_SIZE = int(os.getenv("ST_BATCH_SIZE", "32"))
+ST_BATCH_WAIT_MS = float(os.getenv("ST_BATCH_WAIT_MS", "5"))
+
+BACKENDS = ("torch", "onnx", "int8")
+
+class LocalEncoder:
+    """
+    Sentence Transformers model run in one dedicated thread.
+
+    The model is loaded by that thread on first use, on the device resolved once at
+    load time. Encoding never runs on the event loop: `encode_many` hands a batch to
+    the thread, and `encode` queues a single text for up to `batch_wait_ms` so
+    concurrent requests (e.g. several searches) share one forward pass.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: Optional[str] = None,
+        backend: Optional[str] = None,
+        threads: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        batch_wait_ms: Optional[float] = None
+    ):
+        self.model_name = model_name
+        self.device = device or ST_DEVICE
+        self.backend = backend or ST_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown sentence_transformers backend: {self.backend} (expected one of {', '.join(BACKENDS)})")
+        self.threads = ST_THREADS if threads is None else threads
+        self.batch_size = batch_size or ST_BATCH_SIZE
+        self.batch_wait = (ST_BATCH_WAIT_MS if batch_wait_ms is None else batch_wait_ms) / 1000
+        self.model = None
+        self.dimensions: Optional[int] = None
+        self.stats = {"requests": 0, "batches": 0, "items": 0, "encode_seconds": 0.0}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Single texts waiting to be encoded together: (text, future)
+        self._waiting: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # One worker: the model is not shared between threads, and torch parallelizes each pass itself
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="victor-encoder")
+        return self._executor
+
+    def _resolve_device(self, torch) -> str:
+        if self.device != "auto":
+            return self.device
+        if torch.cuda.is_available():
+            return "cuda"
+        mps = getattr(torch.backends, "mps", None)
+        if mps is not None and mps.is_available():
+            return "mps"
+        return "cpu"
+
+    def _load(self):
+        """Load the model on first use (runs in the encoder thread)."""
+        if self.model is not None:
+            return self.model
+
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ValueError(f"sentence_transformers and PyTorch are required for local embeddings: {e}")
+
+        device = self._resolve_device(torch)
+        if self.backend == "int8" and device != "cpu":
+            logger.warning(f"int8 quantization runs on the CPU only, ignoring device {device}")
+            device = "cpu"
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+
+        if self.backend == "onnx":
+            try:
+                model = SentenceTransformer(self.model_name, device=device, backend="onnx")
+            except TypeError:
+                raise ValueError("The onnx backend needs sentence-transformers>=3.2 (pip install 'sentence-transformers[onnx]')")
+        else:
+            model = SentenceTransformer(self.model_name, device=device)
+            model.eval()
+            if self.backend == "int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        self.device = device
+        self.dimensions = model.get_sentence_embedding_dimension()
+        self.model = model
+        logger.info(f"Sentence Transformers model {self.model_name} loaded on {device} ({self.backend}). Dimension: {self.dimensions}")
+        return model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with the model (runs in the encoder thread)."""
+        model = self._load()
+        start = time.perf_counter()
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        self.stats["encode_seconds"] += time.perf_counter() - start
+        self.stats["batches"] += 1
+        self.stats["items"] += len(texts)
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def load(self) -> None:
+        """Load the model ahead of the first request, e.g. on application startup."""
+        await asyncio.get_running_loop().run_in_executor(self._get_executor(), self._load)
+
+    async def encode_many(self, texts: List[str]) -> List[np.ndarray]:
+        """Encode texts in the encoder thread; sentence_transformers sorts them by length into batches itself."""
+        if not texts:
+            return []
+        self.stats["requests"] += 1
+        vectors = await asyncio.get_running_loop().run_in_executor(self._get_executor(), self._encode, texts)
+        return list(vectors)
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Encode one text. It waits up to `batch_wait_ms` for other single texts and is
+        encoded together with them, at most `batch_size` per pass.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiting.append((text, future))
+        if len(self._waiting) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        waiting, self._waiting = self._waiting, []
+        if waiting:
+            asyncio.ensure_future(self._encode_waiting(waiting))
+
+    async def _encode_waiting(self, waiting: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await self.encode_many([text for text, _ in waiting])
+        except Exception as e:
+            for _, future in waiting:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(waiting, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def close(self) -> None:
+        """Stop the encoder thread; a later request starts a new one."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the device, backend and batching counters of the encoder."""
+        return {
+            **self.stats,
+            "device": self.device,
+            "backend": self.backend,
+            "loaded": self.model is not None,
+            "mean_batch": self.stats["items"] / self.stats["batches"] if self.stats["batches"] else 0.0
+        }
@@ -5,16 +5,29 @@ Ported from dcs-lua-analyzer project
 
 import os
 import re
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
-import tree_sitter_languages as tsl
-from tree_sitter import Node
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple, Union
+from tree_sitter import Node, Tree
 
 # Configure logging
 logger = logging.getLogger("victor-lua-parser")
 
-# Get the Lua parser
-parser = tsl.get_parser("lua")
+# The tree-sitter Lua parser, created by get_parser on first use. Loading the
+# grammar bundle is slow, and services that import this module may never parse.
+parser = None
+
+def get_parser():
+    """Return the shared tree-sitter Lua parser, loading the grammar on first use."""
+    global parser
+    if parser is None:
+        import tree_sitter_languages as tsl
+        parser = tsl.get_parser("lua")
+    return parser
 
 # Lua node types to extract as separate chunks
 CHUNK_NODE_TYPES = {
@@ -31,6 +44,37 @@ CHUNK_NODE_TYPES = {
     'return_statement'
 }
 
+# Function node types; leading comments are attached to these in sized chunking
+FUNCTION_NODE_TYPES = {
+    'function_declaration',
+    'function_definition',
+    'local_function_definition',
+    'local_function_declaration',
+    'function_definition_statement',
+    'local_function_definition_statement'
+}
+
+# Chunking mode: "ast" emits one chunk per CHUNK_NODE_TYPES node, "sized" emits
+# token-bounded chunks (see size_chunks). "hierarchical" chunks like "ast", but the
+# indexer only embeds leaf chunks and gives parents a summary of their children's vectors
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "ast")
+
+# Token budgets for sized chunking, estimated at 4 characters per token
+CHARS_PER_TOKEN = 4
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "256"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "1024"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+# Parsed chunks that may wait for the indexer before the parser pauses
+CHUNK_QUEUE_SIZE = int(os.getenv("CHUNK_QUEUE_SIZE", "64"))
+
+# Thread stream_chunks runs iterators in, created by get_parse_executor on first use
+_parse_executor: Optional[ThreadPoolExecutor] = None
+
+# Bump whenever the chunks or symbols produced for the same source change;
+# results in the on-disk parse cache are keyed by it
+PARSER_VERSION = 2
+
 # Keywords that might indicate DCS-specific content
 DCS_KEYWORDS = {
     'coalition', 'country', 'trigger', 'action', 'condition',
@@ -39,12 +83,220 @@ DCS_KEYWORDS = {
     'timer', 'scheduler', 'radio', 'marker', 'smoke', 'flare'
 }
 
-def extract_node_text(source_code: str, node: Node) -> str:
-    """Extract the text content of a tree-sitter node."""
-    return source_code[node.start_byte:node.end_byte]
+# One pattern for all keywords. The lookahead reports a match at every offset,
+# so overlapping keywords are found, and longer keywords are tried first.
+DCS_KEYWORD_PATTERN = re.compile(
+    b'(?=(' + b'|'.join(re.escape(kw.encode('utf-8')) for kw in sorted(DCS_KEYWORDS, key=len, reverse=True)) + b'))'
+)
+
+# Longest keyword, i.e. how far a match can reach across an edit boundary
+DCS_KEYWORD_MAX_LENGTH = max(len(kw) for kw in DCS_KEYWORDS)
+
+# Shorter keywords that also match wherever a longer keyword starting with them matches
+DCS_KEYWORD_PREFIXES = {
+    kw: [other for other in DCS_KEYWORDS if other != kw and kw.startswith(other)]
+    for kw in DCS_KEYWORDS
+}
+
+# Fields exposed by LuaChunk.to_dict and item access
+CHUNK_FIELDS = ('file_path', 'chunk_type', 'content', 'meta_data', 'line_start', 'line_end', 'parent_id')
+
+class SourceBuffer:
+    """
+    UTF-8 source of one file, shared by all of its chunks.
+    Chunks keep byte offsets into it and only decode text when it is requested.
+    """
+    
+    __slots__ = ('data', 'view')
+    
+    def __init__(self, data: bytes):
+        self.data = data
+        self.view = memoryview(data)
+    
+    def text(self, start: int, end: int) -> str:
+        """Decode the bytes in [start, end) without copying the rest of the buffer."""
+        return str(self.view[start:end], 'utf-8', 'replace')
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def __reduce__(self):
+        # memoryview cannot be pickled, so rebuild it from the bytes
+        return (SourceBuffer, (self.data,))
+
+class LuaChunk:
+    """
+    A chunk of a Lua file, stored as a byte range into the file's SourceBuffer.
+    
+    `content` and `meta_data` are built on access; `extra` holds any additional
+    metadata, such as the window position of a split chunk. Item access
+    (chunk['content']) is supported for callers written against the old dict-based chunks.
+    """
+    
+    __slots__ = (
+        'source', 'file_path', 'chunk_type', 'start_byte', 'end_byte',
+        'line_start', 'line_end', 'parent_id', 'name', 'dcs_keywords', 'extra'
+    )
+    
+    def __init__(
+        self,
+        source: SourceBuffer,
+        file_path: str,
+        chunk_type: str,
+        start_byte: int,
+        end_byte: int,
+        line_start: int,
+        line_end: int,
+        parent_id: Optional[int] = None,
+        name: Optional[str] = None,
+        dcs_keywords: Optional[List[str]] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        self.source = source
+        self.file_path = file_path
+        self.chunk_type = chunk_type
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.line_start = line_start
+        self.line_end = line_end
+        self.parent_id = parent_id
+        self.name = name
+        self.dcs_keywords = dcs_keywords
+        self.extra = extra
+    
+    @property
+    def content(self) -> str:
+        return self.source.text(self.start_byte, self.end_byte)
+    
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the chunk's bytes; identical code in any file gets the same hash."""
+        return hashlib.sha256(self.source.view[self.start_byte:self.end_byte]).hexdigest()
+    
+    @property
+    def meta_data(self) -> Dict[str, Any]:
+        if self.chunk_type == 'file':
+            return {'type': 'file', 'file_path': self.file_path}
+        
+        metadata = {
+            'type': self.chunk_type,
+            'start_line': self.line_start,
+            'end_line': self.line_end,
+            'file_path': self.file_path
+        }
+        if self.name is not None:
+            metadata['name'] = self.name
+        if self.dcs_keywords:
+            metadata['dcs_keywords'] = list(self.dcs_keywords)
+        if self.chunk_type == 'comment':
+            metadata['comment_text'] = self.content
+        if self.extra:
+            metadata.update(self.extra)
+        return metadata
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in CHUNK_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the chunk in the dict format chunk_lua_file used to produce."""
+        return {field: getattr(self, field) for field in CHUNK_FIELDS}
+
+class KeywordIndex:
+    """
+    Byte offsets of every DCS keyword in a file, found in a single pass over the lowercased source.
+    Chunks look up their keywords by interval instead of re-copying and rescanning their text.
+    """
+    
+    def __init__(self, source: bytes, occurrences: Optional[Dict[str, List[int]]] = None):
+        # bytes.lower() only touches ASCII, so offsets still line up with the source
+        if occurrences is None:
+            occurrences = self._scan(source.lower(), 0)
+        self.occurrences = occurrences
+        
+        # Keywords present in the file, in DCS_KEYWORDS iteration order so results
+        # are ordered exactly like a direct scan of the chunk text
+        self.present = [kw for kw in DCS_KEYWORDS if kw in self.occurrences]
+    
+    @staticmethod
+    def _scan(lowered: bytes, offset: int) -> Dict[str, List[int]]:
+        """Find every keyword occurrence in lowercased bytes that start at `offset` in the file."""
+        occurrences: Dict[str, List[int]] = {}
+        for match in DCS_KEYWORD_PATTERN.finditer(lowered):
+            start = match.start() + offset
+            keyword = match.group(1).decode('utf-8')
+            occurrences.setdefault(keyword, []).append(start)
+            for prefix in DCS_KEYWORD_PREFIXES[keyword]:
+                occurrences.setdefault(prefix, []).append(start)
+        return occurrences
+    
+    def apply_edit(
+        self,
+        source: bytes,
+        start_byte: int,
+        old_end_byte: int,
+        new_end_byte: int
+    ) -> 'KeywordIndex':
+        """
+        Build the index for `source` after an edit, rescanning only the bytes around it.
+        
+        Occurrences entirely before the edit are kept, those after it are shifted,
+        and anything that touches the edited bytes is found again.
+        """
+        shift = new_end_byte - old_end_byte
+        window_start = max(0, start_byte - DCS_KEYWORD_MAX_LENGTH + 1)
+        window_end = min(len(source), new_end_byte + DCS_KEYWORD_MAX_LENGTH - 1)
+        rescanned = self._scan(source[window_start:window_end].lower(), window_start)
+        
+        occurrences = {}
+        for kw in DCS_KEYWORDS:
+            starts = self.occurrences.get(kw, [])
+            before = starts[:bisect_right(starts, start_byte - len(kw))]
+            middle = [p for p in rescanned.get(kw, []) if p + len(kw) > start_byte and p < new_end_byte]
+            after = [p + shift for p in starts[bisect_left(starts, old_end_byte):]]
+            merged = before + middle + after
+            if merged:
+                occurrences[kw] = merged
+        return KeywordIndex(source, occurrences)
+    
+    def keywords_in(self, start: int, end: int) -> List[str]:
+        """Return the DCS keywords that occur entirely within source[start:end]."""
+        found = []
+        for kw in self.present:
+            starts = self.occurrences[kw]
+            i = bisect_left(starts, start)
+            if i < len(starts) and starts[i] + len(kw) <= end:
+                found.append(kw)
+        return found
+
+def extract_node_text(source_code: Union[bytes, SourceBuffer], node: Node) -> str:
+    """Extract the text content of a tree-sitter node from the UTF-8 source it was parsed from."""
+    if isinstance(source_code, SourceBuffer):
+        return source_code.text(node.start_byte, node.end_byte)
+    return source_code[node.start_byte:node.end_byte].decode('utf-8', 'replace')
+
+def get_node_name(source_code: Union[bytes, SourceBuffer], node: Node) -> Optional[str]:
+    """Return the identifier naming a function node, if it has a plain one."""
+    if node.type in ('function_declaration', 'function_definition', 'local_function_definition'):
+        name_node = next((child for child in node.children if child.type == 'identifier'), None)
+        if name_node:
+            return extract_node_text(source_code, name_node)
+    return None
 
-def get_node_metadata(source_code: str, node: Node, file_path: str) -> Dict[str, Any]:
-    """Extract metadata from a node, including DCS-specific information."""
+def get_node_metadata(
+    source_code: Union[str, bytes],
+    node: Node,
+    file_path: str,
+    keyword_index: Optional[KeywordIndex] = None
+) -> Dict[str, Any]:
+    """
+    Extract metadata from a node, including DCS-specific information.
+    Pass a KeywordIndex built for source_code to avoid rescanning the node text.
+    """
+    if isinstance(source_code, str):
+        source_code = source_code.encode('utf-8')
+    
     metadata = {
         'type': node.type,
         'start_line': node.start_point[0] + 1,
@@ -53,14 +305,16 @@ def get_node_metadata(source_code: str, node: Node, file_path: str) -> Dict[str,
     }
     
     # Extract function or variable names
-    if node.type in ('function_declaration', 'function_definition', 'local_function_definition'):
-        name_node = next((child for child in node.children if child.type == 'identifier'), None)
-        if name_node:
-            metadata['name'] = extract_node_text(source_code, name_node)
+    name = get_node_name(source_code, node)
+    if name is not None:
+        metadata['name'] = name
     
     # Check for DCS-specific content
-    content = extract_node_text(source_code, node).lower()
-    dcs_keywords_found = [kw for kw in DCS_KEYWORDS if kw in content]
+    if keyword_index is not None:
+        dcs_keywords_found = keyword_index.keywords_in(node.start_byte, node.end_byte)
+    else:
+        content = extract_node_text(source_code, node).lower()
+        dcs_keywords_found = [kw for kw in DCS_KEYWORDS if kw in content]
     if dcs_keywords_found:
         metadata['dcs_keywords'] = dcs_keywords_found
     
@@ -70,78 +324,289 @@ def get_node_metadata(source_code: str, node: Node, file_path: str) -> Dict[str,
     
     return metadata
 
-def chunk_lua_file(file_path: str, content: Optional[str] = None) -> List[Dict[str, Any]]:
+def iter_chunks(
+    tree: Tree,
+    source: SourceBuffer,
+    file_path: str,
+    keyword_index: Optional[KeywordIndex] = None,
+    reuse_subtree: Optional[Callable[[Node, Optional[int], int], Optional[List[LuaChunk]]]] = None,
+    symbols: Optional[Any] = None
+) -> Iterator[LuaChunk]:
     """
-    Parse a Lua file and extract meaningful chunks for embedding.
+    Walk a parsed tree with a TreeCursor and yield chunks in document order as they are found.
+    
+    The traversal is iterative, so deeply nested mission tables cannot hit the
+    recursion limit. `parent_id` is the position of the enclosing chunk in the
+    yielded sequence, or None for top-level chunks.
+    
+    If `reuse_subtree` is given, it is called for each candidate node with the
+    parent chunk index and the index the next chunk will get. When it returns a
+    list, those chunks are yielded in place of the subtree's and the walker skips it.
+    
+    If `symbols` (a lua_symbols.SymbolCollector) is given, every node is passed to
+    it during the same walk, including nodes too small to be chunks.
+    """
+    count = 0
+    if keyword_index is None:
+        keyword_index = KeywordIndex(source.data)
+    cursor = tree.walk()
+    
+    # parent_stack[-1] is the parent chunk index for nodes at the cursor's depth
+    parent_stack: List[Optional[int]] = [None]
+    
+    while True:
+        node = cursor.node
+        child_parent_id = parent_stack[-1]
+        
+        # Children of a node are never larger than the node itself, so a subtree
+        # rooted at a node that is too small cannot contain any chunk (but may
+        # still contain symbols)
+        large = node.end_byte - node.start_byte >= 10
+        descend = large or symbols is not None
+        
+        reused = reuse_subtree(node, child_parent_id, count) if large and reuse_subtree is not None else None
+        if reused is not None:
+            count += len(reused)
+            yield from reused
+            descend = False
+        
+        # Check if this node type should be extracted as a chunk
+        elif large and node.type in CHUNK_NODE_TYPES:
+            if symbols is not None:
+                symbols.visit(node, count)
+            yield LuaChunk(
+                source,
+                file_path,
+                node.type,
+                node.start_byte,
+                node.end_byte,
+                node.start_point[0] + 1,
+                node.end_point[0] + 1,
+                parent_id=child_parent_id,
+                name=get_node_name(source, node),
+                dcs_keywords=keyword_index.keywords_in(node.start_byte, node.end_byte)
+            )
+            
+            # Use the index of the just-yielded chunk as the parent_id for children
+            child_parent_id = count
+            count += 1
+        
+        elif symbols is not None:
+            symbols.visit(node)
+        
+        if descend and cursor.goto_first_child():
+            parent_stack.append(child_parent_id)
+            continue
+        
+        # Move to the next sibling, climbing back up until one exists
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return
+            parent_stack.pop()
+
+def walk_chunks(
+    tree: Tree,
+    source: SourceBuffer,
+    file_path: str,
+    keyword_index: Optional[KeywordIndex] = None,
+    reuse_subtree: Optional[Callable[[Node, Optional[int], int], Optional[List[LuaChunk]]]] = None,
+    symbols: Optional[Any] = None
+) -> List[LuaChunk]:
+    """Collect the chunks of iter_chunks into a list."""
+    return list(iter_chunks(tree, source, file_path, keyword_index, reuse_subtree, symbols))
+
+def _char_boundary(data: bytes, offset: int) -> int:
+    """Move an offset back until it does not fall inside a UTF-8 multi-byte character."""
+    while 0 < offset < len(data) and (data[offset] & 0xC0) == 0x80:
+        offset -= 1
+    return offset
+
+def _split_windows(data: bytes, start: int, end: int, max_bytes: int, overlap_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Split [start, end) into windows of at most max_bytes that overlap by about overlap_bytes.
+    Windows end and restart on line boundaries where a line break is available.
+    """
+    windows = []
+    pos = start
+    while True:
+        window_end = min(end, pos + max_bytes)
+        if window_end < end:
+            newline = data.rfind(b'\n', pos, window_end)
+            window_end = newline + 1 if newline > pos else _char_boundary(data, window_end)
+            if window_end <= pos:
+                window_end = min(end, pos + max_bytes)
+        windows.append((pos, window_end))
+        if window_end >= end:
+            return windows
+        
+        next_pos = max(pos + 1, window_end - overlap_bytes)
+        newline = data.find(b'\n', next_pos, window_end)
+        next_pos = newline + 1 if newline != -1 else _char_boundary(data, next_pos)
+        pos = next_pos if next_pos > pos else window_end
+
+def _top_level_units(root: Node) -> List[Tuple[int, int, Node]]:
+    """
+    Split the file into top-level statements, as (start_byte, end_byte, node).
+    Comments directly above a function are folded into that function's unit.
+    """
+    units = []
+    comments: List[Node] = []
+    for child in root.children:
+        if child.type == 'comment':
+            # A blank line between comments breaks the run attached to a function
+            if comments and child.start_point[0] > comments[-1].end_point[0] + 1:
+                units.extend((comment.start_byte, comment.end_byte, comment) for comment in comments)
+                comments = []
+            comments.append(child)
+            continue
+        
+        attached_start = None
+        if child.type in FUNCTION_NODE_TYPES and comments and child.start_point[0] <= comments[-1].end_point[0] + 1:
+            attached_start = comments[0].start_byte
+        else:
+            units.extend((comment.start_byte, comment.end_byte, comment) for comment in comments)
+        comments = []
+        
+        units.append((attached_start if attached_start is not None else child.start_byte, child.end_byte, child))
+    
+    units.extend((comment.start_byte, comment.end_byte, comment) for comment in comments)
+    return units
+
+def size_chunks(
+    tree: Tree,
+    source: SourceBuffer,
+    file_path: str,
+    target_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None
+) -> List[LuaChunk]:
+    """
+    Chunk a file into token-bounded pieces instead of one chunk per syntax node.
+    
+    - Adjacent small top-level statements are merged until the target size is reached
+    - Statements larger than the maximum size are split into overlapping windows
+    - Comments directly above a function are kept with the function
+    
+    Sizes are estimated at CHARS_PER_TOKEN bytes per token. Sized chunks are flat,
+    so parent_id is always None.
+    """
+    target_bytes = (target_tokens or CHUNK_TARGET_TOKENS) * CHARS_PER_TOKEN
+    max_bytes = (max_tokens or CHUNK_MAX_TOKENS) * CHARS_PER_TOKEN
+    overlap_bytes = (overlap_tokens if overlap_tokens is not None else CHUNK_OVERLAP_TOKENS) * CHARS_PER_TOKEN
+    
+    data = source.data
+    keyword_index = KeywordIndex(data)
+    line_starts = [0] + [match.end() for match in re.finditer(b'\n', data)]
+    
+    def line_of(offset: int) -> int:
+        return bisect_right(line_starts, offset)
+    
+    chunks: List[LuaChunk] = []
+    
+    def add_chunk(chunk_type: str, start: int, end: int, name: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> None:
+        chunks.append(LuaChunk(
+            source,
+            file_path,
+            chunk_type,
+            start,
+            end,
+            line_of(start),
+            line_of(max(start, end - 1)),
+            name=name,
+            dcs_keywords=keyword_index.keywords_in(start, end),
+            extra=extra
+        ))
+    
+    group: List[Tuple[int, int, Node]] = []
+    
+    def flush_group() -> None:
+        if not group:
+            return
+        types = {node.type for _, _, node in group}
+        if len(group) == 1:
+            start, end, node = group[0]
+            add_chunk(node.type, start, end, name=get_node_name(source, node))
+        else:
+            chunk_type = types.pop() if len(types) == 1 else 'statement_group'
+            add_chunk(chunk_type, group[0][0], group[-1][1], extra={'statements': len(group)})
+        group.clear()
+    
+    for start, end, node in _top_level_units(tree.root_node):
+        if end - start > max_bytes:
+            flush_group()
+            windows = _split_windows(data, start, end, max_bytes, overlap_bytes)
+            name = get_node_name(source, node)
+            for index, (window_start, window_end) in enumerate(windows):
+                add_chunk(
+                    node.type, window_start, window_end, name=name,
+                    extra={'window': index + 1, 'windows': len(windows)}
+                )
+            continue
+        
+        if group and end - group[0][0] > target_bytes:
+            flush_group()
+        group.append((start, end, node))
+    
+    flush_group()
+    return chunks
+
+def file_chunk(source: SourceBuffer, file_path: str, content: Optional[str] = None) -> LuaChunk:
+    """Create the single chunk covering a whole file, used when nothing else was extracted."""
+    if content is None:
+        content = source.text(0, len(source))
+    return LuaChunk(source, file_path, 'file', 0, len(source), 1, len(content.splitlines()))
+
+def stream_lua_file(
+    file_path: str,
+    content: Optional[str] = None,
+    mode: Optional[str] = None,
+    symbols: Optional[Any] = None
+) -> Iterator[LuaChunk]:
+    """
+    Parse a Lua file and yield meaningful chunks for embedding as they are found.
     
     Args:
         file_path: Path to the Lua file
         content: Optional file content (if not provided, will read from file)
+        mode: "ast", "hierarchical" or "sized" (defaults to CHUNKING_MODE)
+        symbols: Optional SymbolCollector filled while the tree is walked
     
-    Returns:
-        List of chunks with metadata
+    Yields:
+        Chunks sharing one SourceBuffer of the encoded file
     """
     if content is None:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
     
-    # Parse the file
-    tree = parser.parse(bytes(content, 'utf-8'))
+    # Parse the file; chunk offsets are byte offsets into this buffer
+    source = SourceBuffer(content.encode('utf-8'))
+    tree = get_parser().parse(source.data)
     
-    chunks = []
-    
-    def process_node(node: Node, parent_chunk_id: Optional[int] = None) -> None:
-        """Recursively process nodes and extract chunks."""
-        # Skip nodes that are too small
-        if node.end_byte - node.start_byte < 10:
-            for child in node.children:
-                process_node(child, parent_chunk_id)
-            return
-        
-        # Check if this node type should be extracted as a chunk
-        if node.type in CHUNK_NODE_TYPES:
-            chunk_content = extract_node_text(content, node)
-            metadata = get_node_metadata(content, node, file_path)
-            
-            chunk = {
-                'file_path': file_path,
-                'chunk_type': node.type,
-                'content': chunk_content,
-                'meta_data': metadata,
-                'line_start': node.start_point[0] + 1,
-                'line_end': node.end_point[0] + 1,
-                'parent_id': parent_chunk_id
-            }
-            
-            chunks.append(chunk)
-            
-            # Use the index of the just-added chunk as the parent_id for children
-            current_chunk_id = len(chunks) - 1
-            
-            # Process children with this chunk as parent
-            for child in node.children:
-                process_node(child, current_chunk_id)
-        else:
-            # Process children without changing parent
-            for child in node.children:
-                process_node(child, parent_chunk_id)
+    if (mode or CHUNKING_MODE) == 'sized':
+        # Sized chunking only looks at top-level statements, so symbols need their own walk
+        if symbols is not None:
+            symbols.collect(tree)
+        chunks = iter(size_chunks(tree, source, file_path))
+    else:
+        chunks = iter_chunks(tree, source, file_path, symbols=symbols)
     
-    # Start processing from the root
-    process_node(tree.root_node)
+    found = False
+    for chunk in chunks:
+        found = True
+        yield chunk
     
     # If no chunks were extracted, create one chunk for the whole file
-    if not chunks:
-        chunks.append({
-            'file_path': file_path,
-            'chunk_type': 'file',
-            'content': content,
-            'meta_data': {'type': 'file', 'file_path': file_path},
-            'line_start': 1,
-            'line_end': len(content.splitlines()),
-            'parent_id': None
-        })
+    if not found:
+        yield file_chunk(source, file_path, content)
+
+def chunk_lua_file(file_path: str, content: Optional[str] = None, mode: Optional[str] = None) -> List[LuaChunk]:
+    """
+    Parse a Lua file and extract meaningful chunks for embedding.
     
-    return chunks
+    Returns:
+        List of the chunks yielded by stream_lua_file
+    """
+    return list(stream_lua_file(file_path, content, mode))
 
 def should_index_file(file_path: str) -> bool:
     """
@@ -165,6 +630,111 @@ def should_index_file(file_path: str) -> bool:
     
     return True
 
+def format_chunk(chunk: LuaChunk) -> Dict[str, Any]:
+    """
+    Convert a chunk to the format used by the indexer.
+    parent_index is the position of the enclosing chunk in the same chunk list.
+    """
+    return {
+        "type": chunk.chunk_type,
+        "content": chunk.content,
+        "start_line": chunk.line_start,
+        "end_line": chunk.line_end,
+        "metadata": chunk.meta_data,
+        "parent_index": chunk.parent_id,
+        "content_hash": chunk.content_hash
+    }
+
+def error_chunk(content: str, file_path: str, error: Exception) -> Dict[str, Any]:
+    """The file-level chunk returned in place of a file that could not be parsed."""
+    return {
+        "type": "file",
+        "content": content,
+        "start_line": 1,
+        "end_line": len(content.split('\n')),
+        "metadata": {"file_path": file_path, "parse_error": str(error)},
+        "parent_index": None,
+        "content_hash": hashlib.sha256(content.encode('utf-8')).hexdigest()
+    }
+
+def iter_content(content: str, file_path: str, symbols: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Parse Lua file content and yield chunks in the format used by the indexer.
+    Falls back to a single file-level chunk if parsing fails before any chunk was found.
+    """
+    found = False
+    try:
+        for chunk in stream_lua_file(file_path, content, symbols=symbols):
+            found = True
+            yield format_chunk(chunk)
+    except Exception as e:
+        if found:
+            raise
+        logger.error(f"Error parsing file content: {e}")
+        yield error_chunk(content, file_path, e)
+
+def parse_content(content: str, file_path: str, symbols: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """
+    Parse Lua file content into the chunk format used by the indexer.
+    Falls back to a single file-level chunk if parsing fails.
+    """
+    try:
+        return list(iter_content(content, file_path, symbols))
+    except Exception as e:
+        logger.error(f"Error parsing file content: {e}")
+        return [error_chunk(content, file_path, e)]
+
+def get_parse_executor() -> ThreadPoolExecutor:
+    """Get the thread streamed parses run in."""
+    global _parse_executor
+    # One worker: tree-sitter parsers are not shared between threads, so concurrent streams take turns
+    if _parse_executor is None:
+        _parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="victor-parser")
+    return _parse_executor
+
+async def stream_chunks(chunks: Iterable[Any], queue_size: Optional[int] = None) -> AsyncIterator[Any]:
+    """
+    Hand chunks from a synchronous iterator to an async consumer through a bounded queue.
+    
+    The iterator runs in the parse thread, so a lazy parser parses and walks the file
+    off the event loop while the consumer awaits. It runs at most `queue_size` chunks
+    ahead of the consumer, so the whole chunk list is never built.
+    Errors raised by the iterator are re-raised in the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(queue_size or CHUNK_QUEUE_SIZE)
+    stopped = threading.Event()
+    done = object()
+    errors: List[BaseException] = []
+    
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            errors.append(e)
+        loop.call_soon_threadsafe(queue.put_nowait, done)
+    
+    producer = loop.run_in_executor(get_parse_executor(), produce)
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is done:
+                break
+            slots.release()
+            yield chunk
+        await producer
+        if errors:
+            raise errors[0]
+    finally:
+        # Wake a producer waiting for a slot, so a consumer that stops early frees the thread
+        stopped.set()
+        slots.release()
+
 class LuaParser:
     """
     Async wrapper for Lua parsing functionality to maintain compatibility.
@@ -173,6 +743,17 @@ class LuaParser:
     def __init__(self):
         pass
     
+    def stream_file_content(
+        self,
+        content: str,
+        file_path: str,
+        queue_size: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse a Lua file content into semantic chunks, yielding each chunk as it is found.
+        """
+        return stream_chunks(iter_content(content, file_path), queue_size)
+    
     async def parse_file_content(
         self, 
         content: str,
@@ -180,32 +761,6 @@ class LuaParser:
     ) -> List[Dict[str, Any]]:
         """
         Parse a Lua file content into semantic chunks.
-        Converts the sync function output to match async interface.
+        Collects stream_file_content to match the list-based interface.
         """
-        try:
-            # Use the sync chunk_lua_file function
-            chunks = chunk_lua_file(file_path, content)
-            
-            # Convert to expected format
-            formatted_chunks = []
-            for chunk in chunks:
-                formatted_chunks.append({
-                    "type": chunk['chunk_type'],
-                    "content": chunk['content'],
-                    "start_line": chunk['line_start'],
-                    "end_line": chunk['line_end'],
-                    "metadata": chunk['meta_data']
-                })
-            
-            return formatted_chunks
-            
-        except Exception as e:
-            logger.error(f"Error parsing file content: {e}")
-            # Return just the file-level chunk on error
-            return [{
-                "type": "file",
-                "content": content,
-                "start_line": 1,
-                "end_line": len(content.split('\n')),
-                "metadata": {"file_path": file_path, "parse_error": str(e)}
-            }]
\ No newline at end of file
+        return [chunk async for chunk in self.stream_file_content(content, file_path)]
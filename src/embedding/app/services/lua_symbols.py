@@ -0,0 +1,454 @@
+"""
+Lua Symbols - Collects function definitions, call sites, variables and file loads from a Lua syntax tree
+Fed node by node by the chunk walker, so symbols come out of the same single tree walk
+"""
+
+import re
+import logging
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from tree_sitter import Node, Tree
+
+# Configure logging
+logger = logging.getLogger("victor-lua-symbols")
+
+# Node types of both Lua grammar vocabularies in use
+# (tree-sitter-lua: function_declaration/function_call/...,
+#  tree_sitter_languages: function_definition_statement/call/...)
+FUNCTION_TYPES = {
+    'function_declaration',
+    'function_definition',
+    'local_function_definition',
+    'local_function_declaration',
+    'function_definition_statement',
+    'local_function_definition_statement'
+}
+CALL_TYPES = {'function_call', 'call'}
+LOCAL_DECLARATION_TYPES = {'variable_declaration', 'local_variable_declaration'}
+ASSIGNMENT_TYPES = {'assignment_statement', 'variable_assignment'}
+SYMBOL_TYPES = FUNCTION_TYPES | CALL_TYPES | LOCAL_DECLARATION_TYPES | ASSIGNMENT_TYPES
+NAME_NODE_TYPES = {'function_name', 'identifier', 'dot_index_expression', 'method_index_expression', 'variable'}
+
+# Value node type -> recorded variable type
+VALUE_TYPES = {
+    'number': 'number',
+    'string': 'string',
+    'true': 'boolean',
+    'false': 'boolean',
+    'nil': 'nil',
+    'table_constructor': 'table',
+    'table': 'table',
+    'function_definition': 'function',
+    'function_call': 'call',
+    'call': 'call'
+}
+
+# Calls that load another Lua file; the loaded path is their string argument
+LOADER_FUNCTIONS = {'dofile', 'loadfile', 'require'}
+STRING_TYPES = {'string', 'string_literal'}
+
+# A plain, dotted or colon name such as `f`, `a.b.c` or `a.b:c`
+NAME_PATTERN = re.compile(r'[A-Za-z_]\w*(?:\s*[.:]\s*[A-Za-z_]\w*)*')
+
+def _text(data: bytes, node: Node) -> str:
+    return data[node.start_byte:node.end_byte].decode('utf-8', 'replace')
+
+def _name(data: bytes, node: Optional[Node]) -> Optional[str]:
+    """The normalized dotted/colon name of a node, or None if it is not a simple name."""
+    if node is None:
+        return None
+    text = _text(data, node)
+    if not NAME_PATTERN.fullmatch(text):
+        return None
+    return re.sub(r'\s+', '', text)
+
+def _root_name(name: str) -> str:
+    """The leading identifier of a dotted/colon name."""
+    return re.split(r'[.:]', name, 1)[0]
+
+def _string_value(data: bytes, node: Node) -> str:
+    """The text of a string literal without its quotes or long brackets."""
+    content = node.child_by_field_name('content')
+    if content is not None:
+        return _text(data, content)
+    text = _text(data, node)
+    match = re.fullmatch(r'(["\'])(.*)\1|\[(=*)\[(.*)\]\3\]', text, re.S)
+    if match is None:
+        return text
+    return match.group(2) if match.group(1) else match.group(4)
+
+def _loaded_path(data: bytes, call: Node) -> Optional[str]:
+    """
+    The path a dofile/loadfile/require call loads: its last string literal, so
+    `dofile(lfs.writedir() .. "Scripts/XSAF/init.lua")` yields "Scripts/XSAF/init.lua".
+    """
+    arguments = call.child_by_field_name('arguments')
+    if arguments is None:
+        arguments = next((child for child in call.named_children if child.type == 'arguments'), None)
+    if arguments is None:
+        return None
+
+    path = None
+    cursor = arguments.walk()
+    while True:
+        if cursor.node.type in STRING_TYPES:
+            path = _string_value(data, cursor.node)
+        elif cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent() or cursor.node == arguments:
+                return path or None
+
+def _flatten_lists(nodes: List[Node]) -> List[Node]:
+    """Expand variable_list/expression_list style nodes into their items."""
+    items = []
+    for node in nodes:
+        if node.type.endswith('_list'):
+            items.extend(child for child in node.named_children if child.type != 'attribute')
+        elif node.is_named and node.type != 'attribute':
+            items.append(node)
+    return items
+
+def _assignment_sides(node: Node) -> Tuple[List[Node], List[Node]]:
+    """Split an assignment or local declaration into its target and value nodes."""
+    for child in node.named_children:
+        if child.type in ASSIGNMENT_TYPES:
+            return _assignment_sides(child)
+
+    targets, values = [], []
+    side = targets
+    for child in node.children:
+        if child.type == '=':
+            side = values
+        elif child.type != 'local':
+            side.append(child)
+    return _flatten_lists(targets), _flatten_lists(values)
+
+def _within(records: List[Dict[str, Any]], start_byte: int, end_byte: int) -> List[int]:
+    """Indexes of the records (ordered by start byte) that lie entirely within a byte range."""
+    index = bisect_left([record['start_byte'] for record in records], start_byte)
+    found = []
+    while index < len(records) and records[index]['start_byte'] < end_byte:
+        if records[index]['end_byte'] <= end_byte:
+            found.append(index)
+        index += 1
+    return found
+
+class SymbolCollector:
+    """
+    Collects the symbols of one Lua file while its tree is walked.
+
+    The walker calls `visit` for every node in document order. Records are
+    plain dicts in four lists:
+
+    - functions: name (e.g. `a.b:c`), signature, scope, lines, byte range, chunk_index
+      and `enclosing`, the index of the function it is nested in
+    - calls: callee name as written, line, byte range, and `caller`, the index of the enclosing function
+    - variables: name, var_type, scope ('global', 'file' or 'function'), line and byte range
+    - dependencies: kind ('dofile', 'loadfile' or 'require'), target path as written, line and byte range
+
+    A name is local if a `local` declaration or parameter of an enclosing function
+    (or the file) declared it; every other assignment is a global. Functions and
+    variables also keep what their scope was resolved from, so `splice` can
+    re-resolve copied records against declarations outside the copied subtree:
+    `scope_start` (start byte of the innermost enclosing function, -1 for the file),
+    `resolved_start` (start of the scope that declared the name, None for a global),
+    `declared` (a `local` declaration) and, for functions, `assigned` (named by
+    the assignment the function is the value of).
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.functions: List[Dict[str, Any]] = []
+        self.calls: List[Dict[str, Any]] = []
+        self.variables: List[Dict[str, Any]] = []
+        self.dependencies: List[Dict[str, Any]] = []
+        # (start byte, end byte, function index, local names); the first entry is the file scope
+        self._scopes: List[Tuple[int, float, Optional[int], Set[str]]] = [(-1, float('inf'), None, set())]
+        # Start bytes of anonymous functions named by the assignment they appear in
+        # -> (name, scope, resolved_start, declared)
+        self._pending_names: Dict[int, Tuple[str, str, Optional[int], bool]] = {}
+        # Assignments already handled as part of a local declaration
+        self._handled: Set[Tuple[int, int]] = set()
+
+    def enter(self, node: Node) -> None:
+        """Close the function scopes that end before this node."""
+        self._close_scopes(node.start_byte)
+
+    def _close_scopes(self, offset: int) -> None:
+        while self._scopes[-1][1] <= offset:
+            self._scopes.pop()
+
+    def reusable(self, node: Node) -> bool:
+        """
+        Whether the symbols of an unchanged subtree can be spliced from a previous parse.
+        A function named by the assignment it is the value of is visited instead,
+        since its name comes from outside the subtree.
+        """
+        return node.start_byte not in self._pending_names
+
+    def visit(self, node: Node, chunk_index: Optional[int] = None) -> None:
+        """
+        Record the symbols a node defines or uses.
+
+        Args:
+            node: Node visited by the walker
+            chunk_index: Index of the chunk emitted for this node, if any
+        """
+        node_type = node.type
+        if node_type not in SYMBOL_TYPES:
+            return
+        self.enter(node)
+        if node_type in FUNCTION_TYPES:
+            self._visit_function(node, chunk_index)
+        elif node_type in CALL_TYPES:
+            self._visit_call(node)
+        elif node_type in LOCAL_DECLARATION_TYPES:
+            self._visit_assignment(node, local=True)
+        elif node_type in ASSIGNMENT_TYPES and (node.start_byte, node.end_byte) not in self._handled:
+            self._visit_assignment(node, local=False)
+
+    def collect(self, tree: Tree) -> None:
+        """Walk a whole tree, for chunking modes that do not visit every node."""
+        cursor = tree.walk()
+        while True:
+            self.visit(cursor.node)
+            if cursor.goto_first_child():
+                continue
+            while not cursor.goto_next_sibling():
+                if not cursor.goto_parent():
+                    return
+
+    @property
+    def current_function(self) -> Optional[int]:
+        return self._scopes[-1][2]
+
+    def _resolve(self, name: str) -> Optional[int]:
+        """Start byte of the innermost scope declaring the name's root (-1 for the file), or None for a global."""
+        root = _root_name(name)
+        for start, _, _, names in reversed(self._scopes):
+            if root in names:
+                return start
+        return None
+
+    def _scope_name(self, local: bool) -> str:
+        if not local:
+            return 'global'
+        return 'file' if len(self._scopes) == 1 else 'function'
+
+    def _visit_function(self, node: Node, chunk_index: Optional[int]) -> None:
+        name_node = node.child_by_field_name('name')
+        if name_node is None:
+            name_node = next((child for child in node.named_children if child.type in NAME_NODE_TYPES), None)
+        name = _name(self.data, name_node)
+        local = node.type.startswith('local') or any(child.type == 'local' for child in node.children)
+
+        assigned = name is None and node.start_byte in self._pending_names
+        if assigned:
+            name, scope, resolved, local = self._pending_names.pop(node.start_byte)
+        elif name is not None:
+            if local:
+                # Declared before the body so recursive calls resolve to it
+                self._scopes[-1][3].add(name)
+            resolved = self._resolve(name)
+            scope = self._scope_name(resolved is not None)
+
+        parameters_node = node.child_by_field_name('parameters')
+        if parameters_node is None:
+            parameters_node = next((child for child in node.named_children if child.type == 'parameters'), None)
+        parameters = [
+            _text(self.data, child) for child in (parameters_node.named_children if parameters_node else [])
+            if child.type == 'identifier'
+        ]
+
+        if name is None:
+            # Anonymous function: calls inside it belong to the enclosing named function
+            self._scopes.append((node.start_byte, node.end_byte, self.current_function, set(parameters)))
+            return
+
+        signature = re.sub(r'\s+', ' ', _text(self.data, parameters_node)) if parameters_node else '()'
+        self.functions.append({
+            'name': name,
+            'signature': name + signature,
+            'scope': scope,
+            'start_line': node.start_point[0] + 1,
+            'end_line': node.end_point[0] + 1,
+            'start_byte': node.start_byte,
+            'end_byte': node.end_byte,
+            'chunk_index': chunk_index,
+            'enclosing': self.current_function,
+            'scope_start': self._scopes[-1][0],
+            'resolved_start': resolved,
+            'declared': local,
+            'assigned': assigned
+        })
+        self._scopes.append((node.start_byte, node.end_byte, len(self.functions) - 1, set(parameters)))
+
+    def _visit_call(self, node: Node) -> None:
+        name_node = node.child_by_field_name('name')
+        if name_node is None and node.named_children:
+            name_node = node.named_children[0]
+        name = _name(self.data, name_node)
+        if name is None:
+            return
+        self.calls.append({
+            'name': name,
+            'line': node.start_point[0] + 1,
+            'start_byte': node.start_byte,
+            'end_byte': node.end_byte,
+            'caller': self.current_function
+        })
+
+        if name in LOADER_FUNCTIONS:
+            target = _loaded_path(self.data, node)
+            if target:
+                self.dependencies.append({
+                    'kind': name,
+                    'target': target,
+                    'line': node.start_point[0] + 1,
+                    'start_byte': node.start_byte,
+                    'end_byte': node.end_byte
+                })
+
+    def _visit_assignment(self, node: Node, local: bool) -> None:
+        for child in node.named_children:
+            if child.type in ASSIGNMENT_TYPES:
+                self._handled.add((child.start_byte, child.end_byte))
+
+        targets, values = _assignment_sides(node)
+        for position, target in enumerate(targets):
+            name = _name(self.data, target)
+            if name is None:
+                continue
+            value = values[position] if position < len(values) else None
+
+            if local:
+                scope = self._scope_name(True)
+                self._scopes[-1][3].add(name)
+                resolved = self._scopes[-1][0]
+            else:
+                resolved = self._resolve(name)
+                scope = self._scope_name(resolved is not None)
+
+            if value is not None and value.type == 'function_definition':
+                # `name = function() ... end` defines a function called `name`
+                self._pending_names[value.start_byte] = (name, scope, resolved, local)
+
+            self.variables.append({
+                'name': name,
+                'var_type': VALUE_TYPES.get(value.type) if value is not None else None,
+                'scope': scope,
+                'line': node.start_point[0] + 1,
+                'start_byte': node.start_byte,
+                'end_byte': node.end_byte,
+                'function': self.current_function,
+                'scope_start': self._scopes[-1][0],
+                'resolved_start': resolved,
+                'declared': local
+            })
+
+    def splice(
+        self,
+        previous: Dict[str, List[Dict[str, Any]]],
+        start_byte: int,
+        end_byte: int,
+        byte_shift: int,
+        line_shift: int,
+        chunk_indexes: Dict[int, int]
+    ) -> None:
+        """
+        Copy the symbols of an unchanged subtree from a previous parse of the file.
+
+        Only records that lie entirely within the subtree are copied; records of
+        nodes around it (e.g. a changed call whose callee is the subtree) are
+        recorded when the walker visits those nodes. Functions and variables whose
+        names were resolved outside the subtree are resolved again against the
+        current scopes, in document order, and the subtree's declarations in the
+        current scope are added to it.
+
+        Args:
+            previous: Symbols of the previous parse (as returned by to_dict)
+            start_byte: Start of the subtree in the previous source
+            end_byte: End of the subtree in the previous source
+            byte_shift: Offset to add to copied byte positions
+            line_shift: Offset to add to copied line numbers
+            chunk_indexes: Previous chunk index -> new chunk index for the copied chunks
+        """
+        self._close_scopes(start_byte + byte_shift)
+
+        old_functions = previous['functions']
+        old_variables = previous['variables']
+        # Variables are recorded before the function they assign, as the walker visits them
+        ordered = sorted(
+            [(old_functions[index]['start_byte'], 1, index) for index in _within(old_functions, start_byte, end_byte)]
+            + [(old_variables[index]['start_byte'], 0, index) for index in _within(old_variables, start_byte, end_byte)]
+        )
+
+        functions: Dict[int, int] = {}
+        for _, is_function, index in ordered:
+            if is_function:
+                function = old_functions[index]
+                if function['assigned'] and function['start_byte'] == start_byte:
+                    # Named by an assignment outside the subtree that no longer names it (see reusable)
+                    continue
+                record = {
+                    **function,
+                    'start_line': function['start_line'] + line_shift,
+                    'end_line': function['end_line'] + line_shift,
+                    'start_byte': function['start_byte'] + byte_shift,
+                    'end_byte': function['end_byte'] + byte_shift,
+                    'chunk_index': chunk_indexes.get(function['chunk_index']),
+                    'enclosing': functions.get(function['enclosing'], self.current_function)
+                }
+                self._rescope(record, function, start_byte, byte_shift)
+                functions[index] = len(self.functions)
+                self.functions.append(record)
+            else:
+                variable = old_variables[index]
+                record = {
+                    **variable,
+                    'line': variable['line'] + line_shift,
+                    'start_byte': variable['start_byte'] + byte_shift,
+                    'end_byte': variable['end_byte'] + byte_shift,
+                    'function': functions.get(variable['function'], self.current_function)
+                }
+                self._rescope(record, variable, start_byte, byte_shift)
+                self.variables.append(record)
+
+        for key, records in (('calls', self.calls), ('dependencies', self.dependencies)):
+            old_records = previous[key]
+            for index in _within(old_records, start_byte, end_byte):
+                record = dict(old_records[index])
+                record['line'] += line_shift
+                record['start_byte'] += byte_shift
+                record['end_byte'] += byte_shift
+                if key == 'calls':
+                    record['caller'] = functions.get(record['caller'], self.current_function)
+                records.append(record)
+
+    def _rescope(self, record: Dict[str, Any], old: Dict[str, Any], start_byte: int, byte_shift: int) -> None:
+        """Resolve a copied function or variable again unless a scope within the subtree resolved it."""
+        inner = old['scope_start'] >= start_byte
+        record['scope_start'] = old['scope_start'] + byte_shift if inner else self._scopes[-1][0]
+        if old['resolved_start'] is not None and old['resolved_start'] >= start_byte:
+            record['resolved_start'] = old['resolved_start'] + byte_shift
+            return
+
+        if old['declared']:
+            # Declared directly in the current scope, so visible after the subtree
+            self._scopes[-1][3].add(record['name'])
+        resolved = self._resolve(record['name'])
+        record['resolved_start'] = resolved
+        if resolved is None:
+            record['scope'] = 'global'
+        else:
+            record['scope'] = 'function' if inner else self._scope_name(True)
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            'functions': self.functions,
+            'calls': self.calls,
+            'variables': self.variables,
+            'dependencies': self.dependencies
+        }
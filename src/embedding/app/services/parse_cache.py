@@ -0,0 +1,283 @@
+"""
+Parse Cache - Persists parse results on local disk, keyed by content hash and parser version
+Lets full rebuilds skip tree-sitter and symbol extraction for files that did not change
+"""
+
+import os
+import sys
+import zlib
+import pickle
+import hashlib
+import logging
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services import lua_parser
+from app.services.lua_parser import LuaChunk, SourceBuffer
+from app.services.lua_symbols import SymbolCollector
+
+# Configure logging
+logger = logging.getLogger("victor-parse-cache")
+
+# Directory of the cache (off unless set) and its size limit
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "")
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "256"))
+
+# First bytes of every cache entry
+MAGIC = b"VPC1"
+ENTRY_SUFFIX = ".vpc"
+
+def parser_version() -> str:
+    """
+    Short hash of everything that shapes a parse result: the parser version,
+    chunking settings and the Python version (entries are pickled).
+    """
+    settings = (
+        lua_parser.PARSER_VERSION,
+        lua_parser.CHUNKING_MODE,
+        lua_parser.CHUNK_TARGET_TOKENS,
+        lua_parser.CHUNK_MAX_TOKENS,
+        lua_parser.CHUNK_OVERLAP_TOKENS,
+        sys.version_info[:2]
+    )
+    return hashlib.md5(repr(settings).encode()).hexdigest()[:8]
+
+def encode_entry(chunks: List[LuaChunk], symbols: Dict[str, List[Dict[str, Any]]]) -> bytes:
+    """
+    Serialize a parse result.
+
+    Chunks are stored as byte ranges into the source, without their text, and with
+    raw 32-byte content hashes. Each symbol list is stored as its keys plus one
+    value tuple per record.
+    """
+    chunk_rows = [
+        (
+            chunk.chunk_type, chunk.start_byte, chunk.end_byte, chunk.line_start, chunk.line_end,
+            chunk.parent_id, chunk.name, chunk.dcs_keywords, chunk.extra,
+            bytes.fromhex(chunk.content_hash)
+        )
+        for chunk in chunks
+    ]
+    symbol_columns = {}
+    for kind, records in symbols.items():
+        keys = tuple(records[0]) if records else ()
+        symbol_columns[kind] = (keys, [tuple(record[key] for key in keys) for record in records])
+    payload = pickle.dumps((chunk_rows, symbol_columns), protocol=pickle.HIGHEST_PROTOCOL)
+    return MAGIC + zlib.compress(payload, 1)
+
+def decode_entry(
+    entry: bytes,
+    source: SourceBuffer,
+    file_path: str
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """
+    Rebuild the formatted chunks and symbols of a cache entry for the given source.
+
+    Returns:
+        Tuple of the chunks in the format of lua_parser.format_chunk and the symbols dict
+    """
+    if not entry.startswith(MAGIC):
+        raise ValueError("not a parse cache entry")
+    chunk_rows, symbol_columns = pickle.loads(zlib.decompress(entry[len(MAGIC):]))
+
+    chunks = []
+    for chunk_type, start_byte, end_byte, line_start, line_end, parent_id, name, dcs_keywords, extra, digest in chunk_rows:
+        chunk = LuaChunk(
+            source, file_path, chunk_type, start_byte, end_byte, line_start, line_end,
+            parent_id, name, dcs_keywords, extra
+        )
+        chunks.append({
+            "type": chunk.chunk_type,
+            "content": chunk.content,
+            "start_line": chunk.line_start,
+            "end_line": chunk.line_end,
+            "metadata": chunk.meta_data,
+            "parent_index": chunk.parent_id,
+            "content_hash": digest.hex()
+        })
+    symbols = {
+        kind: [dict(zip(keys, values)) for values in rows]
+        for kind, (keys, rows) in symbol_columns.items()
+    }
+    return chunks, symbols
+
+class ParseCache:
+    """
+    Size-bounded on-disk LRU of parse results.
+
+    One file per (content hash, parser version). Reads bump the file's mtime, and
+    when the directory grows past its limit the least recently used entries are
+    deleted. Entries are written atomically, so several parse worker processes
+    can share a directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Initialize the parse cache.
+
+        Args:
+            directory: Cache directory (defaults to PARSE_CACHE_DIR; empty disables the cache)
+            max_bytes: Size limit (defaults to PARSE_CACHE_MAX_MB)
+        """
+        self.directory = PARSE_CACHE_DIR if directory is None else directory
+        self.max_bytes = max_bytes if max_bytes is not None else PARSE_CACHE_MAX_MB * 1024 * 1024
+        self.version = parser_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Estimated directory size; None until the directory was scanned
+        self._size: Optional[int] = None
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Parse cache disabled, cannot create {self.directory}: {e}")
+                self.directory = ""
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.{self.version}{ENTRY_SUFFIX}")
+
+    def get(
+        self,
+        content_hash: str,
+        source: SourceBuffer,
+        file_path: str
+    ) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]]:
+        """
+        Look up the parse result of a file's content.
+
+        Returns:
+            Tuple of formatted chunks and symbols, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        path = self._path(content_hash)
+        try:
+            with open(path, 'rb') as f:
+                entry = f.read()
+            result = decode_entry(entry, source, file_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable parse cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(
+        self,
+        content_hash: str,
+        chunks: List[LuaChunk],
+        symbols: Dict[str, List[Dict[str, Any]]]
+    ) -> None:
+        """Store a parse result, evicting least recently used entries if the cache is full."""
+        if not self.enabled:
+            return
+        entry = encode_entry(chunks, symbols)
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(entry)
+            os.replace(temp_path, self._path(content_hash))
+        except OSError as e:
+            logger.warning(f"Could not write parse cache entry: {e}")
+            return
+
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += len(entry)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def parse(self, content: str, file_path: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+        """
+        Parse Lua file content into formatted chunks and symbols, using the cache when possible.
+        Files that fail to parse get the usual file-level error chunk and are not cached.
+        """
+        data = content.encode('utf-8')
+        content_hash = hashlib.md5(data).hexdigest()
+        source = SourceBuffer(data)
+        cached = self.get(content_hash, source, file_path)
+        if cached is not None:
+            return cached
+
+        symbols = SymbolCollector(data)
+        try:
+            chunks = list(lua_parser.stream_lua_file(file_path, content, symbols=symbols))
+        except Exception as e:
+            logger.error(f"Error parsing file content: {e}")
+            return [lua_parser.error_chunk(content, file_path, e)], symbols.to_dict()
+
+        self.put(content_hash, chunks, symbols.to_dict())
+        return [lua_parser.format_chunk(chunk) for chunk in chunks], symbols.to_dict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every entry in the directory."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the cache is below 90% of its limit.
+        The directory is rescanned first, since other processes may have added entries.
+
+        Returns:
+            Number of entries deleted
+        """
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            self._remove(path)
+            size -= entry_size
+            removed += 1
+        self._size = size
+        self.evictions += removed
+        if removed:
+            logger.info(f"Evicted {removed} parse cache entries")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters of this cache instance."""
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "version": self.version
+        }
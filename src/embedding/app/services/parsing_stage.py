@@ -0,0 +1,141 @@
+"""
+Parsing Stage - Parses Lua files across a pool of worker processes
+Each worker owns its own tree-sitter parser and streams chunk lists back to the indexer
+Unchanged files are served from the on-disk parse cache instead of being parsed again
+"""
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from app.services import lua_parser
+from app.services.parse_cache import ParseCache
+
+# Configure logging
+logger = logging.getLogger("victor-parsing-stage")
+
+# Parse cache of this worker process
+parse_cache: Optional[ParseCache] = None
+
+def _init_worker() -> None:
+    """Create a dedicated tree-sitter parser and parse cache handle for this worker process."""
+    global parse_cache
+    lua_parser.parser = None
+    lua_parser.get_parser()
+    parse_cache = ParseCache()
+
+def _parse_batch(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Read and parse a batch of files inside a worker process.
+
+    Returns one result per file with its content, formatted chunks and symbols
+    and whether they came from the parse cache, or an error message if the file
+    could not be read.
+    """
+    global parse_cache
+    if parse_cache is None:
+        parse_cache = ParseCache()
+
+    results = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            results.append({
+                "file_path": file_path,
+                "content": None,
+                "chunks": None,
+                "symbols": None,
+                "cached": False,
+                "error": str(e)
+            })
+            continue
+
+        hits = parse_cache.hits
+        chunks, symbols = parse_cache.parse(content, file_path)
+        results.append({
+            "file_path": file_path,
+            "content": content,
+            "chunks": chunks,
+            "symbols": symbols,
+            "cached": parse_cache.hits > hits,
+            "error": None
+        })
+    return results
+
+class ParsingStage:
+    """
+    Fans files out to a process pool and yields parse results as they complete.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        """
+        Initialize the parsing stage.
+
+        Args:
+            workers: Number of worker processes (defaults to PARSE_WORKERS or the CPU count)
+            chunk_size: Number of files sent to a worker per task (defaults to PARSE_CHUNK_SIZE)
+        """
+        self.workers = workers or int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+        self.chunk_size = chunk_size or int(os.getenv("PARSE_CHUNK_SIZE", "8"))
+        self.files_parsed = 0
+        self.cache_hits = 0
+        self.elapsed_seconds = 0.0
+
+    async def parse_files(self, file_paths: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse files in worker processes, yielding each file's result as soon as its batch is done.
+
+        At most two batches per worker are in flight so parsed results never pile up
+        faster than the consumer can index them.
+        """
+        loop = asyncio.get_running_loop()
+        batches = [
+            file_paths[i:i + self.chunk_size]
+            for i in range(0, len(file_paths), self.chunk_size)
+        ]
+        max_pending = self.workers * 2
+
+        self.files_parsed = 0
+        self.cache_hits = 0
+        start_time = time.perf_counter()
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            pending = set()
+            next_batch = 0
+            while next_batch < len(batches) or pending:
+                while next_batch < len(batches) and len(pending) < max_pending:
+                    pending.add(loop.run_in_executor(pool, _parse_batch, batches[next_batch]))
+                    next_batch += 1
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        self.files_parsed += 1
+                        if result["cached"]:
+                            self.cache_hits += 1
+                        yield result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.elapsed_seconds = time.perf_counter() - start_time
+            stats = self.get_stats()
+            logger.info(
+                f"Parsed {stats['files']} files in {stats['seconds']:.2f}s "
+                f"({stats['files_per_sec']:.1f} files/sec, {self.workers} workers, "
+                f"{stats['cache_hits']} from the parse cache)"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get throughput statistics for the last run."""
+        return {
+            "files": self.files_parsed,
+            "seconds": self.elapsed_seconds,
+            "files_per_sec": self.files_parsed / self.elapsed_seconds if self.elapsed_seconds else 0.0,
+            "cache_hits": self.cache_hits,
+            "workers": self.workers,
+            "chunk_size": self.chunk_size
+        }
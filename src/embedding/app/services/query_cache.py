@@ -0,0 +1,143 @@
+"""
+Query Cache - In-process LRU cache of query embeddings
+Repeated searches reuse the query vector instead of another round trip to the embedding provider
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger("victor-query-cache")
+
+# Entry count, memory and lifetime limits; a size of 0 disables the cache
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_MAX_MB = float(os.getenv("QUERY_CACHE_MAX_MB", "16"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+def normalize_query(query: str) -> str:
+    """Unicode-normalize a query and collapse its whitespace; case is kept, since identifiers are case-sensitive."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', query)).strip()
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by (model name, normalized query).
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once there are more than `max_entries` or their vectors take more than
+    `max_bytes`. Concurrent lookups of the same missing query share one
+    embedding request.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.max_entries = QUERY_CACHE_SIZE if max_entries is None else max_entries
+        self.max_bytes = int(QUERY_CACHE_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self.ttl = QUERY_CACHE_TTL if ttl is None else ttl
+        # key -> (expiry time, vector)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        _, vector = self._entries.pop(key)
+        self.bytes -= vector.nbytes
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding of a query, or None if it is missing or expired."""
+        key = (model_name, normalize_query(query))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, model_name: str, query: str, vector: np.ndarray) -> None:
+        """Cache a query embedding, evicting least recently used entries over the limits."""
+        if self.max_entries <= 0 or vector.nbytes > self.max_bytes:
+            return
+        key = (model_name, normalize_query(query))
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, vector)
+        self.bytes += vector.nbytes
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get_or_embed(
+        self,
+        model_name: str,
+        query: str,
+        embed: Callable[[str], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        """
+        Return the embedding of a query from the cache, or embed and cache it.
+
+        Args:
+            model_name: Embedding model, part of the cache key
+            query: Query text
+            embed: Coroutine function producing the embedding on a miss
+        """
+        vector = self.get(model_name, query)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        key = (model_name, normalize_query(query))
+        pending = self._pending.get(key)
+        if pending is not None:
+            # The same query is already being embedded
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            vector = await embed(query)
+            self.put(model_name, query, vector)
+            future.set_result(vector)
+            return vector
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    def clear(self) -> None:
+        """Drop every cached embedding, e.g. after switching models."""
+        self._entries.clear()
+        self.bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the current size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "ttl": self.ttl
+        }
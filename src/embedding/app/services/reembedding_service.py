@@ -0,0 +1,400 @@
+"""
+Re-embedding Service - Moves the index to another embedding model while search stays online
+Chunks are embedded with the new model in the background; the active model is switched atomically once all are done
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import datetime
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+import numpy as np
+from sqlalchemy import select, update, func, text, union, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import CodeChunk, SearchChunk, Embedding, EmbeddingModel
+from app.services.embedding_service import EmbeddingService, EMBED_BATCH_SIZE
+from app.services.embedding_executor import EmbeddingExecutor
+
+# Configure logging
+logger = logging.getLogger("victor-reembedding")
+
+# Chunk contents a re-embedding job embeds per second (0 is unlimited)
+REEMBED_RATE = float(os.getenv("REEMBED_RATE", "20"))
+# Passes over chunks indexed while the job ran before it gives up on switching over
+REEMBED_CATCH_UP_PASSES = 3
+# pgvector indexes take at most 2000 dimensions
+MAX_INDEX_DIMENSIONS = 2000
+
+def vector_index_name(model_name: str, dimensions: int) -> str:
+    """Name of the partial vector index of one (model, dimensions)."""
+    slug = re.sub(r'[^a-z0-9]+', '_', model_name.lower()).strip('_')[:40]
+    return f"idx_embeddings_{slug}_{dimensions}"
+
+async def create_vector_index(db: AsyncSession, model_name: str, dimensions: int) -> bool:
+    """
+    Create the vector index of a model: an ivfflat index over the embedding cast to the
+    model's dimension, limited to the model's rows.
+
+    Returns:
+        True if the index exists afterwards
+    """
+    if dimensions > MAX_INDEX_DIMENSIONS:
+        logger.warning(f"{model_name} has {dimensions} dimensions, too many for a vector index; searches scan its rows")
+        return False
+    # DDL takes no bind parameters; the model name is quoted as a literal
+    literal = model_name.replace("'", "''")
+    try:
+        await db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {vector_index_name(model_name, dimensions)} ON victor.embeddings "
+            f"USING ivfflat ((embedding::vector({dimensions})) vector_cosine_ops) WHERE model_name = '{literal}'"
+        ))
+        await db.commit()
+        return True
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"Could not create the vector index of {model_name}: {e}")
+        return False
+
+async def link_search_chunks(db: AsyncSession) -> bool:
+    """
+    Add the content_hash column of lua_chunks to databases created before it existed.
+    The hash joins the searched chunks to the vectors of other models.
+
+    Returns:
+        True if the column exists afterwards
+    """
+    try:
+        await db.execute(text(
+            "ALTER TABLE lua_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT "
+            "GENERATED ALWAYS AS (encode(sha256(convert_to(content, 'UTF8')), 'hex')) STORED"
+        ))
+        await db.execute(text("CREATE INDEX IF NOT EXISTS idx_lua_chunks_content_hash ON lua_chunks (content_hash)"))
+        await db.commit()
+        return True
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"Could not add content hashes to lua_chunks: {e}")
+        return False
+
+class ReembeddingService:
+    """
+    Re-embeds every chunk with a new model while the active model keeps serving.
+
+    Vectors of all models live side by side in the embeddings table, so a job only
+    adds rows for its target model: leaf chunks are embedded at most `rate` contents
+    per second, then hierarchical parents get summary vectors of their children. Once
+    nothing is missing, the target's vector index is built and one transaction makes
+    it the active model and retires the previous one; `on_switch` then moves indexing
+    and search over. The retired model's rows are kept, so switching back is a job
+    with nothing to embed. A cancelled job resumes where it stopped.
+
+    Jobs also embed the contents of lua_chunks, whose embedding column only holds
+    vectors of the first registered model (`column_model`); search under any other
+    model joins them to its rows in the embeddings table.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        on_switch: Callable[[EmbeddingService], Awaitable[None]]
+    ):
+        """
+        Args:
+            session_factory: Creates the database sessions of background jobs
+            on_switch: Called with the target's embedding service after the switch-over
+        """
+        self.session_factory = session_factory
+        self.on_switch = on_switch
+        self.active_model: Optional[str] = None
+        self.column_model: Optional[str] = None
+        self.job: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Future] = None
+
+    async def restore(self, db: AsyncSession, embedding_service: EmbeddingService) -> EmbeddingService:
+        """
+        Find the active model on startup.
+        Without one, the configured model is registered as active. Otherwise the
+        embedding service of the active model is returned, which may differ from the
+        configured one after a switch-over.
+        """
+        await link_search_chunks(db)
+        try:
+            first = await db.execute(select(EmbeddingModel.model_name).order_by(EmbeddingModel.created_at).limit(1))
+            self.column_model = first.scalar()
+            result = await db.execute(select(EmbeddingModel).where(EmbeddingModel.status == "active"))
+            active = result.scalar_one_or_none()
+            if active is None:
+                db.add(EmbeddingModel(
+                    model_name=embedding_service.model_name,
+                    provider=embedding_service.provider,
+                    dimensions=embedding_service.embedding_dim,
+                    status="active",
+                    activated_at=datetime.datetime.utcnow()
+                ))
+                await db.commit()
+                self.active_model = embedding_service.model_name
+                self.column_model = self.column_model or embedding_service.model_name
+                return embedding_service
+
+            self.active_model = active.model_name
+            if active.model_name == embedding_service.model_name:
+                return embedding_service
+            logger.info(f"Active embedding model is {active.model_name} ({active.provider}), not the configured {embedding_service.model_name}")
+            return EmbeddingService(provider=active.provider, model_name=active.model_name)
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"Could not read the active embedding model, using {embedding_service.model_name}: {e}")
+            self.active_model = embedding_service.model_name
+            self.column_model = self.column_model or embedding_service.model_name
+            return embedding_service
+
+    def start(self, target: EmbeddingService, rate: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Start re-embedding the index with the target's model in the background.
+
+        Raises:
+            ValueError: If a job is running or the target is already the active model
+        """
+        if self._task is not None and not self._task.done():
+            raise ValueError(f"Re-embedding to {self.job['model']} is already running")
+        if target.model_name == self.active_model:
+            raise ValueError(f"{target.model_name} is already the active model")
+
+        self.job = {
+            "model": target.model_name,
+            "provider": target.provider,
+            "state": "embedding",
+            "rate": REEMBED_RATE if rate is None else rate,
+            "total": 0,
+            "done": 0,
+            "embedded": 0,
+            "summarized": 0,
+            "failed": 0,
+            "started_at": time.time(),
+            "finished_at": None,
+            "error": None
+        }
+        self._task = asyncio.ensure_future(self._run(target, self.job))
+        return self.get_status()
+
+    def cancel(self) -> bool:
+        """Stop the running job; rows it embedded are kept and reused by the next job."""
+        if self._task is None or self._task.done():
+            return False
+        self._task.cancel()
+        return True
+
+    async def _run(self, target: EmbeddingService, job: Dict[str, Any]) -> None:
+        try:
+            async with self.session_factory() as db:
+                await self._register(db, target)
+                executor = EmbeddingExecutor(target, concurrency=1)
+
+                for _ in range(REEMBED_CATCH_UP_PASSES):
+                    job["total"], job["done"] = await self._count_contents(db, target.model_name)
+                    await self._embed_missing(db, target, executor, job)
+                    await self._summarize_missing(db, target, job)
+                    if job["failed"] or not await self._missing(db, target.model_name, limit=1):
+                        break
+
+                if job["failed"]:
+                    raise Exception(f"{job['failed']} chunk contents could not be embedded")
+
+                job["state"] = "indexing"
+                await create_vector_index(db, target.model_name, target.embedding_dim)
+
+                job["state"] = "switching"
+                await self._switch(db, target)
+                await self.on_switch(target)
+
+                # Chunks indexed with the previous model while switching over
+                await self._embed_missing(db, target, executor, job)
+                await self._summarize_missing(db, target, job)
+                job["state"] = "active"
+                logger.info(f"Switched to embedding model {target.model_name}: {job['embedded']} contents embedded, {job['summarized']} summarized")
+        except asyncio.CancelledError:
+            job["state"] = "cancelled"
+            logger.info(f"Re-embedding to {target.model_name} cancelled")
+        except Exception as e:
+            job["state"] = "failed"
+            job["error"] = str(e)
+            logger.error(f"Re-embedding to {target.model_name} failed: {e}")
+        finally:
+            job["finished_at"] = time.time()
+
+    async def _register(self, db: AsyncSession, target: EmbeddingService) -> None:
+        """Add the target to the model registry, or mark a retired one as building again."""
+        existing = await db.get(EmbeddingModel, target.model_name)
+        if existing is None:
+            db.add(EmbeddingModel(
+                model_name=target.model_name,
+                provider=target.provider,
+                dimensions=target.embedding_dim,
+                status="building"
+            ))
+        elif existing.status == "active":
+            raise ValueError(f"{target.model_name} is already the active model")
+        else:
+            existing.status = "building"
+            existing.provider = target.provider
+        await db.commit()
+
+    async def _count_contents(self, db: AsyncSession, model_name: str) -> Tuple[int, int]:
+        """Count distinct chunk contents (indexed and searched), and those with a vector of the model."""
+        contents = union(
+            select(CodeChunk.content_hash),
+            select(SearchChunk.content_hash).where(SearchChunk.content_hash.isnot(None))
+        ).subquery()
+        total = await db.execute(select(func.count()).select_from(contents))
+        done = await db.execute(
+            select(func.count())
+            .select_from(contents)
+            .join(Embedding, Embedding.content_hash == contents.c.content_hash)
+            .where(Embedding.model_name == model_name)
+        )
+        return total.scalar(), done.scalar()
+
+    async def _missing(
+        self,
+        db: AsyncSession,
+        model_name: str,
+        after: str = "",
+        limit: Optional[int] = None,
+        summaries: bool = False
+    ) -> List[Tuple[str, str]]:
+        """
+        Chunk contents with no vector of the model, in content hash order after `after`.
+        Leaf chunks and the searched chunks of lua_chunks are embedded; summarized
+        parents (hierarchical mode) are averaged.
+        """
+        summary = func.coalesce(CodeChunk.meta_data["embedding"].as_string(), "") == "summary"
+        if summaries:
+            contents = select(CodeChunk.content_hash, CodeChunk.content).where(summary).subquery()
+        else:
+            contents = union_all(
+                select(CodeChunk.content_hash, CodeChunk.content).where(~summary),
+                select(SearchChunk.content_hash, SearchChunk.content).where(SearchChunk.content_hash.isnot(None))
+            ).subquery()
+        embedded = select(Embedding.id).where(
+            Embedding.content_hash == contents.c.content_hash,
+            Embedding.model_name == model_name
+        ).exists()
+        stmt = (
+            select(contents.c.content_hash, func.min(contents.c.content))
+            .where(~embedded, contents.c.content_hash > after)
+            .group_by(contents.c.content_hash)
+            .order_by(contents.c.content_hash)
+        )
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        result = await db.execute(stmt)
+        return [(row[0], row[1]) for row in result]
+
+    async def _embed_missing(
+        self,
+        db: AsyncSession,
+        target: EmbeddingService,
+        executor: EmbeddingExecutor,
+        job: Dict[str, Any]
+    ) -> None:
+        """Embed leaf chunk contents the target has no vector for, at most job["rate"] per second."""
+        after = ""
+        started = time.monotonic()
+        embedded = 0
+        while True:
+            batch = await self._missing(db, target.model_name, after, EMBED_BATCH_SIZE)
+            if not batch:
+                return
+            # Failed contents stay missing; moving past them keeps the pass finite
+            after = batch[-1][0]
+
+            results = await executor.run_batch(batch)
+            stored = await target.store_embeddings(db, results)
+            job["failed"] += sum(1 for _, embedding in results if embedding is None)
+            embedded += stored
+            job["embedded"] += stored
+            job["done"] += stored
+            await self._save_progress(db, target, job)
+
+            if job["rate"] > 0:
+                # Throughput cap: sleep until the pass is back on the configured rate
+                ahead = started + embedded / job["rate"] - time.monotonic()
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+
+    async def _summarize_missing(self, db: AsyncSession, target: EmbeddingService, job: Dict[str, Any]) -> None:
+        """
+        Give summarized parents the normalized mean of their children's target vectors,
+        smallest parents first so nested parents are summarized before their own parents.
+        """
+        missing = await self._missing(db, target.model_name, summaries=True)
+        if not missing:
+            return
+        parents = await db.execute(
+            select(CodeChunk.id, CodeChunk.content_hash)
+            .where(CodeChunk.content_hash.in_([content_hash for content_hash, _ in missing]))
+            .order_by(CodeChunk.end_line - CodeChunk.start_line)
+        )
+        done = set()
+        for parent_id, content_hash in parents.all():
+            if content_hash in done:
+                continue
+            result = await db.execute(
+                select(Embedding.embedding)
+                .join(CodeChunk, CodeChunk.content_hash == Embedding.content_hash)
+                .where(CodeChunk.parent_id == parent_id, Embedding.model_name == target.model_name)
+            )
+            child_vectors = [np.asarray(row[0], dtype=np.float32) for row in result]
+            if not child_vectors:
+                continue
+            summary = np.mean(child_vectors, axis=0)
+            norm = np.linalg.norm(summary)
+            if norm > 0:
+                summary = summary / norm
+            await target.store_embedding(db, content_hash, summary)
+            done.add(content_hash)
+            job["summarized"] += 1
+            job["done"] += 1
+
+    async def _save_progress(self, db: AsyncSession, target: EmbeddingService, job: Dict[str, Any]) -> None:
+        await db.execute(
+            update(EmbeddingModel)
+            .where(EmbeddingModel.model_name == target.model_name)
+            .values(embedded=job["done"], total=job["total"], dimensions=target.embedding_dim)
+        )
+        await db.commit()
+
+    async def _switch(self, db: AsyncSession, target: EmbeddingService) -> None:
+        """Retire the active model and activate the target in one transaction."""
+        await db.execute(
+            update(EmbeddingModel)
+            .where(EmbeddingModel.status == "active")
+            .values(status="retired")
+        )
+        await db.execute(
+            update(EmbeddingModel)
+            .where(EmbeddingModel.model_name == target.model_name)
+            .values(status="active", activated_at=datetime.datetime.utcnow(), embedded=self.job["done"], total=self.job["total"])
+        )
+        await db.commit()
+        self.active_model = target.model_name
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get the progress of the current or last job."""
+        if self.job is None:
+            return {"active_model": self.active_model, "state": "idle"}
+        job = self.job
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+        remaining = max(job["total"] - job["done"], 0)
+        throughput = job["embedded"] / elapsed if elapsed > 0 else 0.0
+        return {
+            **job,
+            "active_model": self.active_model,
+            "progress": job["done"] / job["total"] if job["total"] else 0.0,
+            "throughput": throughput,
+            "eta_seconds": remaining / throughput if throughput and job["state"] == "embedding" else None
+        }
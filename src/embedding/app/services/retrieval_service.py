@@ -5,13 +5,14 @@ Ported from dcs-lua-analyzer project
 
 import os
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
-import numpy as np
 
 from .embedding_service import EmbeddingService
+from .query_cache import QueryEmbeddingCache
+from .vector_compression import CompactIndex
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +34,11 @@ class RetrievalService:
         """
         self.embedding_service = embedding_service or EmbeddingService()
         self.search_limit = int(os.getenv("SEARCH_LIMIT", "10"))
+        self.query_cache = QueryEmbeddingCache()
+        self.compact_index = CompactIndex()
+        # Model of the vectors in lua_chunks.embedding (None: the embedding service's model).
+        # Other models are searched through their rows in victor.embeddings.
+        self.column_model: Optional[str] = None
     
     async def text_search(
         self, 
@@ -120,8 +126,10 @@ class RetrievalService:
         try:
             limit = limit or self.search_limit
             
-            # Generate embedding for the query
-            query_embedding = await self.embedding_service.generate_embedding(query)
+            # Generate embedding for the query, reusing it for repeated queries
+            query_embedding = await self.query_cache.get_or_embed(
+                self.embedding_service.model_name, query, self.embedding_service.generate_embedding
+            )
             
             # Convert to list for SQL
             embedding_list = query_embedding.tolist()
@@ -130,6 +138,19 @@ class RetrievalService:
             # This is necessary because asyncpg doesn't handle vector type casting well
             embedding_str = '[' + ','.join(str(x) for x in embedding_list) + ']'
             
+            # After a switch-over, lua_chunks.embedding holds another model's vectors
+            if not self.uses_column():
+                result = await db.execute(
+                    text(self._model_search_sql(embedding_str, len(embedding_list))),
+                    {"limit": limit}
+                )
+                return [self._vector_result(row) for row in result]
+            
+            # Compact mode: candidates from the halfvec or binary index, reranked at full precision
+            if self.compact_index.enabled and await self.compact_index.get_projection(db) is not None:
+                result = await self.compact_index.search(db, query_embedding, limit)
+                return [self._vector_result(row) for row in result]
+            
             # SQL query for vector similarity search
             # Using string interpolation for the vector literal (safe since it's our generated data)
             sql = f"""
@@ -153,25 +174,53 @@ class RetrievalService:
                 {"limit": limit}
             )
             
-            chunks = []
-            for row in result:
-                chunks.append({
-                    "id": row.id,
-                    "file_path": row.file_path,
-                    "chunk_type": row.chunk_type,
-                    "content": row.content,
-                    "metadata": row.meta_data,
-                    "line_start": row.line_start,
-                    "line_end": row.line_end,
-                    "score": float(row.similarity)
-                })
-            
-            return chunks
+            return [self._vector_result(row) for row in result]
             
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
             return []
     
+    def uses_column(self) -> bool:
+        """Whether the active model's vectors are the ones in lua_chunks.embedding."""
+        return self.column_model is None or self.column_model == self.embedding_service.model_name
+    
+    def _model_search_sql(self, embedding_str: str, dimensions: int) -> str:
+        """
+        Search the active model's rows in victor.embeddings, joined to lua_chunks by content.
+        The distance is computed over the cast the model's partial vector index is built on.
+        """
+        # The model name is quoted as a literal; the vectors are interpolated as in vector_search
+        literal = self.embedding_service.model_name.replace("'", "''")
+        distance = f"e.embedding::vector({dimensions}) <=> '{embedding_str}'::vector({dimensions})"
+        return f"""
+            SELECT 
+                c.id,
+                c.file_path,
+                c.chunk_type,
+                c.content,
+                c.meta_data,
+                c.line_start,
+                c.line_end,
+                1 - ({distance}) as similarity
+            FROM victor.embeddings e
+            JOIN lua_chunks c ON c.content_hash = e.content_hash
+            WHERE e.model_name = '{literal}'
+            ORDER BY {distance}
+            LIMIT :limit
+        """
+    
+    def _vector_result(self, row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "file_path": row.file_path,
+            "chunk_type": row.chunk_type,
+            "content": row.content,
+            "metadata": row.meta_data,
+            "line_start": row.line_start,
+            "line_end": row.line_end,
+            "score": float(row.similarity)
+        }
+    
     async def hybrid_search(
         self,
         db: AsyncSession,
@@ -389,4 +438,64 @@ class RetrievalService:
             
         except Exception as e:
             logger.error(f"Error getting related chunks: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    async def find_symbol(
+        self,
+        db: AsyncSession,
+        name: str,
+        limit: Optional[int] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Look up a Lua symbol by its exact name (e.g. "a.b:c") in the symbol tables.
+        Each lookup uses the B-tree index on the table's name column.
+        
+        Args:
+            db: Database session
+            name: Function or variable name
+            limit: Maximum number of rows per kind
+            
+        Returns:
+            Dict with the symbol's "definitions", "calls" (call sites) and "variables"
+        """
+        try:
+            limit = limit or self.search_limit
+            params = {"name": name, "limit": limit}
+            
+            definitions = await db.execute(text("""
+                SELECT f.name, f.signature, f.start_line, f.end_line, f.chunk_id, files.file_path
+                FROM victor.functions f
+                JOIN victor.files files ON files.id = f.file_id
+                WHERE f.name = :name
+                ORDER BY files.file_path, f.start_line
+                LIMIT :limit
+            """), params)
+            
+            calls = await db.execute(text("""
+                SELECT c.name, c.line_number, caller.name AS caller, files.file_path
+                FROM victor.function_calls c
+                JOIN victor.files files ON files.id = c.file_id
+                LEFT JOIN victor.functions caller ON caller.id = c.source_function_id
+                WHERE c.name = :name
+                ORDER BY files.file_path, c.line_number
+                LIMIT :limit
+            """), params)
+            
+            variables = await db.execute(text("""
+                SELECT v.name, v.var_type, v.scope, v.line_number, files.file_path
+                FROM victor.variables v
+                JOIN victor.files files ON files.id = v.file_id
+                WHERE v.name = :name
+                ORDER BY files.file_path, v.line_number
+                LIMIT :limit
+            """), params)
+            
+            return {
+                "definitions": [dict(row._mapping) for row in definitions],
+                "calls": [dict(row._mapping) for row in calls],
+                "variables": [dict(row._mapping) for row in variables]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error finding symbol {name}: {e}")
+            return {"definitions": [], "calls": [], "variables": []}
@@ -0,0 +1,374 @@
+"""
+Vector Compression - Compact copies of the lua_chunks embeddings for a smaller ANN index
+Vectors are stored as halfvec (optionally reduced by PCA or Matryoshka truncation) or binary-quantized; searches rerank at full precision
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Configure logging
+logger = logging.getLogger("victor-vector-compression")
+
+# Compact search: "off", "halfvec" (same dimensions at 16 bits), "pca" or "matryoshka" (fewer
+# dimensions), or "binary" (one bit per dimension, searched by Hamming distance)
+VECTOR_COMPACT = os.getenv("VECTOR_COMPACT", "off")
+VECTOR_COMPACT_DIMS = int(os.getenv("VECTOR_COMPACT_DIMS", "256"))
+# Oversampling: candidates fetched from the compact index per requested result, reranked at
+# full precision (0 uses the method's default)
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "0"))
+# Vectors sampled to fit the PCA projection
+PCA_SAMPLE_SIZE = int(os.getenv("PCA_SAMPLE_SIZE", "20000"))
+
+METHODS = ("halfvec", "pca", "matryoshka", "binary")
+# Bits lose far more ordering than halfvec, so binary search needs many more candidates
+DEFAULT_RERANK_FACTORS = {"halfvec": 4, "pca": 4, "matryoshka": 4, "binary": 20}
+# Largest hnsw.ef_search pgvector accepts; an HNSW scan returns at most ef_search rows
+MAX_EF_SEARCH = 1000
+# Rows projected and written per UPDATE while building
+BUILD_BATCH_SIZE = 1000
+# Seconds a loaded projection is trusted before checking whether it was rebuilt
+PROJECTION_TTL = 60
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def parse_vector(value: str) -> np.ndarray:
+    """Parse pgvector's text form, e.g. "[0.1,0.2]"."""
+    return np.array(value.strip("[]").split(","), dtype=np.float32)
+
+def format_vector(vector: np.ndarray) -> str:
+    return "[" + ",".join(str(float(x)) for x in vector) + "]"
+
+class VectorProjection:
+    """
+    Maps full embeddings to compact ones for cosine search.
+
+    "halfvec" keeps every dimension; "matryoshka" keeps the leading `dims`
+    (for models trained with Matryoshka representation learning, e.g.
+    nomic-embed-text v1.5); "pca" projects the centered vector onto the top `dims`
+    principal components of the corpus. Results are L2-normalized, so cosine
+    distances over them stay comparable. "binary" keeps one bit per dimension, set
+    where the vector is above the corpus mean (centering balances the bits, which
+    plain sign quantization leaves skewed for embeddings with a non-zero mean).
+    """
+
+    def __init__(
+        self,
+        method: str,
+        source_dims: int,
+        dims: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None
+    ):
+        if method not in METHODS:
+            raise ValueError(f"Unknown compact vector method: {method} (expected one of {', '.join(METHODS)})")
+        if method in ("halfvec", "binary"):
+            dims = source_dims
+        if not 0 < dims <= source_dims:
+            raise ValueError(f"Cannot reduce {source_dims} dimensions to {dims}")
+        self.method = method
+        self.source_dims = source_dims
+        self.dims = dims
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, method: str, vectors: np.ndarray, dims: int) -> "VectorProjection":
+        """Learn a projection from a sample of the corpus (only PCA needs the sample)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if method == "binary":
+            return cls(method, vectors.shape[1], dims, vectors.mean(axis=0))
+        if method != "pca":
+            return cls(method, vectors.shape[1], dims)
+        if len(vectors) < dims:
+            raise ValueError(f"PCA to {dims} dimensions needs at least {dims} vectors, got {len(vectors)}")
+        mean = vectors.mean(axis=0)
+        # Rows of vt are the principal directions, strongest first
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(method, vectors.shape[1], dims, mean, vt[:dims].astype(np.float32))
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Project a batch of full embeddings (rows) to normalized compact ones."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "pca":
+            vectors = (vectors - self.mean) @ self.components.T
+        elif self.method == "matryoshka":
+            vectors = vectors[:, :self.dims]
+        elif self.method == "binary":
+            return vectors - self.mean
+        return normalize_rows(vectors)
+
+    def binary_codes(self, vectors: np.ndarray) -> np.ndarray:
+        """Binary codes of full embeddings (rows), packed 8 dimensions per byte."""
+        return np.packbits(self.project(vectors) > 0, axis=1)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Storage of one compact vector in pgvector (halfvec: 2 bytes per dimension, bit: 1 bit), header included."""
+        return (self.dims + 7) // 8 + 8 if self.method == "binary" else 2 * self.dims + 8
+
+    def to_bytes(self) -> Tuple[Optional[bytes], Optional[bytes]]:
+        mean = self.mean.astype(np.float32).tobytes() if self.mean is not None else None
+        components = self.components.astype(np.float32).tobytes() if self.components is not None else None
+        return mean, components
+
+    @classmethod
+    def from_row(cls, row) -> "VectorProjection":
+        mean = np.frombuffer(row.mean, dtype=np.float32) if row.mean is not None else None
+        components = None
+        if row.components is not None:
+            components = np.frombuffer(row.components, dtype=np.float32).reshape(row.dims, row.source_dims)
+        return cls(row.method, row.source_dims, row.dims, mean, components)
+
+class CompactIndex:
+    """
+    The compact vector column of lua_chunks and its HNSW index.
+
+    `build` fits a projection and fills a new column `embedding_compact_next
+    halfvec(dims)` and its index next to the current ones; that blocks writes to
+    lua_chunks, not searches. A short final transaction drops the old column, renames
+    the new one and saves the projection in vector_projections for every process
+    that searches, so searches use the old compact vectors until then. `refresh`
+    fills the column for chunks added since. Searches fall back to an exact scan for
+    chunks without a compact vector.
+
+    The binary method needs no column: its HNSW index is over the expression
+    binary_quantize(embedding - mean), which Postgres keeps up to date for new
+    chunks, and searches order by the same expression's Hamming distance.
+    """
+
+    def __init__(self, method: Optional[str] = None, rerank_factor: Optional[int] = None):
+        self.method = method or VECTOR_COMPACT
+        self.rerank_factor = rerank_factor or VECTOR_RERANK_FACTOR
+        self.projection: Optional[VectorProjection] = None
+        self.projection_id: Optional[int] = None
+        self._checked_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.method != "off"
+
+    def candidates(self, limit: int) -> int:
+        """Candidates to rerank for `limit` results with the current projection."""
+        factor = self.rerank_factor or DEFAULT_RERANK_FACTORS[self.projection.method]
+        return min(limit * factor, MAX_EF_SEARCH)
+
+    async def get_projection(self, db: AsyncSession) -> Optional[VectorProjection]:
+        """The projection of the current compact column, re-read when another process rebuilt it."""
+        if self._checked_at and time.monotonic() - self._checked_at < PROJECTION_TTL:
+            return self.projection
+        self._checked_at = time.monotonic()
+        try:
+            result = await db.execute(text(
+                "SELECT id, method, source_dims, dims, mean, components FROM vector_projections ORDER BY id DESC LIMIT 1"
+            ))
+            row = result.first()
+        except Exception as e:
+            # Schema without vector_projections: search the full vectors
+            await db.rollback()
+            logger.warning(f"Compact vectors unavailable: {e}")
+            row = None
+        if row is None:
+            self.projection = self.projection_id = None
+        elif row.id != self.projection_id:
+            self.projection = VectorProjection.from_row(row)
+            self.projection_id = row.id
+        return self.projection
+
+    async def _sample(self, db: AsyncSession, size: int) -> np.ndarray:
+        result = await db.execute(
+            text("SELECT embedding::text AS embedding FROM lua_chunks WHERE embedding IS NOT NULL ORDER BY random() LIMIT :size"),
+            {"size": size}
+        )
+        rows = [parse_vector(row.embedding) for row in result]
+        if not rows:
+            raise ValueError("No chunks with embeddings to build a compact index from")
+        return np.stack(rows)
+
+    async def _fill(
+        self,
+        db: AsyncSession,
+        projection: VectorProjection,
+        only_missing: bool,
+        column: str = "embedding_compact"
+    ) -> int:
+        """Write the compact vectors of chunks (all, or those without one) in batches."""
+        filled = 0
+        after = 0
+        missing = f"AND {column} IS NULL" if only_missing else ""
+        while True:
+            result = await db.execute(
+                text(f"""
+                    SELECT id, embedding::text AS embedding FROM lua_chunks
+                    WHERE embedding IS NOT NULL AND id > :after {missing}
+                    ORDER BY id
+                    LIMIT :limit
+                """),
+                {"after": after, "limit": BUILD_BATCH_SIZE}
+            )
+            rows = result.all()
+            if not rows:
+                return filled
+            compact = projection.project(np.stack([parse_vector(row.embedding) for row in rows]))
+            await db.execute(
+                text(f"""
+                    UPDATE lua_chunks AS c SET {column} = CAST(v.compact AS halfvec)
+                    FROM (SELECT unnest(CAST(:ids AS integer[])) AS id, unnest(CAST(:vectors AS text[])) AS compact) v
+                    WHERE c.id = v.id
+                """),
+                {"ids": [row.id for row in rows], "vectors": [format_vector(vector) for vector in compact]}
+            )
+            filled += len(rows)
+            after = rows[-1].id
+
+    async def build(
+        self,
+        db: AsyncSession,
+        method: Optional[str] = None,
+        dims: Optional[int] = None,
+        sample_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Fit a projection on the corpus, build the new compact column and its index,
+        then swap them for the current ones.
+
+        Returns:
+            Dict with the projection and build statistics
+        """
+        method = method or (self.method if self.enabled else "halfvec")
+        start = time.perf_counter()
+        sample = await self._sample(db, sample_size or PCA_SAMPLE_SIZE)
+        projection = VectorProjection.fit(method, sample, dims or VECTOR_COMPACT_DIMS)
+        mean, components = projection.to_bytes()
+        try:
+            # Leftovers of a failed build (the column's index goes with it)
+            await db.execute(text("DROP INDEX IF EXISTS idx_lua_chunks_embedding_binary_next"))
+            await db.execute(text("ALTER TABLE lua_chunks DROP COLUMN IF EXISTS embedding_compact_next"))
+            if method != "binary":
+                # The column's type carries the dimension, so every build fills a new one. Adding a
+                # nullable column only locks the table briefly; it is committed before the fill.
+                await db.execute(text(f"ALTER TABLE lua_chunks ADD COLUMN embedding_compact_next halfvec({projection.dims})"))
+            await db.commit()
+
+            # Filling and indexing block writes to lua_chunks but not searches
+            if method == "binary":
+                await db.execute(text(
+                    f"CREATE INDEX idx_lua_chunks_embedding_binary_next ON lua_chunks "
+                    f"USING hnsw (({self._binary_expression(projection)}) bit_hamming_ops)"
+                ))
+                result = await db.execute(text("SELECT COUNT(*) FROM lua_chunks WHERE embedding IS NOT NULL"))
+                filled = result.scalar()
+            else:
+                filled = await self._fill(db, projection, only_missing=False, column="embedding_compact_next")
+                await db.execute(text(
+                    "CREATE INDEX idx_lua_chunks_embedding_compact_next ON lua_chunks "
+                    "USING hnsw (embedding_compact_next halfvec_cosine_ops)"
+                ))
+            await db.commit()
+
+            # The swap: catalog changes only, so the table is locked for a moment
+            await db.execute(text("DROP INDEX IF EXISTS idx_lua_chunks_embedding_compact"))
+            await db.execute(text("DROP INDEX IF EXISTS idx_lua_chunks_embedding_binary"))
+            await db.execute(text("ALTER TABLE lua_chunks DROP COLUMN IF EXISTS embedding_compact"))
+            if method == "binary":
+                await db.execute(text("ALTER INDEX idx_lua_chunks_embedding_binary_next RENAME TO idx_lua_chunks_embedding_binary"))
+            else:
+                await db.execute(text("ALTER TABLE lua_chunks RENAME COLUMN embedding_compact_next TO embedding_compact"))
+                await db.execute(text("ALTER INDEX idx_lua_chunks_embedding_compact_next RENAME TO idx_lua_chunks_embedding_compact"))
+            result = await db.execute(
+                text("""
+                    INSERT INTO vector_projections (method, source_dims, dims, mean, components)
+                    VALUES (:method, :source_dims, :dims, :mean, :components)
+                    RETURNING id
+                """),
+                {"method": method, "source_dims": projection.source_dims, "dims": projection.dims, "mean": mean, "components": components}
+            )
+            projection_id = result.scalar()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        self.projection = projection
+        self.projection_id = projection_id
+        self._checked_at = time.monotonic()
+        stats = {
+            "method": method,
+            "source_dims": projection.source_dims,
+            "dims": projection.dims,
+            "chunks": filled,
+            "sample": len(sample),
+            "bytes_per_vector": projection.bytes_per_vector,
+            "seconds": time.perf_counter() - start
+        }
+        logger.info(f"Built compact vector index: {stats}")
+        return stats
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Fill the compact column for chunks embedded since the last build."""
+        projection = await self.get_projection(db)
+        if projection is None or projection.method == "binary":
+            # The binary index covers new chunks by itself
+            return 0
+        filled = await self._fill(db, projection, only_missing=True)
+        await db.commit()
+        return filled
+
+    @staticmethod
+    def _binary_expression(projection: VectorProjection, vector: str = "embedding") -> str:
+        # Index and queries must use the identical expression, mean literal included
+        return f"binary_quantize({vector} - '{format_vector(projection.mean)}'::vector)::bit({projection.dims})"
+
+    async def search(self, db: AsyncSession, query: np.ndarray, limit: int):
+        """
+        Two-stage search: candidates from the compact index, reranked by the
+        full-precision vector. HNSW scans return at most hnsw.ef_search rows, so it is
+        raised to the candidate count for this transaction.
+        """
+        candidates = self.candidates(limit)
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {max(candidates, 40)}"))
+        return await db.execute(text(self.search_sql(query)), {"limit": limit, "candidates": candidates})
+
+    def search_sql(self, query: np.ndarray) -> str:
+        """
+        SQL of a compact search: candidates are the nearest compact vectors through
+        the HNSW index plus chunks without one (exact), reranked by the full-precision
+        vector; binary candidates are the nearest codes by Hamming distance. Takes
+        :limit and :candidates; the vectors are inlined as literals like the other
+        vector searches (safe since they are our generated data).
+        """
+        full = format_vector(query)
+        if self.projection.method == "binary":
+            candidate_sql = f"""
+                SELECT * FROM lua_chunks
+                WHERE embedding IS NOT NULL
+                ORDER BY {self._binary_expression(self.projection)} <~> {self._binary_expression(self.projection, f"'{full}'::vector")}
+                LIMIT :candidates
+            """
+        else:
+            compact = format_vector(self.projection.project(query[np.newaxis])[0])
+            candidate_sql = f"""
+                (SELECT * FROM lua_chunks
+                 WHERE embedding_compact IS NOT NULL
+                 ORDER BY embedding_compact <=> '{compact}'::halfvec
+                 LIMIT :candidates)
+                UNION ALL
+                (SELECT * FROM lua_chunks
+                 WHERE embedding_compact IS NULL AND embedding IS NOT NULL
+                 ORDER BY embedding <=> '{full}'::vector
+                 LIMIT :candidates)
+            """
+        return f"""
+            SELECT id, file_path, chunk_type, content, meta_data, line_start, line_end,
+                   1 - (embedding <=> '{full}'::vector) AS similarity
+            FROM ({candidate_sql}) candidates
+            ORDER BY embedding <=> '{full}'::vector
+            LIMIT :limit
+        """
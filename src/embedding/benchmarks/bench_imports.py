@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Check that the services import within a time budget and without heavy dependencies.
+
+Usage (from src/embedding):
+    python -m benchmarks.bench_imports                 # default modules, 0.5 s budget each
+    python -m benchmarks.bench_imports --budget 0.2 app.services.lua_parser
+    python -m benchmarks.bench_imports --allow-missing  # skip modules whose imports fail
+
+Each module is imported in a fresh interpreter, best of --repeat runs. The budget
+covers what a module adds on top of the frameworks it loads (FastAPI, SQLAlchemy,
+numpy), which are timed on their own the same way: they are needed at import and
+take most of a second on slow machines. A module fails if it cannot be imported,
+if it takes longer than the budget or if it pulled in one of the lazily loaded
+dependencies (torch, sentence_transformers,
+the HTTP clients, the tree-sitter grammar bundle). With --allow-missing, modules that cannot be
+imported (e.g. without an optional dependency installed) are reported as skipped
+instead. Exits with 1 on any failure.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import List, Dict, Any
+
+# (module, directory it is imported from, relative to this file's parent)
+DEFAULT_MODULES = [
+    ("app.services.lua_parser", "."),
+    ("app.services.embedding_service", "."),
+    ("app.services.indexing_service", "."),
+    ("app.main", "."),
+]
+
+# Modules that must only be imported when they are first used
+LAZY_MODULES = ["torch", "sentence_transformers", "aiohttp", "openai", "tree_sitter_languages"]
+
+# Frameworks the services need at import; their time is not charged to the budget
+FRAMEWORK_MODULES = ["fastapi", "sqlalchemy.ext.asyncio", "numpy"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "loaded": [m for m in {lazy!r} if m in sys.modules],
+    "frameworks": [m for m in {frameworks!r} if m in sys.modules]
+}}))
+"""
+
+def measure(module: str, cwd: str, repeat: int) -> Dict[str, Any]:
+    """Import a module in fresh interpreters and return the best time and any lazy modules it loaded."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [cwd, env.get("PYTHONPATH")]))
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_MODULES, frameworks=FRAMEWORK_MODULES)],
+            cwd=cwd, env=env, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            return {"error": error[-1] if error else f"exit code {completed.returncode}"}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("modules", nargs="*", help="Modules to import (default: the service entry points)")
+    arg_parser.add_argument("--budget", type=float, default=0.5, help="Allowed import time per module on top of its frameworks, in seconds")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module; the best time counts")
+    arg_parser.add_argument("--allow-missing", action="store_true", help="Skip modules that fail to import instead of failing")
+    args = arg_parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    modules: List = [(module, ".") for module in args.modules] or DEFAULT_MODULES
+
+    failures = 0
+    framework_seconds: Dict[tuple, float] = {}
+    for module, relative_dir in modules:
+        cwd = os.path.normpath(os.path.join(root, relative_dir))
+        result = measure(module, cwd, args.repeat)
+        if "error" in result:
+            if args.allow_missing:
+                print(f"  {module:35s} SKIPPED ({result['error']})")
+            else:
+                print(f"  {module:35s} FAIL: import error ({result['error']})")
+                failures += 1
+            continue
+
+        frameworks = tuple(result["frameworks"])
+        if frameworks and frameworks not in framework_seconds:
+            # All of them in one probe: "import fastapi; import numpy"
+            framework_seconds[frameworks] = measure("; import ".join(frameworks), cwd, args.repeat)["seconds"]
+        own = max(result["seconds"] - framework_seconds.get(frameworks, 0.0), 0.0)
+
+        problems = []
+        if own > args.budget:
+            problems.append(f"over the {args.budget:.2f}s budget")
+        if result["loaded"]:
+            problems.append(f"loaded {', '.join(result['loaded'])}")
+        status = "FAIL: " + "; ".join(problems) if problems else "ok"
+        print(f"  {module:35s} {result['seconds'] * 1000:8.1f} ms  (own {own * 1000:6.1f} ms)  {status}")
+        if problems:
+            failures += 1
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Check and time incremental re-parses against full parses under random edits.
+
+Usage (from src/embedding):
+    python -m benchmarks.bench_incremental                      # generated corpus (seed 42)
+    python -m benchmarks.bench_incremental --edits 50 --seed 7
+    python -m benchmarks.bench_incremental path/to/*.lua        # real XSAF files
+
+Each file gets a chain of seeded edits (string, number and identifier changes,
+inserted and deleted lines). After every edit the file is re-parsed incrementally
+from the previous version, as the indexer does, and from scratch; chunks and
+symbols (functions, calls, variables, file loads) must be identical. Edits are
+drawn until one keeps the file free of syntax errors, since tree-sitter may
+recover from errors differently when it re-parses incrementally; files that do
+not parse cleanly are skipped. Exits with 1 on any mismatch and reports the time
+of both parses.
+"""
+
+import re
+import sys
+import time
+import random
+import hashlib
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services.incremental_parser import IncrementalParser
+from app.services.lua_parser import get_parser
+from benchmarks.xsaf_corpus import generate_corpus
+
+STRING_PATTERN = re.compile(r'"[^"\n]*"')
+NUMBER_PATTERN = re.compile(r'\b\d+\b')
+IDENTIFIER_PATTERN = re.compile(r'\b[A-Za-z_]\w*\b')
+LUA_KEYWORDS = {
+    'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for', 'function', 'goto', 'if', 'in',
+    'local', 'nil', 'not', 'or', 'repeat', 'return', 'then', 'true', 'until', 'while'
+}
+INSERTED_LINES = [
+    'local result = 1',
+    'result = result or 0',
+    'env.info("edited")',
+    'timer.scheduleFunction(function() env.info("later") end, nil, 5)',
+    'local function helper(a) return a end'
+]
+
+def random_edit(rng: random.Random, content: str) -> Tuple[str, str]:
+    """Apply one random edit; returns (kind, new content)."""
+    kind = rng.choice(["string", "number", "identifier", "insert_line", "delete_line"])
+    if kind in ("string", "number", "identifier"):
+        pattern = {"string": STRING_PATTERN, "number": NUMBER_PATTERN, "identifier": IDENTIFIER_PATTERN}[kind]
+        matches = [m for m in pattern.finditer(content) if kind != "identifier" or m.group() not in LUA_KEYWORDS]
+        if matches:
+            match = rng.choice(matches)
+            if kind == "string":
+                replacement = match.group()[:-1] + rng.choice("abc ") + '"'
+            elif kind == "number":
+                replacement = str(int(match.group()) + rng.randint(1, 99))
+            else:
+                replacement = match.group() + rng.choice("xyz")
+            return kind, content[:match.start()] + replacement + content[match.end():]
+        kind = "insert_line"
+
+    lines = content.split("\n")
+    position = rng.randrange(len(lines))
+    if kind == "delete_line" and len(lines) > 1:
+        del lines[position]
+    else:
+        kind = "insert_line"
+        indent = re.match(r'\s*', lines[position]).group()
+        lines.insert(position, indent + rng.choice(INSERTED_LINES))
+    return kind, "\n".join(lines)
+
+def has_error(content: str) -> bool:
+    return get_parser().parse(content.encode("utf-8")).root_node.has_error
+
+def valid_edit(rng: random.Random, content: str, attempts: int = 20) -> Optional[Tuple[str, str]]:
+    """A random edit that leaves no syntax error, or None if none was found."""
+    for _ in range(attempts):
+        kind, edited = random_edit(rng, content)
+        if not has_error(edited):
+            return kind, edited
+    return None
+
+def content_hash(content: str) -> str:
+    """The hash IncrementalParser checks base versions against."""
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+def parse(parser: IncrementalParser, file_path: str, content: str, base_hash: Optional[str]) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    parsed = parser.parse(file_path, content, base_hash)
+    parsed["chunks"] = list(parsed["chunks"])
+    return parsed, time.perf_counter() - start
+
+def describe(incremental: Dict[str, Any], full: Dict[str, Any]) -> str:
+    """The first differing part of two parses."""
+    if incremental["chunks"] != full["chunks"]:
+        return f"chunks ({len(incremental['chunks'])} vs {len(full['chunks'])})"
+    for key, records in full["symbols"].items():
+        if incremental["symbols"][key] != records:
+            extra = [r for r in incremental["symbols"][key] if r not in records]
+            missing = [r for r in records if r not in incremental["symbols"][key]]
+            return f"{key}: extra {extra[:2]}, missing {missing[:2]}"
+    return "none"
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("files", nargs="*", help="Lua files to edit (default: generated corpus)")
+    arg_parser.add_argument("--seed", type=int, default=42, help="Corpus and edit seed")
+    arg_parser.add_argument("--corpus-files", type=int, default=12, help="Number of generated files")
+    arg_parser.add_argument("--edits", type=int, default=20, help="Successive edits per file")
+    args = arg_parser.parse_args(argv)
+
+    if args.files:
+        corpus = []
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                corpus.append((path, f.read()))
+    else:
+        corpus = generate_corpus(args.seed, args.corpus_files)
+
+    rng = random.Random(args.seed)
+    parser = IncrementalParser()
+    edits = incremental_parses = mismatches = skipped = 0
+    incremental_time = full_time = 0.0
+    for file_path, content in corpus:
+        if has_error(content):
+            skipped += 1
+            continue
+        parse(parser, file_path, content, None)
+        base_hash = content_hash(content)
+        for _ in range(args.edits):
+            edit = valid_edit(rng, content)
+            if edit is None:
+                break
+            kind, content = edit
+            incremental, elapsed = parse(parser, file_path, content, base_hash)
+            incremental_time += elapsed
+            incremental_parses += incremental["incremental"]
+            full, elapsed = parse(IncrementalParser(), file_path, content, None)
+            full_time += elapsed
+            edits += 1
+            if incremental["chunks"] != full["chunks"] or incremental["symbols"] != full["symbols"]:
+                mismatches += 1
+                print(f"MISMATCH {file_path} after {kind} edit: {describe(incremental, full)}")
+            base_hash = content_hash(content)
+
+    print(
+        f"{len(corpus)} files ({skipped} skipped with syntax errors), "
+        f"{edits} edits ({incremental_parses} parsed incrementally), {mismatches} mismatches"
+    )
+    if edits:
+        print(f"  incremental: {incremental_time * 1000 / edits:8.2f} ms/edit")
+        print(f"  full:        {full_time * 1000 / edits:8.2f} ms/edit")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Lua parser and chunker on a seeded XSAF-like corpus.
+
+Usage (from src/embedding):
+    python -m benchmarks.bench_parser                               # default corpus (seed 42)
+    python -m benchmarks.bench_parser --scale 4 --output after.json
+    python -m benchmarks.bench_parser --compare before.json         # show changes against a saved run
+    python -m benchmarks.bench_parser path/to/*.lua                 # real XSAF files
+
+Stages:
+    parse        tree-sitter parse only
+    metadata     get_node_metadata for every chunk node (with a KeywordIndex)
+    chunk_ast    chunk_lua_file in "ast" mode
+    chunk_sized  chunk_lua_file in "sized" mode
+    symbols      parse_content with symbol collection
+    lua_parser   LuaParser.parse_file_content (streamed through the async queue)
+
+Reports nodes/sec, chunks/sec, MB/sec and the peak RSS after each stage (the
+peak only grows, so a stage's value includes the stages before it). Results
+can be saved as JSON; --compare exits with 1 if any stage lost more than
+--threshold percent of its MB/sec.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from tree_sitter import Node, Tree
+
+from app.services import lua_parser
+from app.services.lua_parser import CHUNK_NODE_TYPES, KeywordIndex, LuaParser, get_node_metadata, get_parser
+from app.services.lua_symbols import SymbolCollector
+from benchmarks.xsaf_corpus import generate_corpus
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def chunk_nodes(tree: Tree) -> List[Node]:
+    """Every node the chunker would consider for a chunk."""
+    nodes = []
+    cursor = tree.walk()
+    while True:
+        if cursor.node.type in CHUNK_NODE_TYPES:
+            nodes.append(cursor.node)
+        if cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return nodes
+
+def count_nodes(tree: Tree) -> int:
+    """Count every node in the tree."""
+    count = 0
+    cursor = tree.walk()
+    while True:
+        count += 1
+        if cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return count
+
+def stage_parse(inputs: List[Tuple[str, str, bytes]], trees: List[Tree]) -> int:
+    for _, _, data in inputs:
+        get_parser().parse(data)
+    return 0
+
+def stage_metadata(inputs: List[Tuple[str, str, bytes]], trees: List[Tree]) -> int:
+    count = 0
+    for (file_path, _, data), tree in zip(inputs, trees):
+        keyword_index = KeywordIndex(data)
+        for node in chunk_nodes(tree):
+            get_node_metadata(data, node, file_path, keyword_index)
+            count += 1
+    return count
+
+def stage_chunk_ast(inputs: List[Tuple[str, str, bytes]], trees: List[Tree]) -> int:
+    return sum(len(lua_parser.chunk_lua_file(file_path, content, mode="ast")) for file_path, content, _ in inputs)
+
+def stage_chunk_sized(inputs: List[Tuple[str, str, bytes]], trees: List[Tree]) -> int:
+    return sum(len(lua_parser.chunk_lua_file(file_path, content, mode="sized")) for file_path, content, _ in inputs)
+
+def stage_symbols(inputs: List[Tuple[str, str, bytes]], trees: List[Tree]) -> int:
+    count = 0
+    for file_path, content, data in inputs:
+        count += len(lua_parser.parse_content(content, file_path, SymbolCollector(data)))
+    return count
+
+def stage_lua_parser(inputs: List[Tuple[str, str, bytes]], trees: List[Tree]) -> int:
+    async def run() -> int:
+        lua = LuaParser()
+        count = 0
+        for file_path, content, _ in inputs:
+            count += len(await lua.parse_file_content(content, file_path))
+        return count
+    return asyncio.run(run())
+
+STAGES: Dict[str, Callable[[List[Tuple[str, str, bytes]], List[Tree]], int]] = {
+    "parse": stage_parse,
+    "metadata": stage_metadata,
+    "chunk_ast": stage_chunk_ast,
+    "chunk_sized": stage_chunk_sized,
+    "symbols": stage_symbols,
+    "lua_parser": stage_lua_parser,
+}
+
+def run_stage(stage, inputs, trees, nodes: int, total_bytes: int, repeat: int) -> Dict[str, Any]:
+    """Run a stage `repeat` times and report its best time."""
+    best = float("inf")
+    chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = stage(inputs, trees)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "seconds": best,
+        "nodes_per_sec": nodes / best,
+        "chunks_per_sec": chunks / best if chunks else None,
+        "mb_per_sec": total_bytes / 1e6 / best,
+        "chunks": chunks,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """Print MB/sec changes against a saved run and count the regressions."""
+    regressions = 0
+    print(f"\nCompared with {baseline['meta'].get('revision') or 'baseline'} ({baseline['meta'].get('timestamp')}):")
+    for name, stage in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            continue
+        change = (stage["mb_per_sec"] / before["mb_per_sec"] - 1) * 100
+        marker = ""
+        if change < -threshold:
+            marker = "  REGRESSION"
+            regressions += 1
+        print(f"  {name:12s} {before['mb_per_sec']:8.2f} -> {stage['mb_per_sec']:8.2f} MB/sec ({change:+.1f}%){marker}")
+    return regressions
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("files", nargs="*", help="Lua files to benchmark (default: generated corpus)")
+    arg_parser.add_argument("--seed", type=int, default=42, help="Corpus seed")
+    arg_parser.add_argument("--corpus-files", type=int, default=24, help="Number of generated files")
+    arg_parser.add_argument("--scale", type=int, default=1, help="Size multiplier per generated file")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best time is reported")
+    arg_parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    arg_parser.add_argument("--output", help="Write the results to this JSON file")
+    arg_parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    arg_parser.add_argument("--threshold", type=float, default=10.0, help="MB/sec loss in percent counted as a regression")
+    args = arg_parser.parse_args()
+
+    if args.files:
+        corpus = []
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                corpus.append((path, f.read()))
+    else:
+        corpus = generate_corpus(args.seed, args.corpus_files, args.scale)
+    inputs = [(path, content, content.encode("utf-8")) for path, content in corpus]
+    total_bytes = sum(len(data) for _, _, data in inputs)
+
+    trees = [get_parser().parse(data) for _, _, data in inputs]
+    nodes = sum(count_nodes(tree) for tree in trees)
+    print(f"Corpus: {len(inputs)} files, {total_bytes / 1e6:.2f} MB, {nodes} nodes")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parser_version": lua_parser.PARSER_VERSION,
+            "repeat": args.repeat
+        },
+        "corpus": {
+            "seed": None if args.files else args.seed,
+            "files": len(inputs),
+            "scale": None if args.files else args.scale,
+            "bytes": total_bytes,
+            "nodes": nodes
+        },
+        "stages": {}
+    }
+
+    for name in args.stages.split(","):
+        name = name.strip()
+        if name not in STAGES:
+            print(f"Unknown stage: {name}")
+            return 2
+        stage = run_stage(STAGES[name], inputs, trees, nodes, total_bytes, args.repeat)
+        results["stages"][name] = stage
+        chunks_per_sec = f"{stage['chunks_per_sec']:10.0f}" if stage["chunks_per_sec"] else f"{'-':>10s}"
+        rss = f"{stage['peak_rss_mb']:.0f} MB" if stage["peak_rss_mb"] is not None else "n/a"
+        print(
+            f"  {name:12s} {stage['nodes_per_sec']:12.0f} nodes/sec {chunks_per_sec} chunks/sec "
+            f"{stage['mb_per_sec']:8.2f} MB/sec  peak RSS {rss}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark the TreeCursor chunk walker against the original recursive walker.
+
+Usage (from src/embedding):
+    python -m benchmarks.bench_traversal                 # synthetic nested mission tables
+    python -m benchmarks.bench_traversal path/to/*.lua   # real XSAF files
+
+Reports tree nodes/sec for both walkers and checks they produce identical chunks.
+"""
+
+import sys
+import time
+import argparse
+from typing import List, Dict, Any, Optional
+
+from tree_sitter import Node, Tree
+
+from app.services.lua_parser import (
+    CHUNK_NODE_TYPES,
+    DCS_KEYWORDS,
+    SourceBuffer,
+    get_parser,
+    walk_chunks,
+)
+
+def recursive_node_metadata(content: str, node: Node, file_path: str) -> Dict[str, Any]:
+    """get_node_metadata as it was before the keyword index and byte-offset chunks."""
+    metadata = {
+        'type': node.type,
+        'start_line': node.start_point[0] + 1,
+        'end_line': node.end_point[0] + 1,
+        'file_path': file_path
+    }
+    if node.type in ('function_declaration', 'function_definition', 'local_function_definition'):
+        name_node = next((child for child in node.children if child.type == 'identifier'), None)
+        if name_node:
+            metadata['name'] = content[name_node.start_byte:name_node.end_byte]
+    text = content[node.start_byte:node.end_byte].lower()
+    dcs_keywords_found = [kw for kw in DCS_KEYWORDS if kw in text]
+    if dcs_keywords_found:
+        metadata['dcs_keywords'] = dcs_keywords_found
+    if node.type == 'comment':
+        metadata['comment_text'] = content[node.start_byte:node.end_byte]
+    return metadata
+
+def recursive_walk_chunks(tree: Tree, content: str, file_path: str) -> List[Dict[str, Any]]:
+    """
+    The recursive walker chunk_lua_file used before the TreeCursor traversal.
+    It slices the str with byte offsets, so it only matches for ASCII files.
+    """
+    chunks = []
+
+    def process_node(node: Node, parent_chunk_id: Optional[int] = None) -> None:
+        if node.end_byte - node.start_byte < 10:
+            for child in node.children:
+                process_node(child, parent_chunk_id)
+            return
+
+        if node.type in CHUNK_NODE_TYPES:
+            chunks.append({
+                'file_path': file_path,
+                'chunk_type': node.type,
+                'content': content[node.start_byte:node.end_byte],
+                'meta_data': recursive_node_metadata(content, node, file_path),
+                'line_start': node.start_point[0] + 1,
+                'line_end': node.end_point[0] + 1,
+                'parent_id': parent_chunk_id
+            })
+            current_chunk_id = len(chunks) - 1
+            for child in node.children:
+                process_node(child, current_chunk_id)
+        else:
+            for child in node.children:
+                process_node(child, parent_chunk_id)
+
+    process_node(tree.root_node)
+    return chunks
+
+def cursor_walk_chunks(tree: Tree, content: str, file_path: str):
+    """The current TreeCursor walker over a shared byte buffer."""
+    return walk_chunks(tree, SourceBuffer(content.encode("utf-8")), file_path)
+
+def synthetic_mission(groups: int = 200, depth: int = 40) -> str:
+    """Build a mission-style Lua file with wide and deeply nested tables."""
+    lines = ["mission = {", '    ["coalition"] = {']
+    for g in range(groups):
+        lines.append(f'        [{g + 1}] = {{ ["name"] = "group {g}", ["units"] = {{')
+        for u in range(4):
+            lines.append(f'            {{ ["type"] = "F-16C_50", ["x"] = {g * 10 + u}, ["y"] = {u * 7} }},')
+        lines.append("        }},")
+    lines.append("    },")
+    nested = "".join(f'{{ ["level{i}"] = ' for i in range(depth)) + "1" + " }" * depth
+    lines.append(f'    ["route"] = {nested},')
+    lines.append("}")
+    lines.append("function handler:onEvent(event)")
+    lines.append("    if event.id == world.event.S_EVENT_DEAD then")
+    lines.append("        timer.scheduleFunction(function() trigger.action.outText('dead', 10) end, nil, timer.getTime() + 5)")
+    lines.append("    end")
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+def count_nodes(tree: Tree) -> int:
+    """Count every node in the tree."""
+    count = 0
+    cursor = tree.walk()
+    while True:
+        count += 1
+        if cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return count
+
+def time_walker(walker, tree: Tree, content: str, file_path: str, repeat: int):
+    """Return (best seconds, chunks) for a walker over `repeat` runs."""
+    best = float("inf")
+    chunks = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = walker(tree, content, file_path)
+        best = min(best, time.perf_counter() - start)
+    return best, chunks
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("files", nargs="*", help="Lua files to benchmark (default: synthetic mission)")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Runs per walker; the best time is reported")
+    arg_parser.add_argument("--depth", type=int, default=40, help="Nesting depth of the synthetic route table")
+    args = arg_parser.parse_args()
+
+    if args.files:
+        inputs = []
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                inputs.append((path, f.read()))
+    else:
+        inputs = [("synthetic_mission.lua", synthetic_mission(depth=args.depth))]
+
+    mismatches = 0
+    for file_path, content in inputs:
+        tree = get_parser().parse(bytes(content, "utf-8"))
+        nodes = count_nodes(tree)
+
+        try:
+            recursive_time, recursive_chunks = time_walker(recursive_walk_chunks, tree, content, file_path, args.repeat)
+        except RecursionError:
+            recursive_time, recursive_chunks = None, None
+        cursor_time, cursor_chunks = time_walker(cursor_walk_chunks, tree, content, file_path, args.repeat)
+
+        print(f"{file_path}: {nodes} nodes, {len(cursor_chunks)} chunks")
+        if recursive_time is None:
+            print("  recursive: RecursionError")
+        else:
+            print(f"  recursive: {nodes / recursive_time:12.0f} nodes/sec ({recursive_time * 1000:.2f} ms)")
+        print(f"  cursor:    {nodes / cursor_time:12.0f} nodes/sec ({cursor_time * 1000:.2f} ms)")
+
+        if recursive_chunks is not None:
+            if recursive_chunks == [chunk.to_dict() for chunk in cursor_chunks]:
+                print(f"  speedup:   {recursive_time / cursor_time:.2f}x, chunks identical")
+            else:
+                print("  MISMATCH: walkers produced different chunks")
+                mismatches += 1
+
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
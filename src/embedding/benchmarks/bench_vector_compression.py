@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark compact vector search: recall@k against memory and latency.
+
+Usage (from src/embedding):
+    python -m benchmarks.bench_vector_compression                      # synthetic 768-d corpus
+    python -m benchmarks.bench_vector_compression --input vectors.npy  # real embeddings
+    python -m benchmarks.bench_vector_compression --dims 128 256 384 --output compact.json
+    python -m benchmarks.bench_vector_compression --oversample 5 10 20 40   # binary candidates per result
+
+Real embeddings can be exported from the database, e.g.
+    psql -Atc "SELECT embedding FROM lua_chunks WHERE embedding IS NOT NULL" > vectors.txt
+and converted with --input vectors.txt (one pgvector literal per line).
+
+Every configuration searches the same queries by exact cosine over its compact
+vectors (halfvec = float16), optionally reranking the top k * --rerank-factor
+candidates with the float32 vectors, as CompactIndex.search_sql does. Binary
+configurations take the k * --oversample nearest codes by Hamming distance and
+always rerank. Recall@k is measured against the current single-stage query, exact
+float32 cosine over every row ("float32"). Memory is the size of the indexed vectors
+(pgvector stores 4 bytes per vector dimension, 2 per halfvec dimension and 1 bit
+per bit dimension, plus an 8-byte header); latency is the brute-force time per query here, so it compares
+scan cost between configurations rather than predicting HNSW latency in Postgres.
+The synthetic corpus has a decaying spectrum like real text embeddings; its
+leading dimensions carry no more signal than the others, so it shows Matryoshka
+truncation at its worst.
+"""
+
+import sys
+import json
+import time
+import argparse
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.services.vector_compression import VectorProjection, normalize_rows, parse_vector
+
+def synthetic_corpus(count: int, dims: int, seed: int) -> np.ndarray:
+    """Normalized vectors whose variance decays over a random orthogonal basis."""
+    rng = np.random.default_rng(seed)
+    scales = 1.0 / np.sqrt(1.0 + np.arange(dims) / 8.0)
+    basis, _ = np.linalg.qr(rng.normal(size=(dims, dims)))
+    vectors = (rng.normal(size=(count, dims)) * scales) @ basis.T
+    # Clusters, like chunks of the same API or file
+    centers = rng.normal(size=(count // 50 + 1, dims)) @ basis.T * scales.max()
+    vectors += centers[rng.integers(0, len(centers), count)] * 0.5
+    return normalize_rows(vectors.astype(np.float32))
+
+def load_vectors(path: str) -> np.ndarray:
+    if path.endswith(".npy"):
+        vectors = np.load(path)
+    else:
+        with open(path) as f:
+            vectors = np.stack([parse_vector(line) for line in f if line.strip()])
+    return normalize_rows(vectors.astype(np.float32))
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+# Set bits of every byte value, for Hamming distances over packed codes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    # np.bitwise_count needs numpy 2; the table works everywhere
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return POPCOUNT[values]
+
+def hamming_top_k(codes: np.ndarray, query_codes: np.ndarray, k: int) -> np.ndarray:
+    found = []
+    for query in query_codes:
+        distances = popcount(np.bitwise_xor(codes, query)).sum(axis=1, dtype=np.uint32)
+        top = np.argpartition(distances, k - 1)[:k]
+        found.append(top[np.argsort(distances[top], kind="stable")])
+    return np.stack(found)
+
+def rerank(found: np.ndarray, corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Keep the k candidates with the highest float32 cosine."""
+    rescored = np.einsum("qd,qcd->qc", queries, corpus[found])
+    return np.take_along_axis(found, rescored.argsort(axis=1)[:, ::-1][:, :k], axis=1)
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)]))
+
+def run_config(
+    name: str,
+    projection: Optional[VectorProjection],
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    exact: np.ndarray,
+    k: int,
+    rerank_factor: int
+) -> List[Dict[str, Any]]:
+    """Search with one compact representation, without and with a float32 rerank."""
+    if projection is None:
+        compact, compact_queries = corpus, queries
+        bytes_per_vector = 4 * corpus.shape[1] + 8
+    else:
+        # Rounded to halfvec precision, computed in float32 (numpy has no fast float16 path)
+        compact = projection.project(corpus).astype(np.float16).astype(np.float32)
+        compact_queries = projection.project(queries).astype(np.float16).astype(np.float32)
+        bytes_per_vector = 2 * projection.dims + 8
+
+    results = []
+    for reranked in ([False] if projection is None else [False, True]):
+        candidates = k * rerank_factor if reranked else k
+        start = time.perf_counter()
+        found = top_k(compact, compact_queries, candidates)
+        if reranked:
+            found = rerank(found, corpus, queries, k)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "config": name + (f" +rerank x{rerank_factor}" if reranked else ""),
+            "dims": compact.shape[1],
+            "recall": recall(found, exact),
+            "bytes_per_vector": bytes_per_vector,
+            "index_mb": bytes_per_vector * len(corpus) / (1024 * 1024),
+            "ms_per_query": elapsed * 1000 / len(queries)
+        })
+    return results
+
+def run_binary(
+    projection: VectorProjection,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    exact: np.ndarray,
+    k: int,
+    oversample: List[int]
+) -> List[Dict[str, Any]]:
+    """Hamming first pass over binary codes, reranked by float32 cosine."""
+    codes = projection.binary_codes(corpus)
+    query_codes = projection.binary_codes(queries)
+    results = []
+    for factor in oversample:
+        start = time.perf_counter()
+        found = rerank(hamming_top_k(codes, query_codes, min(k * factor, len(corpus))), corpus, queries, k)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "config": f"binary +rerank x{factor}",
+            "dims": projection.dims,
+            "recall": recall(found, exact),
+            "bytes_per_vector": projection.bytes_per_vector,
+            "index_mb": projection.bytes_per_vector * len(corpus) / (1024 * 1024),
+            "ms_per_query": elapsed * 1000 / len(queries)
+        })
+    return results
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="Embeddings as .npy or one pgvector literal per line")
+    parser.add_argument("--count", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--source-dims", type=int, default=768, help="Synthetic vector dimensions")
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 256, 384], help="Reduced dimensions to try")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[5, 10, 20, 40], help="Binary candidates per result")
+    parser.add_argument("--sample", type=int, default=20000, help="Vectors used to fit PCA")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Save results as JSON")
+    args = parser.parse_args(argv)
+
+    corpus = load_vectors(args.input) if args.input else synthetic_corpus(args.count, args.source_dims, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    # Queries near corpus vectors, like a question about existing code
+    picks = corpus[rng.integers(0, len(corpus), args.queries)]
+    queries = normalize_rows(picks + rng.normal(scale=0.5 / np.sqrt(corpus.shape[1]), size=picks.shape).astype(np.float32))
+    exact = top_k(corpus, queries, args.k)
+    sample = corpus[rng.choice(len(corpus), min(args.sample, len(corpus)), replace=False)]
+
+    configs = [("float32", None), ("halfvec", VectorProjection.fit("halfvec", sample, corpus.shape[1]))]
+    for dims in args.dims:
+        if dims < corpus.shape[1]:
+            configs.append((f"pca-{dims}", VectorProjection.fit("pca", sample, dims)))
+            configs.append((f"matryoshka-{dims}", VectorProjection.fit("matryoshka", sample, dims)))
+
+    results = []
+    for name, projection in configs:
+        results.extend(run_config(name, projection, corpus, queries, exact, args.k, args.rerank_factor))
+    results.extend(run_binary(VectorProjection.fit("binary", sample, corpus.shape[1]), corpus, queries, exact, args.k, args.oversample))
+
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    print(f"{'config':<28} {'dims':>5} {'recall':>7} {'B/vec':>6} {'MB':>8} {'ms/query':>9}")
+    for row in results:
+        print(f"{row['config']:<28} {row['dims']:>5} {row['recall']:>7.3f} {row['bytes_per_vector']:>6} "
+              f"{row['index_mb']:>8.1f} {row['ms_per_query']:>9.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"vectors": len(corpus), "source_dims": corpus.shape[1], "k": args.k, "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
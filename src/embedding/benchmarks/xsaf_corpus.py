@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Seeded generator for an XSAF-like Lua corpus.
+
+Usage (from src/embedding):
+    python -m benchmarks.xsaf_corpus out_dir                  # write the default corpus
+    python -m benchmarks.xsaf_corpus out_dir --seed 7 --files 40
+
+The same seed always produces the same files, so benchmark numbers from
+different versions are measured on identical input. The corpus mixes:
+- mission files with large, deeply nested group/unit/route tables
+- event handler modules with nested handlers and timer.scheduleFunction callbacks
+- utility modules with UTF-8 comments (accents, Cyrillic, CJK, emoji) and dofile/require loads
+"""
+
+import os
+import sys
+import random
+import argparse
+from typing import List, Tuple
+
+UNIT_TYPES = ["F-16C_50", "FA-18C_hornet", "Su-27", "MiG-29S", "A-10C_2", "AH-64D_BLK_II", "T-72B", "M-1 Abrams"]
+EVENTS = ["S_EVENT_DEAD", "S_EVENT_BIRTH", "S_EVENT_TAKEOFF", "S_EVENT_LAND", "S_EVENT_HIT", "S_EVENT_SHOT", "S_EVENT_CRASH"]
+ACTIONS = [
+    "trigger.action.outText({msg}, 10)",
+    "trigger.action.outTextForCoalition(coalition.side.BLUE, {msg}, 15)",
+    "env.info({msg})",
+    "trigger.action.smoke(unit:getPoint(), trigger.smokeColor.Red)",
+    "missionCommands.addCommand({msg}, nil, XSAF.menuHandler, unit)",
+]
+COMMENTS = [
+    "Zone de départ des unités — vérifier la météo",
+    "Gruppe wird später über die Brücke geführt (Überprüfung nötig)",
+    "Позиция ЗРК, не трогать без согласования",
+    "补给车队路线，注意敌方防空",
+    "Spawn handler 🚁 keeps respawning after landing ✈",
+    "Plain ASCII note about the CAP timing",
+]
+
+def _comment(rng: random.Random, indent: str) -> str:
+    return f"{indent}-- {rng.choice(COMMENTS)}"
+
+def mission_file(rng: random.Random, groups: int) -> str:
+    """A mission table with coalitions, groups, units and nested route points."""
+    lines = ["mission = {", '    ["coalition"] = {']
+    for side in ("blue", "red"):
+        lines.append(f'        ["{side}"] = {{')
+        lines.append('            ["country"] = {')
+        for g in range(groups):
+            if rng.random() < 0.1:
+                lines.append(_comment(rng, "                "))
+            lines.append(f'                [{g + 1}] = {{')
+            lines.append(f'                    ["name"] = "{side} group {g}",')
+            lines.append(f'                    ["groupId"] = {rng.randint(1, 9999)},')
+            lines.append('                    ["units"] = {')
+            for u in range(rng.randint(1, 6)):
+                lines.append(
+                    f'                        [{u + 1}] = {{ ["type"] = "{rng.choice(UNIT_TYPES)}", '
+                    f'["x"] = {rng.uniform(-3e5, 3e5):.3f}, ["y"] = {rng.uniform(-3e5, 3e5):.3f}, '
+                    f'["heading"] = {rng.uniform(0, 6.28):.4f}, ["skill"] = "Excellent" }},'
+                )
+            lines.append('                    },')
+            lines.append('                    ["route"] = { ["points"] = {')
+            for p in range(rng.randint(2, 8)):
+                lines.append(
+                    f'                        [{p + 1}] = {{ ["alt"] = {rng.randint(100, 9000)}, '
+                    f'["speed"] = {rng.uniform(50, 300):.2f}, ["task"] = {{ ["id"] = "ComboTask", '
+                    f'["params"] = {{ ["tasks"] = {{ [1] = {{ ["id"] = "EngageTargets", ["number"] = {p + 1} }} }} }} }} }},'
+                )
+            lines.append('                    } },')
+            lines.append('                },')
+        lines.append('            },')
+        lines.append('        },')
+    lines.append('    },')
+    depth = rng.randint(20, 60)
+    nested = "".join(f'{{ ["level{i}"] = ' for i in range(depth)) + "true" + " }" * depth
+    lines.append(f'    ["trigrules"] = {nested},')
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def handler_file(rng: random.Random, module: str, handlers: int) -> str:
+    """An event handler module with nested handlers and scheduled callbacks."""
+    lines = [
+        f"-- {module}: event handlers",
+        _comment(rng, ""),
+        f"{module} = {module} or {{}}",
+        f"local {module}Handler = {{}}",
+        "",
+    ]
+    for h in range(handlers):
+        event = rng.choice(EVENTS)
+        msg = f'"{module} {event} {h}"'
+        lines.append(f"function {module}Handler:on{event.title().replace('_', '')}{h}(event)")
+        lines.append(f"    if event.id == world.event.{event} and event.initiator then")
+        lines.append("        local unit = event.initiator")
+        lines.append("        local group = unit:getGroup()")
+        if rng.random() < 0.4:
+            lines.append(_comment(rng, "        "))
+        lines.append("        timer.scheduleFunction(function(args, time)")
+        lines.append(f"            {rng.choice(ACTIONS).format(msg=msg)}")
+        lines.append("            if group and group:isExist() then")
+        lines.append("                timer.scheduleFunction(function()")
+        lines.append(f"                    {rng.choice(ACTIONS).format(msg=msg)}")
+        lines.append("                    return nil")
+        lines.append("                end, nil, timer.getTime() + 5)")
+        lines.append("            end")
+        lines.append(f"            return time + {rng.randint(5, 120)}")
+        lines.append(f"        end, {{ unit = unit }}, timer.getTime() + {rng.randint(1, 30)})")
+        lines.append("    end")
+        lines.append("end")
+        lines.append("")
+    lines.append(f"world.addEventHandler({module}Handler)")
+    return "\n".join(lines) + "\n"
+
+def utility_file(rng: random.Random, module: str, functions: int, loads: List[str]) -> str:
+    """A utility module with UTF-8 doc comments, local helpers and file loads."""
+    lines = [f"--[[ {module} utilities", f"     {rng.choice(COMMENTS)}", "]]"]
+    for path in loads:
+        lines.append(f'dofile(lfs.writedir() .. "Scripts\\\\XSAF\\\\{path}")')
+    lines.append(f'local log = require("XSAF.log")')
+    lines.append(f"{module} = {module} or {{}}")
+    lines.append("")
+    for f in range(functions):
+        lines.append(_comment(rng, ""))
+        name = f"helper{f}"
+        if rng.random() < 0.5:
+            lines.append(f"local function {name}(a, b, ...)")
+        else:
+            lines.append(f"function {module}.{name}(a, b, ...)")
+        lines.append("    local result = {}")
+        lines.append("    for i, v in ipairs({...}) do")
+        lines.append("        if type(v) == 'table' then")
+        lines.append("            result[#result + 1] = mist and mist.utils.deepCopy(v) or v")
+        lines.append("        elseif v ~= nil then")
+        lines.append(f"            result[i] = v * {rng.randint(1, 9)} + (a or 0)")
+        lines.append("        end")
+        lines.append("    end")
+        lines.append(f"    log.info(string.format('{name} %d', #result))")
+        lines.append("    return result, b")
+        lines.append("end")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+def generate_corpus(seed: int = 42, files: int = 24, scale: int = 1) -> List[Tuple[str, str]]:
+    """
+    Generate the corpus as (relative path, content) pairs.
+
+    Args:
+        seed: Random seed; the same seed gives byte-identical files
+        files: Number of files (about a sixth are mission files, a third handler modules)
+        scale: Multiplier for groups per mission and functions per module
+    """
+    rng = random.Random(seed)
+    corpus = []
+    utilities = [f"util{i}.lua" for i in range(files)]
+    for i in range(files):
+        kind = i % 6
+        if kind == 0:
+            corpus.append((f"Missions/mission{i}.lua", mission_file(rng, rng.randint(20, 60) * scale)))
+        elif kind in (1, 2):
+            module = f"XSAF{i}"
+            corpus.append((f"Scripts/XSAF/handlers{i}.lua", handler_file(rng, module, rng.randint(10, 30) * scale)))
+        else:
+            loads = rng.sample(utilities, min(3, len(utilities)))
+            corpus.append((f"Scripts/XSAF/util{i}.lua", utility_file(rng, f"Util{i}", rng.randint(10, 40) * scale, loads)))
+    return corpus
+
+def write_corpus(directory: str, corpus: List[Tuple[str, str]]) -> List[str]:
+    """Write the corpus below `directory` and return the file paths."""
+    paths = []
+    for relative_path, content in corpus:
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        paths.append(path)
+    return paths
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("directory", help="Directory to write the corpus to")
+    arg_parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    arg_parser.add_argument("--files", type=int, default=24, help="Number of files")
+    arg_parser.add_argument("--scale", type=int, default=1, help="Size multiplier per file")
+    args = arg_parser.parse_args()
+
+    corpus = generate_corpus(args.seed, args.files, args.scale)
+    paths = write_corpus(args.directory, corpus)
+    total = sum(len(content.encode("utf-8")) for _, content in corpus)
+    print(f"Wrote {len(paths)} files ({total / 1e6:.2f} MB) to {args.directory}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
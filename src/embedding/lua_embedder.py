@@ -2,19 +2,23 @@ import os
 import re
 from typing import Dict, List, Tuple, Any, Optional
 
-import numpy as np
 from tree_sitter import Language, Parser
 
+# The app package is imported like the services do: run from src/embedding
+from app.services.hashed_embedder import HashedNgramEmbedder
+
 # This is a placeholder for actual embedding generation
 # In the real implementation, this would use a model like OpenAI or a local alternative
+_embedder = HashedNgramEmbedder(1536)
+
 def generate_embedding(text: str) -> List[float]:
     """
     Generate a vector embedding for a text snippet.
-    This is a placeholder that creates a random vector.
+    This is a placeholder that hashes the snippet's n-grams (deterministic, offline).
     """
     # In a real implementation, this would call an embedding model
-    # For now, we return a random vector of size 1536 (typical OpenAI size)
-    return np.random.randn(1536).tolist()
+    # For now, we return a hashed n-gram vector of size 1536 (typical OpenAI size)
+    return _embedder.embed(text).tolist()
 
 class LuaEmbedder:
     def __init__(self, tree_sitter_lib_path: Optional[str] = None):